@@ -0,0 +1,72 @@
+"""Micro-benchmark of the Miner engine against the list-based code it replaced.
+
+    python benchmarks/bench_miner_engine.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from miner_engine import MINER_CELLS, deal_board, mask_positions, miner_coeff, popcount, reveal  # noqa: E402
+
+NUMBER = 200000
+
+
+def calc_miner_coeff(mines, cleared, safe_count):
+    """Прежний расчёт коэффициента на каждый ход"""
+    if cleared == 0:
+        return 1.0
+    coeff = 1.0
+    for i in range(cleared):
+        remaining_safe = safe_count - i
+        if remaining_safe <= 0:
+            break
+        coeff *= (25 - i) / remaining_safe
+    commission = 0.92 if mines <= 3 else 0.90 if mines <= 5 else 0.88 if mines <= 10 else 0.86 if mines <= 15 else 0.85
+    return round(coeff * commission, 2)
+
+
+def old_move(mine_list, opened_list, idx):
+    # Прежнее состояние: списки ячеек в user_data
+    if idx in opened_list:
+        return None
+    if idx in mine_list:
+        return 'boom'
+    opened_list.append(idx)
+    return calc_miner_coeff(len(mine_list), len(opened_list), MINER_CELLS - len(mine_list))
+
+
+def new_move(board, mines, opened, idx):
+    outcome, opened = reveal(board, opened, idx)
+    return miner_coeff(mines, popcount(opened))
+
+
+def bench(name, stmt, namespace):
+    best = min(timeit.repeat(stmt, globals=namespace, number=NUMBER, repeat=5))
+    print(f"{name:<28} {best / NUMBER * 1e9:8.1f} ns")
+
+
+def main():
+    rng = random.Random(1)
+    mines = 5
+    board = deal_board(mines, rng)
+    mine_list = mask_positions(board)
+    safe = [i for i in range(MINER_CELLS) if not board >> i & 1]
+    opened = 0
+    for idx in safe[:10]:
+        opened |= 1 << idx
+    namespace = dict(globals(), board=board, opened=opened, mine_list=mine_list,
+                     opened_list=safe[:10], idx=safe[10], mines=mines)
+
+    bench('coeff: formula', 'calc_miner_coeff(mines, 10, 25 - mines)', namespace)
+    bench('coeff: table', 'miner_coeff(mines, 10)', namespace)
+    bench('popcount: bin().count', "bin(opened).count('1')", namespace)
+    bench('popcount: int.bit_count', 'popcount(opened)', namespace)
+    bench('move: lists', 'old_move(mine_list, list(opened_list), idx)', namespace)
+    bench('move: masks', 'new_move(board, mines, opened, idx)', namespace)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4193 @@
+"""Bot core: config, database, caches, games and the callback router.
+
+Общее ядро для скрипта запуска (обработчики сообщений, main) и пакета
+handlers/ (обработчики кнопок): оба импортируют его как модуль bot.
+"""
+import os
+import sqlite3
+import random
+import time
+import threading
+import json
+import re
+import atexit
+import bisect
+import functools
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter, Unauthorized, NetworkError
+from telegram.ext import CallbackContext
+from miner_engine import MINER_COEFFS, cell_index, deal_board, mask_positions, popcount, reveal
+
+# ─────────── КОНФИГУРАЦИЯ ───────────
+ADMINS = [5237005284]  # ID админа
+
+GAME_EMOJIS = {
+    'Монетка': '🪙',
+    'Минёр': '⛏️',
+    'Джетпак': '🚀',
+    'Слоты': '🎰',
+    'Башня': '🗼',
+    'Свечи': '📊',
+}
+
+# Список всех игр для фильтров (всегда доступен)
+ALL_GAMES = list(GAME_EMOJIS.keys())
+
+def format_game_detail(gname, details_raw, amount, is_win, created_at, is_rolled_back=False):
+    """Format a detailed game history view with proof data."""
+    emoji = GAME_EMOJIS.get(gname, '🎮')
+    sign = '+' if is_win else '-'
+    # Используем format_number для больших значений
+    amount_str = format_number(amount)
+    result_line = f"{'✅ Выигрыш' if is_win else '❌ Проигрыш'} │ {sign}{amount_str} 💰"
+    sep = "━━━━━━━━━━━━━━━━"
+    try:
+        data = json.loads(details_raw)
+    except Exception:
+        return f"{emoji} {gname}\n{sep}\n{result_line}\n{sep}\n📝 {details_raw}\n📅 {created_at}"
+
+    lines = [f"{emoji} {gname.upper()}", sep, result_line, sep]
+
+    if gname == 'Монетка':
+        bet = data.get('bet', '?')
+        moves = data.get('moves', [])
+        coeff = data.get('coeff', 1)
+        bet_str = format_number(bet) if isinstance(bet, int) else str(bet)
+        lines.append(f"💰 Ставка: {bet_str} | Коэффициент: x{coeff:.0f}")
+        if moves:
+            # Ограничиваем количество ходов для вывода (максимум 10)
+            moves_display = moves[:10]
+            if len(moves) > 10:
+                moves_display.append(f"...(+{len(moves)-10})")
+            lines.append(f"🎲 Ходы: {' → '.join(moves_display)}")
+
+    elif gname == 'Минёр':
+        bet = data.get('bet', '?')
+        mines_n = data.get('mines', '?')
+        cleared = data.get('cleared', 0)
+        mine_pos = set(data.get('mine_positions', []))
+        bet_str = format_number(bet) if isinstance(bet, int) else str(bet)
+        lines.append(f"💰 Ставка: {bet_str} | 💣 Мин: {mines_n} | ✅ Открыто: {cleared}")
+        lines.append(sep)
+        lines.append("🗺️ Поле (💣=мина, 🟩=безопасно):")
+        for row in range(5):
+            cells_row = ["💣" if cell_index(row, col) in mine_pos else "🟩" for col in range(5)]
+            lines.append(" ".join(cells_row))
+
+    elif gname == 'Башня':
+        bet = data.get('bet', '?')
+        traps = data.get('traps', [])
+        floor_reached = data.get('floor_reached', 0)
+        traps_count = data.get('traps_count', 1)
+        result = data.get('result', '')
+        bet_str = format_number(bet) if isinstance(bet, int) else str(bet)
+        lines.append(f"💰 Ставка: {bet_str} | Этажей: {floor_reached}/{TOWER_FLOORS} | 💣: {traps_count}")
+        lines.append(sep)
+        lines.append("🗺️ Карта башни (💣=ловушка):")
+        # Ограничиваем вывод только для пройденных этажей + 2 этажа выше
+        max_floor_to_show = min(len(traps), TOWER_FLOORS)
+        start_floor = max(0, max_floor_to_show - 12)  # Показываем максимум 12 этажей
+        for f in range(max_floor_to_show - 1, start_floor - 1, -1):
+            if f >= len(traps):
+                continue
+            floor_traps = traps[f]
+            cells = []
+            for c in range(3):
+                # Для совместимости: если floor_traps - число, преобразуем в список
+                if isinstance(floor_traps, int):
+                    floor_traps = [floor_traps]
+                cells.append("💣" if c in floor_traps else "⬜")
+            if f >= floor_reached and not (f == floor_reached - 1 and result in ('cashout', 'top')):
+                if result == 'boom' and f == floor_reached:
+                    status = "💥"
+                elif f > floor_reached or (result == 'boom' and f >= floor_reached):
+                    status = "⬆️"
+                else:
+                    status = "✅"
+            else:
+                status = "✅"
+            lines.append(f"Эт.{f+1}: {' '.join(cells)}  {status}")
+        if max_floor_to_show > 8:
+            lines.append("... (остальные этажи скрыты)")
+
+    elif gname == 'Джетпак':
+        bet = data.get('bet', '?')
+        crash = data.get('crash', 0)
+        collect = data.get('collect', None)
+        result = data.get('result', '')
+        bet_str = format_number(bet) if isinstance(bet, int) else str(bet)
+        lines.append(f"💰 Ставка: {bet_str}")
+        lines.append(f"💥 Краш был на: {crash:.2f}x")
+        if collect:
+            action = "🤖 Авто-сбор" if result == 'auto' else "✋ Забрал"
+            lines.append(f"{action} на: {collect:.2f}x")
+        else:
+            lines.append("💸 Не успел забрать")
+
+    elif gname == 'Слоты':
+        bet = data.get('bet', '?')
+        reels = data.get('reels', [])
+        mult = data.get('mult', 0)
+        bet_str = format_number(bet) if isinstance(bet, int) else str(bet)
+        lines.append(f"💰 Ставка: {bet_str}")
+        if reels:
+            lines.append(f"🎰 Барабаны: {' │ '.join(reels)}")
+        lines.append("🎉 Множитель: x" + str(mult) if mult > 1 else ("↩️ Возврат ставки" if mult == 1 else "💸 Промах"))
+
+    elif gname == 'Свечи':
+        bet = data.get('bet', '?')
+        moves = data.get('moves', [])
+        coeff = data.get('coeff', 1)
+        result = data.get('result', '')
+        bet_str = format_number(bet) if isinstance(bet, int) else str(bet)
+        lines.append(f"💰 Ставка: {bet_str} | Коэффициент: x{coeff:.1f}")
+        if moves:
+            # Ограничиваем количество ходов для вывода (максимум 10)
+            moves_display = moves[:10]
+            if len(moves) > 10:
+                moves_display.append(f"...(+{len(moves)-10})")
+            lines.append(f"📊 Ходы: {' → '.join(moves_display)}")
+
+    lines.append(sep)
+    # Форматируем дату правильно
+    if created_at:
+        # created_at может быть строкой в формате ISO или timestamp
+        try:
+            if isinstance(created_at, str):
+                # Убираем пробелы и проверяем формат
+                created_at = created_at.strip()
+                # Если есть T (ISO формат) или пробел
+                if 'T' in created_at:
+                    date_part = created_at.split('T')[0]
+                elif ' ' in created_at:
+                    date_part = created_at.split(' ')[0]
+                else:
+                    date_part = created_at[:10] if len(created_at) >= 10 else created_at
+                
+                # Проверяем, что дата валидна (формат YYYY-MM-DD)
+                if len(date_part) == 10 and date_part.count('-') == 2:
+                    lines.append(f"📅 {date_part}")
+                else:
+                    lines.append(f"📅 {created_at}")
+            else:
+                # Если это число (timestamp)
+                try:
+                    dt = datetime.fromtimestamp(float(created_at))
+                    lines.append(f"📅 {dt.strftime('%Y-%m-%d')}")
+                except:
+                    lines.append(f"📅 {created_at}")
+        except Exception as e:
+            lines.append(f"📅 Дата неизвестна")
+    else:
+        lines.append(f"📅 Дата неизвестна")
+
+    # Проверяем is_rolled_back: 1 = откатан, 0 или None = не откатан
+    if is_game_rolled_back(is_rolled_back):
+        lines.append(sep)
+        lines.append("↩️ Эта игра была откачена")
+
+    # Проверяем длину сообщения и обрезаем если нужно (лимит 4000 символов для безопасности)
+    result = "\n".join(lines)
+    if len(result) > 4000:
+        # Обрезаем с конца, оставляя начало
+        result = result[:3950] + "\n... (текст обрезан)"
+
+    return result
+
+DB_PATH = 'users.db'
+
+# ─────────── DB STORAGE SETTINGS ───────────
+# Любую настройку можно переопределить переменной окружения DB_<ИМЯ>,
+# например DB_SYNCHRONOUS=FULL или DB_MMAP_SIZE=0.
+DB_JOURNAL_MODE = os.getenv('DB_JOURNAL_MODE', 'WAL')
+DB_BUSY_TIMEOUT = int(os.getenv('DB_BUSY_TIMEOUT', '30000'))  # мс
+
+# PRAGMA -> значение, применяется к каждому новому соединению пула
+DB_PRAGMAS = {
+    'synchronous': os.getenv('DB_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': DB_BUSY_TIMEOUT,
+    'cache_size': int(os.getenv('DB_CACHE_SIZE', '-16000')),  # < 0 - в КиБ
+    'mmap_size': int(os.getenv('DB_MMAP_SIZE', str(128 * 1024 * 1024))),
+    'temp_store': os.getenv('DB_TEMP_STORE', 'MEMORY'),
+}
+
+# ─────────── DB CONNECTION POOL ───────────
+# Каждый поток (воркеры диспетчера, потоки джетпака) держит одно своё
+# соединение и переиспользует его вместо sqlite3.connect() на каждый вызов.
+DB_TIMEOUT = DB_BUSY_TIMEOUT / 1000
+
+_db_local = threading.local()
+_db_connections = {}  # thread ident -> connection
+_db_connections_lock = threading.Lock()
+
+def _open_db_connection():
+    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT, check_same_thread=False)
+    for name, value in DB_PRAGMAS.items():
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+def get_db_connection():
+    """Return this thread's pooled connection, opening it on first use"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = _open_db_connection()
+        _db_local.conn = conn
+        _db_local.depth = 0
+        ident = threading.get_ident()
+        with _db_connections_lock:
+            # Закрываем соединения потоков, которые уже завершились
+            alive = {t.ident for t in threading.enumerate()}
+            for dead in [i for i in _db_connections if i not in alive or i == ident]:
+                try:
+                    _db_connections.pop(dead).close()
+                except Exception:
+                    pass
+            _db_connections[ident] = conn
+    return conn
+
+@contextmanager
+def db_cursor(immediate=False):
+    """Cursor on the thread's pooled connection.
+
+    Blocks can be nested: only the outermost one commits (or rolls back on
+    an exception), so helpers called inside a block join its transaction.
+    immediate=True takes the write lock up front (BEGIN IMMEDIATE), so a
+    read-then-write block waits on busy_timeout instead of failing with
+    "database is locked" when another writer got there first.
+    """
+    conn = get_db_connection()
+    if immediate and _db_local.depth == 0 and not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    _db_local.depth += 1
+    ok = False
+    try:
+        yield conn.cursor()
+        ok = True
+    finally:
+        _db_local.depth -= 1
+        if _db_local.depth == 0:
+            if conn.in_transaction:
+                if ok:
+                    conn.commit()
+                else:
+                    conn.rollback()
+            callbacks = getattr(_db_local, 'on_commit', None)
+            if callbacks:
+                _db_local.on_commit = []
+                if ok:
+                    for callback in callbacks:
+                        callback()
+
+def db_on_commit(callback):
+    """Run callback after the enclosing db_cursor block commits (now if there is none)
+
+    Callbacks of a block that rolls back are dropped, so in-memory mirrors of
+    the DB (leaderboard) never see changes that did not happen.
+    """
+    if getattr(_db_local, 'depth', 0) == 0:
+        callback()
+        return
+    if getattr(_db_local, 'on_commit', None) is None:
+        _db_local.on_commit = []
+    _db_local.on_commit.append(callback)
+
+def release_db_connection():
+    """Close the current thread's connection (for short-lived threads)"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        return
+    _db_local.conn = None
+    with _db_connections_lock:
+        if _db_connections.get(threading.get_ident()) is conn:
+            del _db_connections[threading.get_ident()]
+    conn.close()
+
+def apply_journal_mode():
+    """Switch the database file to DB_JOURNAL_MODE (persists in the file)"""
+    conn = get_db_connection()
+    mode = conn.execute(f'PRAGMA journal_mode={DB_JOURNAL_MODE}').fetchone()[0]
+    if mode.lower() != DB_JOURNAL_MODE.lower():
+        print(f"[DB] WARNING: journal_mode={DB_JOURNAL_MODE} не включился, текущий режим: {mode}")
+    return mode
+
+def check_db_settings():
+    """Startup self-check: print the effective storage settings"""
+    conn = get_db_connection()
+    names = {
+        'synchronous': {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'},
+        'temp_store': {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'},
+    }
+    settings = {}
+    for pragma in ['journal_mode'] + list(DB_PRAGMAS):
+        value = conn.execute(f'PRAGMA {pragma}').fetchone()
+        value = value[0] if value else None
+        settings[pragma] = names.get(pragma, {}).get(value, value)
+    print(f"[DB] SQLite {sqlite3.sqlite_version}, файл {DB_PATH}")
+    print("[DB] " + ", ".join(f"{k}={v}" for k, v in settings.items()))
+
+    expected = dict(DB_PRAGMAS, journal_mode=DB_JOURNAL_MODE)
+    for pragma, value in expected.items():
+        if str(settings[pragma]).lower() != str(value).lower():
+            print(f"[DB] WARNING: {pragma}={settings[pragma]}, ожидалось {value}")
+    return settings
+
+def close_all_db_connections():
+    """Close every pooled connection, called on shutdown"""
+    with _db_connections_lock:
+        conns = list(_db_connections.values())
+        _db_connections.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+# ─────────── GLOBAL JETPACK STATE ───────────
+# uid -> {'active': bool, 'crash': float, 'current': float, 'bet': int, 'crashed': bool, ...}
+# Читать и менять состояние полёта — только под jp_lock (тикер и обработчики
+# кнопок работают в разных потоках)
+jp_games = {}
+jp_lock = threading.Lock()
+
+# ─────────── DATABASE ───────────
+
+def init_db():
+    apply_journal_mode()
+    with db_cursor() as c:
+        c.execute('''CREATE TABLE IF NOT EXISTS game_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uid INTEGER,
+            game_name TEXT,
+            details TEXT,
+            amount INTEGER,
+            is_win INTEGER,
+            is_rolled_back INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''')
+        c.execute("PRAGMA table_info(users)")
+        cols = [r[1] for r in c.fetchall()]
+        needed = ['last_hourly', 'jetpack_best', 'jetpack_auto', 'referrer_id', 'total_refs', 'last_wheel', 'registration_time', 'last_activity', 'daily_refs', 'last_daily_ref_reset', 'is_blocked', 'channel_subscribed', 'channel_reward_received', 'channel_last_check']
+        if cols and not all(col in cols for col in needed):
+            # Migrate: rebuild table with all columns
+            c.execute("ALTER TABLE users RENAME TO users_old")
+            c.execute('''CREATE TABLE users (
+                id INTEGER PRIMARY KEY, username TEXT DEFAULT '',
+                coins INTEGER DEFAULT 500, last_hourly TEXT DEFAULT NULL,
+                consecutive_wins INTEGER DEFAULT 0, jetpack_best REAL DEFAULT 0.0,
+                jetpack_auto REAL DEFAULT 0.0,
+                referrer_id INTEGER DEFAULT NULL, total_refs INTEGER DEFAULT 0,
+                last_wheel TEXT DEFAULT NULL,
+                registration_time TEXT DEFAULT NULL,
+                last_activity TEXT DEFAULT NULL,
+                daily_refs INTEGER DEFAULT 0,
+                last_daily_ref_reset TEXT DEFAULT NULL,
+                is_blocked INTEGER DEFAULT 0,
+                channel_subscribed INTEGER DEFAULT 0,
+                channel_reward_received INTEGER DEFAULT 0,
+                channel_last_check TEXT DEFAULT NULL)''')
+            try:
+                c.execute('''INSERT INTO users (id, username, coins, last_hourly, consecutive_wins, jetpack_best, jetpack_auto, referrer_id, total_refs, last_wheel, registration_time, last_activity)
+                             SELECT id, username, coins,
+                                    COALESCE(last_hourly, NULL),
+                                    COALESCE(consecutive_wins, 0),
+                                    COALESCE(jetpack_best, 0.0),
+                                    COALESCE(jetpack_auto, 0.0),
+                                    COALESCE(referrer_id, NULL),
+                                    COALESCE(total_refs, 0),
+                                    COALESCE(last_wheel, NULL),
+                                    COALESCE(registration_time, NULL),
+                                    COALESCE(last_activity, NULL)
+                             FROM users_old''')
+            except Exception:
+                pass
+            c.execute("DROP TABLE users_old")
+        else:
+            c.execute('''CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY, username TEXT DEFAULT '',
+                coins INTEGER DEFAULT 500, last_hourly TEXT DEFAULT NULL,
+                consecutive_wins INTEGER DEFAULT 0, jetpack_best REAL DEFAULT 0.0,
+                jetpack_auto REAL DEFAULT 0.0,
+                referrer_id INTEGER DEFAULT NULL, total_refs INTEGER DEFAULT 0,
+                last_wheel TEXT DEFAULT NULL,
+                registration_time TEXT DEFAULT NULL,
+                last_activity TEXT DEFAULT NULL,
+                daily_refs INTEGER DEFAULT 0,
+                last_daily_ref_reset TEXT DEFAULT NULL,
+                is_blocked INTEGER DEFAULT 0,
+                channel_subscribed INTEGER DEFAULT 0,
+                channel_reward_received INTEGER DEFAULT 0,
+                channel_last_check TEXT DEFAULT NULL)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS promocodes (
+            code TEXT PRIMARY KEY, reward INTEGER,
+            uses INTEGER DEFAULT 0, max_uses INTEGER DEFAULT NULL)''')
+
+        # Расширенная таблица промокодов
+        c.execute("PRAGMA table_info(promocodes)")
+        promo_cols = [r[1] for r in c.fetchall()]
+        promo_needed = ['deleted', 'max_per_user', 'created_by', 'created_at']
+        if not promo_cols or not all(col in promo_cols for col in promo_needed):
+            c.execute("ALTER TABLE promocodes RENAME TO promocodes_old")
+            c.execute('''CREATE TABLE promocodes (
+                code TEXT PRIMARY KEY,
+                reward INTEGER,
+                uses INTEGER DEFAULT 0,
+                max_uses INTEGER DEFAULT NULL,
+                max_per_user INTEGER DEFAULT 1,
+                deleted INTEGER DEFAULT 0,
+                created_by INTEGER DEFAULT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+            try:
+                c.execute('''INSERT INTO promocodes (code, reward, uses, max_uses)
+                             SELECT code, reward, uses, max_uses FROM promocodes_old''')
+            except Exception:
+                pass
+            c.execute("DROP TABLE promocodes_old")
+        else:
+            c.execute('''CREATE TABLE IF NOT EXISTS promocodes (
+                code TEXT PRIMARY KEY,
+                reward INTEGER,
+                uses INTEGER DEFAULT 0,
+                max_uses INTEGER DEFAULT NULL,
+                max_per_user INTEGER DEFAULT 1,
+                deleted INTEGER DEFAULT 0,
+                created_by INTEGER DEFAULT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+        # Новые таблицы
+        c.execute('''CREATE TABLE IF NOT EXISTS promo_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT,
+            uid INTEGER,
+            used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (code) REFERENCES promocodes(code),
+            FOREIGN KEY (uid) REFERENCES users(id))''')
+
+        # Миграция для добавления created_at в promo_usage если её нет
+        c.execute("PRAGMA table_info(promo_usage)")
+        pu_cols = [r[1] for r in c.fetchall()]
+        if pu_cols and 'created_at' not in pu_cols:
+            c.execute("ALTER TABLE promo_usage ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+
+        c.execute('''CREATE TABLE IF NOT EXISTS admin_broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message_type TEXT DEFAULT 'text',
+            content TEXT,
+            file_id TEXT,
+            scheduled_at TIMESTAMP,
+            sent_at TIMESTAMP,
+            status TEXT DEFAULT 'pending',
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS admin_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER,
+            action TEXT,
+            target_type TEXT,
+            target_id INTEGER,
+            details TEXT,
+            is_rolled_back INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+        # Миграция для удаления промокода glino228 и записей использования
+        c.execute('DELETE FROM promo_usage WHERE code=?', ('glino228',))
+        c.execute('DELETE FROM promocodes WHERE code=?', ('glino228',))
+
+        # Миграция таблицы admin_logs если она существует в старом формате
+        c.execute("PRAGMA table_info(admin_logs)")
+        log_cols = [r[1] for r in c.fetchall()]
+        if log_cols and 'admin_id' not in log_cols:
+            # Таблица существует но без admin_id - пересоздаём
+            c.execute("ALTER TABLE admin_logs RENAME TO admin_logs_old")
+            c.execute('''CREATE TABLE admin_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                admin_id INTEGER,
+                action TEXT,
+                target_type TEXT,
+                target_id INTEGER,
+                details TEXT,
+                is_rolled_back INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+            try:
+                c.execute('''INSERT INTO admin_logs (action, target_type, target_id, details, created_at)
+                             SELECT action, target_type, target_id, details, created_at FROM admin_logs_old''')
+            except Exception:
+                pass
+            c.execute("DROP TABLE admin_logs_old")
+        elif log_cols and 'is_rolled_back' not in log_cols:
+            # Добавляем поле is_rolled_back если его нет
+            c.execute("ALTER TABLE admin_logs ADD COLUMN is_rolled_back INTEGER DEFAULT 0")
+
+        # Миграция таблицы admins
+        c.execute("PRAGMA table_info(admins)")
+        admin_cols = [r[1] for r in c.fetchall()]
+        if admin_cols and 'added_by' not in admin_cols:
+            # Таблица существует но в старом формате - пересоздаём
+            c.execute("ALTER TABLE admins RENAME TO admins_old")
+            c.execute('''CREATE TABLE admins (
+                id INTEGER PRIMARY KEY,
+                added_by INTEGER,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+            try:
+                c.execute('''INSERT INTO admins (id)
+                             SELECT id FROM admins_old''')
+            except Exception:
+                pass
+            c.execute("DROP TABLE admins_old")
+        else:
+            c.execute('''CREATE TABLE IF NOT EXISTS admins (
+                id INTEGER PRIMARY KEY,
+                added_by INTEGER,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+        # Добавляем админа по умолчанию если его нет
+        c.execute("INSERT OR IGNORE INTO admins (id, added_by) VALUES (?, ?)", (ADMINS[0] if ADMINS else 0, 0))
+
+        # Миграция таблицы game_history для добавления is_rolled_back
+        c.execute("PRAGMA table_info(game_history)")
+        gh_cols = [r[1] for r in c.fetchall()]
+        if gh_cols and 'is_rolled_back' not in gh_cols:
+            c.execute("ALTER TABLE game_history ADD COLUMN is_rolled_back INTEGER DEFAULT 0")
+
+        # Исправление null значений в is_rolled_back - заменяем на 0
+        # (после этого запросы фильтруют просто is_rolled_back=0 и попадают в индексы)
+        c.execute("UPDATE game_history SET is_rolled_back = 0 WHERE is_rolled_back IS NULL")
+        c.execute("UPDATE admin_logs SET is_rolled_back = 0 WHERE is_rolled_back IS NULL")
+
+        apply_migrations(c)
+
+    check_query_plans()
+    leaderboard.load()
+
+# ─────────── STATS ROLLUPS ───────────
+# Админская статистика читает не game_history / promo_usage / users целиком,
+# а дневные агрегаты. Агрегаты правятся в тех же транзакциях, что и
+# исходные строки: вставка истории (flush_game_log / settle_games),
+# регистрация, активация промокода и удаления. День берётся из первых
+# десяти символов метки времени, как в старых запросах `x > date('now', ...)`.
+# Откат игры статистику не меняет: она и раньше считала откатанные игры.
+STATS_PERIOD_MODIFIERS = {'day': '-1 day', 'week': '-7 days', 'month': '-1 month', 'year': '-1 year'}
+
+def _rollup_game_rows(c, rows, sign=1):
+    """Add (or with sign=-1 subtract) game_history rows to the daily rollups"""
+    totals, players = {}, set()
+    for uid, name, details, amount, is_win, created_at in rows:
+        key = ((created_at or '')[:10], name)
+        t = totals.setdefault(key, [0, 0, 0, 0, 0])
+        t[0] += 1
+        if is_win:
+            t[1] += 1
+            t[3] += amount or 0
+        else:
+            t[2] += 1
+            t[4] += amount or 0
+        players.add((key[0], name, uid))
+    c.executemany('''INSERT INTO stats_daily_games (day, game_name, games, wins, losses, won, lost)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT(day, game_name) DO UPDATE SET
+                         games=games+excluded.games, wins=wins+excluded.wins, losses=losses+excluded.losses,
+                         won=won+excluded.won, lost=lost+excluded.lost''',
+                  [(day, name, *(sign * v for v in t)) for (day, name), t in totals.items()])
+    if sign > 0:
+        c.executemany('INSERT OR IGNORE INTO stats_daily_players (game_name, day, uid) VALUES (?, ?, ?)',
+                      [(name, day, uid) for day, name, uid in players])
+
+def _rollup_count(c, counter, day, delta):
+    c.execute('''INSERT INTO stats_daily_counters (day, counter, value) VALUES (?, ?, ?)
+                 ON CONFLICT(day, counter) DO UPDATE SET value=value+excluded.value''', (day, counter, delta))
+
+def rollup_new_user(c, registration_time):
+    _rollup_count(c, 'new_users', (registration_time or '')[:10], 1)
+
+def rollup_promo_used(c):
+    # used_at заполняется CURRENT_TIMESTAMP, поэтому и день берём в SQLite (UTC)
+    c.execute("SELECT date('now')")
+    _rollup_count(c, 'promos_used', c.fetchone()[0], 1)
+
+def rollup_forget_promo_usage(c, where, params=()):
+    """Subtract promo_usage rows matching where; call right before deleting them"""
+    c.execute(f"SELECT COALESCE(substr(used_at, 1, 10), ''), COUNT(*) FROM promo_usage WHERE {where} GROUP BY 1", params)
+    for day, n in c.fetchall():
+        _rollup_count(c, 'promos_used', day, -n)
+
+def rollup_forget_user_games(c, uid):
+    """Subtract a user's games; call right before deleting them"""
+    c.execute('SELECT uid, game_name, details, amount, is_win, created_at FROM game_history WHERE uid=?', (uid,))
+    _rollup_game_rows(c, c.fetchall(), sign=-1)
+    c.execute('DELETE FROM stats_daily_players WHERE uid=?', (uid,))
+
+def rollup_forget_registration(c, uid):
+    c.execute('SELECT registration_time FROM users WHERE id=?', (uid,))
+    row = c.fetchone()
+    if row:
+        _rollup_count(c, 'new_users', (row[0] or '')[:10], -1)
+
+def rebuild_stats_rollups(c):
+    """Recompute every rollup table from the raw tables"""
+    for table in ('stats_daily_games', 'stats_daily_players', 'stats_daily_counters'):
+        c.execute(f'DELETE FROM {table}')
+    c.execute('''INSERT INTO stats_daily_games (day, game_name, games, wins, losses, won, lost)
+                 SELECT COALESCE(substr(created_at, 1, 10), ''), game_name, COUNT(*),
+                        SUM(is_win=1), SUM(is_win=0),
+                        COALESCE(SUM(CASE WHEN is_win=1 THEN amount END), 0),
+                        COALESCE(SUM(CASE WHEN is_win=0 THEN amount END), 0)
+                 FROM game_history GROUP BY 1, 2''')
+    c.execute('''INSERT OR IGNORE INTO stats_daily_players (game_name, day, uid)
+                 SELECT game_name, COALESCE(substr(created_at, 1, 10), ''), uid FROM game_history''')
+    c.execute('''INSERT INTO stats_daily_counters (day, counter, value)
+                 SELECT COALESCE(substr(registration_time, 1, 10), ''), 'new_users', COUNT(*) FROM users GROUP BY 1''')
+    c.execute('''INSERT INTO stats_daily_counters (day, counter, value)
+                 SELECT COALESCE(substr(used_at, 1, 10), ''), 'promos_used', COUNT(*) FROM promo_usage GROUP BY 1''')
+
+# ─────────── SCHEMA MIGRATIONS ───────────
+# Версионированные миграции поверх init_db. Номер последней применённой
+# версии хранится в PRAGMA user_version, каждая версия применяется один раз.
+# Шаг - SQL-строка или функция, принимающая курсор.
+DB_MIGRATIONS = [
+    (1, 'индексы для истории, статистики, промокодов и логов', [
+        # История игрока: uid + откат, сортировка по id DESC
+        'CREATE INDEX IF NOT EXISTS idx_game_history_user ON game_history(uid, is_rolled_back, id)',
+        'CREATE INDEX IF NOT EXISTS idx_game_history_user_game ON game_history(uid, game_name, is_rolled_back, id)',
+        # Лента игр в админке
+        'CREATE INDEX IF NOT EXISTS idx_game_history_rolled ON game_history(is_rolled_back, id)',
+        # Статистика по периодам
+        'CREATE INDEX IF NOT EXISTS idx_game_history_created ON game_history(created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_game_history_game_created ON game_history(game_name, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_promo_usage_user_code ON promo_usage(uid, code)',
+        'CREATE INDEX IF NOT EXISTS idx_promo_usage_code ON promo_usage(code)',
+        'CREATE INDEX IF NOT EXISTS idx_promo_usage_used_at ON promo_usage(used_at)',
+        'CREATE INDEX IF NOT EXISTS idx_admin_logs_rolled ON admin_logs(is_rolled_back, id)',
+        'CREATE INDEX IF NOT EXISTS idx_users_referrer ON users(referrer_id)',
+    ]),
+    (2, 'дневные агрегаты для админской статистики', [
+        '''CREATE TABLE IF NOT EXISTS stats_daily_games (
+            day TEXT NOT NULL,
+            game_name TEXT NOT NULL,
+            games INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            won INTEGER NOT NULL DEFAULT 0,
+            lost INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, game_name)) WITHOUT ROWID''',
+        # Уникальные игроки не суммируются по дням, поэтому храним сами пары
+        '''CREATE TABLE IF NOT EXISTS stats_daily_players (
+            game_name TEXT NOT NULL,
+            day TEXT NOT NULL,
+            uid INTEGER NOT NULL,
+            PRIMARY KEY (game_name, day, uid)) WITHOUT ROWID''',
+        # new_users, promos_used
+        '''CREATE TABLE IF NOT EXISTS stats_daily_counters (
+            day TEXT NOT NULL,
+            counter TEXT NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, counter)) WITHOUT ROWID''',
+        rebuild_stats_rollups,
+    ]),
+    (3, 'очередь рассылок', [
+        'ALTER TABLE admin_broadcasts ADD COLUMN progress_chat_id INTEGER',
+        'ALTER TABLE admin_broadcasts ADD COLUMN progress_msg_id INTEGER',
+        # status: 0 ждёт, 1 отправлено, 2 ошибка, 3 бот заблокирован
+        '''CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            broadcast_id INTEGER NOT NULL,
+            uid INTEGER NOT NULL,
+            status INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            PRIMARY KEY (broadcast_id, uid)) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS bot_blocked_users (
+            uid INTEGER PRIMARY KEY,
+            blocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    ]),
+    (4, 'расписание рассылок', [
+        'ALTER TABLE admin_broadcasts ADD COLUMN repeat_every INTEGER',
+        'CREATE INDEX IF NOT EXISTS idx_broadcasts_status_scheduled ON admin_broadcasts(status, scheduled_at)',
+    ]),
+    (5, 'индекс для проверки подписки на канал', [
+        'CREATE INDEX IF NOT EXISTS idx_users_channel_check ON users(channel_reward_received, channel_last_check)',
+    ]),
+    (6, 'очередь реферальных бонусов', [
+        '''CREATE TABLE IF NOT EXISTS pending_referrals (
+            uid INTEGER PRIMARY KEY,
+            referrer_id INTEGER NOT NULL,
+            due_at TEXT NOT NULL,
+            awarded_at TEXT)''',
+        'CREATE INDEX IF NOT EXISTS idx_pending_referrals_due ON pending_referrals(due_at) WHERE awarded_at IS NULL',
+    ]),
+    (7, 'индексы для удаления и отката игрока', [
+        'CREATE INDEX IF NOT EXISTS idx_admin_logs_admin ON admin_logs(admin_id)',
+        'CREATE INDEX IF NOT EXISTS idx_admin_logs_target ON admin_logs(target_id, target_type, action)',
+        'CREATE INDEX IF NOT EXISTS idx_stats_daily_players_uid ON stats_daily_players(uid)',
+    ]),
+    (8, 'порционные глобальные операции с балансом', [
+        # Задание живёт под id своей записи в admin_logs.
+        # status: running (применяется), undo / redo (откат по журналу), done
+        '''CREATE TABLE IF NOT EXISTS balance_jobs (
+            log_id INTEGER PRIMARY KEY,
+            op TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            last_uid INTEGER NOT NULL DEFAULT 0,
+            affected INTEGER NOT NULL DEFAULT 0,
+            progress_chat_id INTEGER,
+            progress_msg_id INTEGER)''',
+        # Точное изменение баланса каждого игрока, для отката
+        '''CREATE TABLE IF NOT EXISTS balance_ledger (
+            log_id INTEGER NOT NULL,
+            uid INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            PRIMARY KEY (log_id, uid)) WITHOUT ROWID''',
+    ]),
+    (9, 'журнал движения монет', [
+        # reason - COIN_* код, ref - id игры / лога / использования промокода
+        '''CREATE TABLE IF NOT EXISTS coin_ledger (
+            id INTEGER PRIMARY KEY,
+            uid INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            reason INTEGER NOT NULL,
+            ref INTEGER,
+            ts INTEGER NOT NULL)''',
+        'CREATE INDEX IF NOT EXISTS idx_coin_ledger_user ON coin_ledger(uid, id)',
+        'CREATE INDEX IF NOT EXISTS idx_coin_ledger_admin ON coin_ledger(ref) WHERE reason=5',
+        # Баланс игрока по журналу до ledger_id включительно. Стартовые
+        # балансы существующих игроков - точка отсчёта журнала
+        '''CREATE TABLE IF NOT EXISTS coin_checkpoints (
+            uid INTEGER PRIMARY KEY,
+            coins INTEGER NOT NULL,
+            ledger_id INTEGER NOT NULL)''',
+        'INSERT OR IGNORE INTO coin_checkpoints (uid, coins, ledger_id) SELECT id, COALESCE(coins, 0), 0 FROM users',
+    ]),
+    (10, 'начатые раунды игр', [
+        # state - JSON упакованного раунда (pack() класса из GAME_SESSION_TYPES)
+        '''CREATE TABLE IF NOT EXISTS game_sessions (
+            uid INTEGER NOT NULL,
+            game TEXT NOT NULL,
+            state TEXT NOT NULL,
+            updated_at INTEGER NOT NULL,
+            PRIMARY KEY (uid, game)) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS idx_game_sessions_updated ON game_sessions(updated_at)',
+    ]),
+    (11, 'ставка начатого раунда', [
+        # id строки coin_ledger, которой place_bet списал ставку раунда
+        'ALTER TABLE game_sessions ADD COLUMN stake INTEGER',
+    ]),
+]
+
+def apply_migrations(c):
+    """Apply DB_MIGRATIONS newer than the database's user_version"""
+    c.execute('PRAGMA user_version')
+    version = c.fetchone()[0]
+    for target, description, steps in DB_MIGRATIONS:
+        if target <= version:
+            continue
+        for step in steps:
+            if callable(step):
+                step(c)
+            else:
+                c.execute(step)
+        c.execute(f'PRAGMA user_version={int(target)}')
+        print(f"[DB] Миграция {target}: {description}")
+        version = target
+    return version
+
+# Горячие запросы, которые обязаны идти по индексу: (название, SQL, параметры)
+HOT_QUERY_PLANS = [
+    ('история игрока',
+     'SELECT id, game_name, amount, is_win, is_rolled_back, created_at FROM game_history '
+     'WHERE uid=? AND is_rolled_back=0 ORDER BY id DESC LIMIT 5', (0,)),
+    ('история игрока по игре',
+     'SELECT id, game_name, amount, is_win, is_rolled_back, created_at FROM game_history '
+     'WHERE uid=? AND is_rolled_back=0 AND game_name=? AND is_win=? ORDER BY id DESC LIMIT 5', (0, '', 1)),
+    ('история игрока по нескольким играм',
+     'SELECT id, game_name, amount, is_win, is_rolled_back, created_at FROM game_history '
+     'WHERE uid=? AND is_rolled_back=0 AND +game_name IN (?, ?) AND id<=? ORDER BY id DESC LIMIT 6', (0, '', '', 0)),
+    ('счётчик истории', 'SELECT COUNT(*) FROM game_history WHERE uid=? AND is_rolled_back=0', (0,)),
+    ('статистика за период', "SELECT SUM(games) FROM stats_daily_games WHERE day >= date('now', '-1 day')", ()),
+    ('статистика игры за период',
+     "SELECT COUNT(DISTINCT uid) FROM stats_daily_players WHERE game_name=? AND day >= date('now', '-1 day')", ('',)),
+    ('лента игр в админке', 'SELECT * FROM game_history WHERE is_rolled_back=? ORDER BY id DESC LIMIT 10', (0,)),
+    ('использования промокода', 'SELECT COUNT(*) FROM promo_usage WHERE uid=? AND code=?', (0, '')),
+    ('счётчики за период',
+     "SELECT counter, SUM(value) FROM stats_daily_counters WHERE day >= date('now', '-1 day') GROUP BY counter", ()),
+    ('логи админов', 'SELECT * FROM admin_logs WHERE is_rolled_back=? ORDER BY id DESC LIMIT 10', (0,)),
+    ('наступившие рассылки',
+     "SELECT id FROM admin_broadcasts WHERE status='scheduled' AND scheduled_at<=? ORDER BY scheduled_at LIMIT 2",
+     ('',)),
+    ('проверка подписки',
+     'SELECT id FROM users WHERE channel_reward_received=1 AND (channel_last_check IS NULL OR channel_last_check<?) '
+     'ORDER BY channel_last_check LIMIT 100', ('',)),
+    ('наступившие реферальные бонусы',
+     'SELECT uid, referrer_id FROM pending_referrals WHERE awarded_at IS NULL AND due_at<=? ORDER BY due_at LIMIT 500',
+     ('',)),
+    ('логи об игроке', "SELECT id FROM admin_logs WHERE target_type='user' AND target_id=?", (0,)),
+    ('логи админа', 'SELECT id FROM admin_logs WHERE admin_id=?', (0,)),
+    ('игроки в статистике', 'SELECT game_name FROM stats_daily_players WHERE uid=?', (0,)),
+]
+
+def check_query_plans():
+    """EXPLAIN QUERY PLAN the hot queries; raise if any fell back to a scan"""
+    problems = []
+    with db_cursor() as c:
+        for name, sql, params in HOT_QUERY_PLANS:
+            c.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = [row[3] for row in c.fetchall()]
+            bad = [d for d in details if d.startswith('SCAN ') or d == 'USE TEMP B-TREE FOR ORDER BY']
+            if bad:
+                problems.append(f"{name}: {'; '.join(details)}")
+    if problems:
+        raise RuntimeError("Запросы без индекса:\n" + "\n".join(problems))
+
+# ─────────── USER ROW CACHE ───────────
+# Строка users с именованными полями (row.coins вместо row[2]).
+USER_COLUMNS = ('id', 'username', 'coins', 'last_hourly', 'consecutive_wins', 'jetpack_best',
+                'jetpack_auto', 'referrer_id', 'total_refs', 'last_wheel', 'registration_time',
+                'last_activity', 'daily_refs', 'last_daily_ref_reset', 'is_blocked',
+                'channel_subscribed', 'channel_reward_received', 'channel_last_check')
+UserRow = namedtuple('UserRow', USER_COLUMNS)
+USER_SELECT = f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE id=?"
+
+# На время обработки одного апдейта get_user читает строку из БД один раз,
+# дальше add_coins/set_field правят закэшированную копию.
+_user_cache_local = threading.local()
+
+@contextmanager
+def user_cache_scope():
+    """Cache get_user rows for the duration of one update"""
+    outer = getattr(_user_cache_local, 'rows', None)
+    if outer is None:
+        _user_cache_local.rows = {}
+    try:
+        yield
+    finally:
+        if outer is None:
+            _user_cache_local.rows = None
+
+def with_user_cache(handler):
+    """Decorator: run an update handler inside user_cache_scope()"""
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        with user_cache_scope():
+            return handler(*args, **kwargs)
+    return wrapper
+
+def _cached_users():
+    return getattr(_user_cache_local, 'rows', None)
+
+def _patch_cached_user(uid, **fields):
+    rows = _cached_users()
+    if rows and uid in rows:
+        rows[uid] = rows[uid]._replace(**fields)
+
+def invalidate_user_cache(uid=None):
+    """Drop cached rows after a raw UPDATE users (uid=None drops all)"""
+    rows = _cached_users()
+    if rows:
+        if uid is None:
+            rows.clear()
+        else:
+            rows.pop(uid, None)
+
+def get_user(uid):
+    rows = _cached_users()
+    if rows is not None and uid in rows:
+        return rows[uid]
+    with db_cursor() as c:
+        c.execute(USER_SELECT, (uid,))
+        row = c.fetchone()
+        if row is None:
+            now = datetime.now().isoformat()
+            c.execute('INSERT INTO users (id, coins, registration_time) VALUES (?, ?, ?)', (uid, START_COINS, now))
+            ledger_append(c, uid, START_COINS, COIN_START)
+            rollup_new_user(c, now)
+            db_on_commit(lambda: leaderboard.set_coins(uid, START_COINS, ''))
+            row = (uid, '', START_COINS, None, 0, 0.0, 0.0, None, 0, None, now, None, 0, None, 0, 0, 0, None)
+    row = UserRow(*row)
+    if rows is not None:
+        rows[uid] = row
+    return row
+
+def update_last_activity(uid):
+    """Update user's last activity timestamp (subscription is rechecked by sweep_channel_subscriptions)"""
+    set_field(uid, 'last_activity', datetime.now().isoformat())
+
+# ─────────── REFERRAL AWARDS ───────────
+# Бонус пригласившему начисляется не при подтверждении, а через
+# REFERRAL_DELAY: register_referral кладёт строку в pending_referrals, а задача
+# job_queue раз в REFERRAL_SWEEP_INTERVAL пачкой начисляет наступившие.
+# awarded_at отмечается в той же транзакции, что и начисление, поэтому бонус
+# за одного реферала не выдаётся дважды.
+REFERRAL_BONUS = 200
+REFERRAL_DELAY = timedelta(minutes=5)
+REFERRAL_SWEEP_INTERVAL = 30
+REFERRAL_SWEEP_BATCH = 500
+
+def register_referral(uid, referrer_id):
+    """Attach uid to referrer_id and queue the referrer's bonus; False if uid already has a referrer"""
+    due_at = (datetime.now() + REFERRAL_DELAY).isoformat()
+    with db_cursor(immediate=True) as c:
+        c.execute('UPDATE users SET referrer_id=? WHERE id=? AND referrer_id IS NULL', (referrer_id, uid))
+        if not c.rowcount:
+            return False
+        # Уже выданный когда-то бонус за этого uid повторно не ставится
+        c.execute('INSERT OR IGNORE INTO pending_referrals (uid, referrer_id, due_at) VALUES (?, ?, ?)',
+                  (uid, referrer_id, due_at))
+    _patch_cached_user(uid, referrer_id=referrer_id)
+    return True
+
+def forget_pending_referral(c, uid):
+    """Drop uid's unpaid referral bonus; True if there was one (referrer's total_refs was not bumped yet)"""
+    c.execute('DELETE FROM pending_referrals WHERE uid=? AND awarded_at IS NULL', (uid,))
+    return c.rowcount > 0
+
+def award_due_referrals(context):
+    """job_queue callback: pay out referral bonuses whose delay has passed"""
+    now = datetime.now().isoformat()
+    awarded = []
+    with db_cursor(immediate=True) as c:
+        c.execute('''SELECT uid, referrer_id FROM pending_referrals
+                     WHERE awarded_at IS NULL AND due_at<=? ORDER BY due_at LIMIT ?''',
+                  (now, REFERRAL_SWEEP_BATCH))
+        for uid, referrer_id in c.fetchall():
+            c.execute('SELECT 1 FROM users WHERE id=? AND referrer_id=? AND EXISTS (SELECT 1 FROM users WHERE id=?)',
+                      (uid, referrer_id, referrer_id))
+            if c.fetchone() is None:
+                # Реферала или пригласившего удалили, либо связь сброшена
+                c.execute('DELETE FROM pending_referrals WHERE uid=?', (uid,))
+                continue
+            c.execute('UPDATE pending_referrals SET awarded_at=? WHERE uid=?', (now, uid))
+            awarded.append(referrer_id)
+        per_referrer = {}
+        for referrer_id in awarded:
+            per_referrer[referrer_id] = per_referrer.get(referrer_id, 0) + 1
+        c.executemany('UPDATE users SET coins=coins+?, total_refs=total_refs+? WHERE id=?',
+                      [(n * REFERRAL_BONUS, n, referrer_id) for referrer_id, n in per_referrer.items()])
+        ledger_append_many(c, [(referrer_id, n * REFERRAL_BONUS) for referrer_id, n in per_referrer.items()],
+                           COIN_REFERRAL)
+        for referrer_id, n in per_referrer.items():
+            db_on_commit(functools.partial(leaderboard.add_coins, referrer_id, n * REFERRAL_BONUS))
+    if not awarded:
+        return
+    print(f"[REF] Awarded {len(awarded)} referral bonus(es)")
+
+    for referrer_id in awarded:
+        try:
+            context.bot.send_message(referrer_id, f"👥 Ваш реферал стал активным!\n+{REFERRAL_BONUS} монет на баланс! 🎉")
+        except Exception:
+            pass
+
+# ─────────── DAILY REFERRAL LIMIT ───────────
+def reset_daily_refs_if_needed(uid):
+    """Reset daily refs counter if new day has started"""
+    row = get_user(uid)
+    if not row.last_daily_ref_reset:
+        # First time - set to today
+        set_field(uid, 'last_daily_ref_reset', datetime.now().date().isoformat())
+        set_field(uid, 'daily_refs', 0)
+        return True
+
+    last_reset_date = datetime.fromisoformat(row.last_daily_ref_reset).date()
+    today = datetime.now().date()
+
+    if last_reset_date < today:
+        # New day - reset counter
+        set_field(uid, 'last_daily_ref_reset', today.isoformat())
+        set_field(uid, 'daily_refs', 0)
+        return True
+
+    return False
+
+def can_add_referral(referrer_id):
+    """Check if referrer can add more referrals today"""
+    reset_daily_refs_if_needed(referrer_id)
+    row = get_user(referrer_id)
+
+    daily_refs = row.daily_refs or 0
+    max_daily_refs = 10  # maximum 10 referrals per day
+
+    return daily_refs < max_daily_refs
+
+def can_spin_wheel(uid):
+    row = get_user(uid)
+    if not row.last_wheel: return True
+    last = datetime.fromisoformat(row.last_wheel)
+    return datetime.now() - last >= timedelta(hours=8)
+
+def time_until_wheel(uid):
+    row = get_user(uid)
+    if not row.last_wheel: return "0м"
+    last = datetime.fromisoformat(row.last_wheel)
+    diff = timedelta(hours=8) - (datetime.now() - last)
+    if diff.total_seconds() <= 0: return "0м"
+    h = int(diff.total_seconds() // 3600)
+    m = int((diff.total_seconds() % 3600) // 60)
+    return f"{h}ч {m}м" if h > 0 else f"{m}м"
+
+# ─────────── COIN LEDGER ───────────
+# Каждое движение монет дописывается в coin_ledger в той же транзакции, что
+# и изменение users.coins, поэтому users.coins - проекция журнала:
+# баланс = coin_checkpoints.coins + сумма delta после checkpoints.ledger_id.
+# Баланс меняют только функции ниже (add_coins, set_coins, ledger_append*) и
+# места, которые сами пишут журнал рядом со своим UPDATE.
+# reconcile_coin_ledger идёт по игрокам порциями, сверяет проекцию с журналом
+# и сдвигает контрольные точки, чтобы следующая сверка читала только хвост.
+# ref записи игры - id строки game_history. Ставка многоходовой игры
+# списывается раньше, чем появляется её строка, поэтому ref ставки
+# заполняется один раз, когда раунд записан (delta записей не меняется никогда).
+COIN_START = 0       # стартовый баланс
+COIN_GAME = 1        # ставки, выигрыши и откаты игр
+COIN_BONUS = 2       # часовой бонус, награда за подписку и штраф за отписку
+COIN_PROMO = 3
+COIN_REFERRAL = 4
+COIN_ADMIN = 5       # ручные и глобальные изменения баланса, откаты админа
+COIN_WHEEL = 6
+COIN_REASONS = {COIN_START: 'start', COIN_GAME: 'game', COIN_BONUS: 'bonus', COIN_PROMO: 'promo',
+                COIN_REFERRAL: 'referral', COIN_ADMIN: 'admin', COIN_WHEEL: 'wheel'}
+START_COINS = 500
+
+LEDGER_RECONCILE_INTERVAL = 10    # секунд между порциями
+LEDGER_RECONCILE_BATCH = 1000
+ledger_reconcile = {'cursor': 0, 'checked': 0, 'mismatches': 0, 'passes': 0}
+
+def ledger_append(c, uid, delta, reason, ref=None):
+    """Record one coin movement inside the caller's transaction; returns its id (None if delta is 0)"""
+    if delta:
+        c.execute('INSERT INTO coin_ledger (uid, delta, reason, ref, ts) VALUES (?, ?, ?, ?, ?)',
+                  (uid, delta, reason, ref, int(time.time())))
+        return c.lastrowid
+    return None
+
+def ledger_append_many(c, entries, reason, ref=None):
+    """Record (uid, delta) or (uid, delta, ref) movements with one reason inside the caller's transaction"""
+    now = int(time.time())
+    c.executemany('INSERT INTO coin_ledger (uid, delta, reason, ref, ts) VALUES (?, ?, ?, ?, ?)',
+                  [(e[0], e[1], reason, e[2] if len(e) > 2 else ref, now) for e in entries if e[1]])
+
+def ledger_append_where(c, delta, reason, where, params=(), ref=None):
+    """Record the same delta for every user matching where; call right before the UPDATE"""
+    c.execute(f'INSERT INTO coin_ledger (uid, delta, reason, ref, ts) SELECT id, {delta}, ?, ?, ? FROM users '
+              f'WHERE {where}', (reason, ref, int(time.time()), *params))
+
+def add_coins(uid, amount, reason, ref=None):
+    with db_cursor() as c:
+        c.execute('UPDATE users SET coins=coins+? WHERE id=?', (amount, uid))
+        if c.rowcount:
+            ledger_append(c, uid, amount, reason, ref)
+        db_on_commit(lambda: leaderboard.add_coins(uid, amount))
+    rows = _cached_users()
+    if rows and uid in rows:
+        rows[uid] = rows[uid]._replace(coins=rows[uid].coins + amount)
+
+def set_coins(uid, coins, reason, ref=None):
+    """Set a balance; the difference goes to the ledger. Returns the old balance or None"""
+    with db_cursor(immediate=True) as c:
+        c.execute('SELECT coins FROM users WHERE id=?', (uid,))
+        row = c.fetchone()
+        if row is None:
+            return None
+        c.execute('UPDATE users SET coins=? WHERE id=?', (coins, uid))
+        ledger_append(c, uid, coins - (row[0] or 0), reason, ref)
+        db_on_commit(lambda: leaderboard.set_coins(uid, coins))
+    _patch_cached_user(uid, coins=coins)
+    return row[0]
+
+def get_admin_ledger_delta(log_id):
+    """(uid, delta) of the movement made by the admin action logged as log_id, or None
+
+    Later rows with the same ref are its rollbacks, so the first one is the action itself.
+    """
+    with db_cursor() as c:
+        c.execute('SELECT uid, delta FROM coin_ledger WHERE ref=? AND reason=? ORDER BY id LIMIT 1',
+                  (log_id, COIN_ADMIN))
+        return c.fetchone()
+
+LEDGER_BALANCE_SQL = '''SELECT u.id, COALESCE(u.coins, 0), COALESCE(k.coins, 0), COALESCE(k.ledger_id, 0),
+                                (SELECT COALESCE(SUM(l.delta), 0) FROM coin_ledger l
+                                 WHERE l.uid=u.id AND l.id>COALESCE(k.ledger_id, 0)),
+                                (SELECT MAX(l.id) FROM coin_ledger l WHERE l.uid=u.id)
+                         FROM users u LEFT JOIN coin_checkpoints k ON k.uid=u.id'''
+
+def reconcile_coin_ledger(context=None):
+    """job_queue callback: check the next batch of balances against the ledger and advance checkpoints"""
+    # Сверка только читает: один SELECT в WAL видит согласованный снимок и
+    # не держит блокировку записи, пока идёт по порции игроков
+    with db_cursor() as c:
+        c.execute(LEDGER_BALANCE_SQL + ' WHERE u.id>? ORDER BY u.id LIMIT ?',
+                  (ledger_reconcile['cursor'], LEDGER_RECONCILE_BATCH))
+        rows = c.fetchall()
+    advance, suspects = [], []
+    for uid, coins, base, base_id, tail, last_id in rows:
+        if coins != base + tail:
+            suspects.append(uid)
+        elif last_id and last_id > base_id:
+            advance.append((uid, coins, last_id))
+    mismatches = []
+    if suspects:
+        # Перепроверяем свежим снимком, прежде чем поднимать тревогу
+        with db_cursor() as c:
+            c.execute(LEDGER_BALANCE_SQL + f" WHERE u.id IN ({', '.join('?' * len(suspects))})", suspects)
+            mismatches = [(uid, coins, base + tail) for uid, coins, base, _, tail, _ in c.fetchall()
+                          if coins != base + tail]
+    if advance:
+        # Пара (coins, last_id) из снимка верна и позже, поэтому пишем её отдельно
+        # и коротко; более свежую контрольную точку не откатываем
+        with db_cursor(immediate=True) as c:
+            c.executemany('''INSERT INTO coin_checkpoints (uid, coins, ledger_id) VALUES (?, ?, ?)
+                             ON CONFLICT(uid) DO UPDATE SET coins=excluded.coins, ledger_id=excluded.ledger_id
+                             WHERE excluded.ledger_id > coin_checkpoints.ledger_id''', advance)
+
+    for uid, coins, expected in mismatches:
+        print(f"[LEDGER] Mismatch uid={uid}: coins={coins}, ledger={expected}")
+    ledger_reconcile['checked'] += len(rows)
+    ledger_reconcile['mismatches'] += len(mismatches)
+    if len(rows) < LEDGER_RECONCILE_BATCH:
+        ledger_reconcile['cursor'] = 0
+        ledger_reconcile['passes'] += 1
+        print(f"[LEDGER] Pass {ledger_reconcile['passes']}: checked {ledger_reconcile['checked']}, "
+              f"mismatches {ledger_reconcile['mismatches']}")
+        ledger_reconcile['checked'] = ledger_reconcile['mismatches'] = 0
+    else:
+        ledger_reconcile['cursor'] = rows[-1][0]
+    return mismatches
+
+# ─────────── LEADERBOARD ───────────
+# Рейтинг держится в памяти: отсортированный список (-coins, id) и словари
+# id -> coins / username. Топ — срез списка, место игрока — bisect, без
+# ORDER BY по всей таблице users. Список строится из БД при старте (init_db)
+# и правится после коммита каждой операции, меняющей баланс (db_on_commit).
+# Массовые операции над балансами просто перечитывают таблицу.
+LEADERBOARD_SIZE = 10
+
+class Leaderboard:
+    """In-memory ranking of all users by coins"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.order = []     # (-coins, uid), по возрастанию = по убыванию монет
+        self.coins = {}
+        self.names = {}
+
+    def load(self):
+        """Rebuild from the users table"""
+        with db_cursor() as c:
+            c.execute('SELECT id, username, coins FROM users')
+            rows = c.fetchall()
+        with self.lock:
+            self.coins = {uid: coins or 0 for uid, _, coins in rows}
+            self.names = {uid: name for uid, name, _ in rows}
+            self.order = sorted((-coins, uid) for uid, coins in self.coins.items())
+
+    def _remove(self, uid):
+        old = self.coins.pop(uid, None)
+        if old is not None:
+            i = bisect.bisect_left(self.order, (-old, uid))
+            if i < len(self.order) and self.order[i] == (-old, uid):
+                del self.order[i]
+        return old
+
+    def set_coins(self, uid, coins, username=None):
+        with self.lock:
+            self._remove(uid)
+            self.coins[uid] = coins
+            bisect.insort(self.order, (-coins, uid))
+            if username is not None:
+                self.names[uid] = username
+
+    def add_coins(self, uid, amount):
+        with self.lock:
+            old = self._remove(uid)
+            if old is None:
+                return  # игрока ещё нет в рейтинге (появится при загрузке)
+            self.coins[uid] = old + amount
+            bisect.insort(self.order, (-(old + amount), uid))
+
+    def set_name(self, uid, username):
+        with self.lock:
+            if uid in self.coins:
+                self.names[uid] = username
+
+    def remove(self, uid):
+        with self.lock:
+            self._remove(uid)
+            self.names.pop(uid, None)
+
+    def top(self, k=LEADERBOARD_SIZE):
+        """[(uid, username, coins)] of the k richest users"""
+        with self.lock:
+            return [(uid, self.names.get(uid), -neg) for neg, uid in self.order[:k]]
+
+    def rank(self, uid):
+        """1-based place of uid and the number of ranked users, or (None, total)"""
+        with self.lock:
+            coins = self.coins.get(uid)
+            if coins is None:
+                return None, len(self.order)
+            return bisect.bisect_left(self.order, (-coins, uid)) + 1, len(self.order)
+
+leaderboard = Leaderboard()
+
+def get_leaderboard():
+    return leaderboard.top(LEADERBOARD_SIZE)
+
+# ─────────── USERNAME RESOLVER ───────────
+# Имена для админских списков: LRU-кэш uid -> username, промахи добираются
+# одним запросом WHERE id IN (...). Сбрасывается при смене имени в /start и
+# удалении пользователя. Отсутствующие uid не кэшируются.
+USERNAME_CACHE_SIZE = 5000
+USERNAME_QUERY_CHUNK = 500
+
+class UsernameResolver:
+    """LRU cache of uid -> username with batched lookups"""
+
+    def __init__(self, size=USERNAME_CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.names = OrderedDict()
+
+    def get_many(self, uids):
+        """{uid: username} for existing users (username may be empty)"""
+        found, missing = {}, []
+        with self.lock:
+            for uid in set(uids):
+                if uid in self.names:
+                    self.names.move_to_end(uid)
+                    found[uid] = self.names[uid]
+                else:
+                    missing.append(uid)
+        if not missing:
+            return found
+        with db_cursor() as c:
+            for i in range(0, len(missing), USERNAME_QUERY_CHUNK):
+                chunk = missing[i:i + USERNAME_QUERY_CHUNK]
+                c.execute(f"SELECT id, username FROM users WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+                found.update(c.fetchall())
+        with self.lock:
+            for uid in missing:
+                if uid in found:
+                    self.names[uid] = found[uid]
+            while len(self.names) > self.size:
+                self.names.popitem(last=False)
+        return found
+
+    def get(self, uid):
+        """Username or None if the user does not exist"""
+        return self.get_many([uid]).get(uid)
+
+    def invalidate(self, uid):
+        with self.lock:
+            self.names.pop(uid, None)
+
+username_resolver = UsernameResolver()
+
+def resolve_usernames(uids):
+    """{uid: display name} for a listing; users without a name show as ID:uid"""
+    names = username_resolver.get_many(uids)
+    return {uid: names.get(uid) or f"ID:{uid}" for uid in set(uids)}
+
+# ─────────── GAME LOG WRITE-BEHIND ───────────
+# log_game не пишет в БД сразу: строки копятся в очереди и вставляются одной
+# транзакцией, когда набирается GAME_LOG_BATCH_SIZE строк или проходит
+# GAME_LOG_FLUSH_INTERVAL секунд. Балансы при этом пишутся сразу, так что при
+# аварийном падении теряется максимум последняя пачка истории. При штатной
+# остановке очередь сбрасывается (main + atexit). Всё, что читает или меняет
+# game_history, сначала вызывает flush_game_log().
+GAME_LOG_BATCH_SIZE = 50
+GAME_LOG_FLUSH_INTERVAL = 1.0
+GAME_LOG_INSERT = ('INSERT INTO game_history (uid, game_name, details, amount, is_win, created_at) '
+                   'VALUES (?,?,?,?,?,?)')
+
+_game_log_queue = []
+_game_log_lock = threading.Lock()        # очередь
+_game_log_flush_lock = threading.RLock()  # сбросы идут по одному, id сохраняют порядок
+_game_log_wakeup = threading.Event()
+_game_log_writer = None
+
+def _game_log_row(uid, name, details, amount, is_win):
+    # created_at фиксируем в момент игры, в формате CURRENT_TIMESTAMP (UTC)
+    created_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    return (uid, name, details, amount, 1 if is_win else 0, created_at)
+
+def log_game(uid, name, details, amount, is_win):
+    with _game_log_lock:
+        _game_log_queue.append(_game_log_row(uid, name, details, amount, is_win))
+        full = len(_game_log_queue) >= GAME_LOG_BATCH_SIZE
+    _start_game_log_writer()
+    if full:
+        _game_log_wakeup.set()
+
+def _requeue_game_log(batch):
+    # Возвращаем пачку в начало очереди, следующий сброс повторит попытку
+    if batch:
+        with _game_log_lock:
+            _game_log_queue[:0] = batch
+
+def drop_queued_games(uid):
+    """Forget uid's game_history rows still waiting in the queue; returns the count
+
+    Call it holding _game_log_flush_lock, so a batch the writer has already
+    taken cannot land after the caller's transaction.
+    """
+    with _game_log_lock:
+        kept = [row for row in _game_log_queue if row[0] != uid]
+        dropped = len(_game_log_queue) - len(kept)
+        _game_log_queue[:] = kept
+    return dropped
+
+def flush_game_log():
+    """Synchronously insert every queued game_history row; returns the count"""
+    with _game_log_flush_lock:
+        with _game_log_lock:
+            batch = _game_log_queue[:]
+            del _game_log_queue[:]
+        if not batch:
+            return 0
+        try:
+            with db_cursor() as c:
+                c.executemany(GAME_LOG_INSERT, batch)
+                _rollup_game_rows(c, batch)
+        except Exception:
+            _requeue_game_log(batch)
+            raise
+        return len(batch)
+
+def _game_log_writer_loop():
+    while True:
+        _game_log_wakeup.wait(GAME_LOG_FLUSH_INTERVAL)
+        _game_log_wakeup.clear()
+        try:
+            flush_game_log()
+        except Exception as e:
+            print(f"[LOG] Error flushing game history: {e}")
+
+def _start_game_log_writer():
+    global _game_log_writer
+    if _game_log_writer is not None:
+        return
+    with _game_log_lock:
+        if _game_log_writer is None:
+            _game_log_writer = threading.Thread(target=_game_log_writer_loop, name='game-log-writer', daemon=True)
+            _game_log_writer.start()
+
+atexit.register(flush_game_log)
+
+# ─────────── BET SETTLEMENT ───────────
+# Игры меняют баланс только через place_bet / settle_game. Ставка списывается
+# одним UPDATE с условием coins >= ставка, так что параллельные нажатия не
+# уводят баланс в минус. settle_game списывает ставку, начисляет выигрыш и
+# пишет строку game_history одной транзакцией. Многоходовые игры (свечи,
+# монетка, минёр, башня, джетпак) списывают ставку при старте через
+# place_bet, а на выходе вызывают settle_game(payout=..., stake=...):
+# stake - id записи журнала со ставкой, ей проставляется ref раунда.
+
+Stake = namedtuple('Stake', 'coins ledger_id')
+
+def place_bet(uid, bet, reason=COIN_GAME):
+    """Debit a stake if the balance covers it; returns Stake(new balance, ledger id) or None"""
+    with db_cursor() as c:
+        c.execute('UPDATE users SET coins=coins-? WHERE id=? AND coins>=?', (bet, uid, bet))
+        if c.rowcount == 0:
+            return None
+        ledger_id = ledger_append(c, uid, -bet, reason)
+        c.execute('SELECT coins FROM users WHERE id=?', (uid,))
+        coins = c.fetchone()[0]
+        db_on_commit(lambda: leaderboard.set_coins(uid, coins))
+    _patch_cached_user(uid, coins=coins)
+    return Stake(coins, ledger_id)
+
+def settle_game(uid, name, details, amount, is_win, bet=0, payout=0, stake=None):
+    """Debit bet, credit payout and record the round in one transaction.
+
+    stake is the ledger id of a bet taken earlier by place_bet. Returns the
+    new balance, or None if the balance does not cover the bet (nothing is
+    written then).
+    """
+    if not bet and not payout and stake is None:
+        # Баланс не меняется и ссылку ставить некуда — строка идёт в очередь
+        log_game(uid, name, details, amount, is_win)
+        return get_user(uid).coins
+    return settle_games([(uid, name, details, amount, is_win, bet, payout, stake)])[0]
+
+def settle_games(rounds):
+    """Settle (uid, name, details, amount, is_win, bet, payout[, stake]) rounds in one transaction.
+
+    Returns the new balances in the same order; None marks a round whose bet
+    was not covered or whose user no longer exists (that round is skipped).
+    Ledger entries of a round (and its earlier stake) get the round's
+    game_history id as ref.
+    """
+    balances = []
+    # Под flush-локом забираем очередь и пишем её перед своими строками,
+    # чтобы id в game_history шли в порядке игр
+    with _game_log_flush_lock:
+        with _game_log_lock:
+            batch = _game_log_queue[:]
+            del _game_log_queue[:]
+        try:
+            with db_cursor(immediate=True) as c:
+                rows = list(batch)
+                moves = []
+                for uid, name, details, amount, is_win, bet, payout, *stake in rounds:
+                    if bet:
+                        c.execute('UPDATE users SET coins=coins-? WHERE id=? AND coins>=?', (bet, uid, bet))
+                        if c.rowcount == 0:
+                            balances.append(None)
+                            continue
+                    if payout:
+                        c.execute('UPDATE users SET coins=coins+? WHERE id=?', (payout, uid))
+                    c.execute('SELECT coins FROM users WHERE id=?', (uid,))
+                    row = c.fetchone()
+                    if row is None:
+                        # Игрока удалили, пока шёл раунд: записывать нечего
+                        balances.append(None)
+                        continue
+                    moves.append((uid, payout - bet, stake[0] if stake else None))
+                    rows.append(_game_log_row(uid, name, details, amount, is_win))
+                    balances.append(row[0])
+                c.executemany(GAME_LOG_INSERT, rows)
+                _rollup_game_rows(c, rows)
+                if moves:
+                    # Под блокировкой записи AUTOINCREMENT выдаёт id подряд: строки
+                    # раундов - последние len(moves) вставленных
+                    c.execute('SELECT last_insert_rowid()')
+                    first_id = c.fetchone()[0] - len(moves) + 1
+                    game_ids = range(first_id, first_id + len(moves))
+                    ledger_append_many(c, [(uid, delta, gid) for (uid, delta, _), gid in zip(moves, game_ids)],
+                                       COIN_GAME)
+                    c.executemany('UPDATE coin_ledger SET ref=? WHERE id=? AND ref IS NULL',
+                                  [(gid, stake) for (_, _, stake), gid in zip(moves, game_ids) if stake])
+        except Exception:
+            _requeue_game_log(batch)
+            raise
+
+    def publish():
+        for rnd, coins in zip(rounds, balances):
+            if coins is not None:
+                _patch_cached_user(rnd[0], coins=coins)
+                leaderboard.set_coins(rnd[0], coins)
+    # Внутри settlement_txn балансы видны остальным только после её коммита
+    db_on_commit(publish)
+    return balances
+
+@contextmanager
+def settlement_txn():
+    """Transaction that ends a game round: game_sessions.finish/start plus its settle_game.
+
+    The game-log flush lock is taken before the write lock, the same order
+    as in settle_games and flush_game_log, so the nested settle_game cannot
+    deadlock against a flush.
+    """
+    with _game_log_flush_lock, db_cursor(immediate=True) as c:
+        yield c
+
+# ─────────── KEYSET PAGINATION ───────────
+# Списки листаются без OFFSET: кнопки ◀️/▶️ несут в callback_data курсор —
+# ключ крайней строки, которую пользователь видел на экране. Следующая
+# страница читается как WHERE ... AND (ключ) < (курсор) ORDER BY ключ
+# LIMIT size+1 (лишняя строка говорит, что дальше ещё есть), предыдущая —
+# тем же запросом в обратную сторону. Вставки и смена ключей между кликами
+# ничего не сдвигают: страница всегда начинается от увиденной строки.
+# Курсоры: 'a<ключ>' — страница с этой строки (перерисовка того же экрана),
+# 'n<ключ>' — сразу после неё, 'p<ключ>' — заканчивается перед ней.
+# Без курсора рисуется первая страница (простой LIMIT). Меню «перейти на
+# страницу» предлагает только страницы у начала, у конца списка и рядом с
+# текущей, и каждая кнопка несёт 'a'-курсор её первой строки: jump_cursors
+# отсчитывает ключи от ближайшей из трёх опор, так что переход стоит
+# нескольких страниц чтения индекса, а не OFFSET по всей таблице.
+# Ключ — колонки сортировки, последняя — id. Числовой ключ кладётся в курсор
+# целиком ('n1500.42'), нечисловой (дата регистрации) — только id ('n.42'),
+# а значение колонок берётся у самой строки: такие колонки не меняются.
+# Итоги для «Страница X из Y» берутся из count_cached.
+PAGER_MAX_QUERIES = 1000
+COUNT_CACHE_TTL = 30.0
+PAGER_JUMP_ENDS = 3     # страниц с начала и с конца в меню перехода
+PAGER_JUMP_AROUND = 2   # страниц по обе стороны от текущей
+
+PageNav = namedtuple('PageNav', 'number prev here next')
+NO_PAGE_NAV = PageNav(0, None, None, None)
+
+class KeysetPager:
+    """Seek pagination over `SELECT columns FROM table WHERE ...` ordered by key columns"""
+
+    def __init__(self, table, columns, keys, desc=True):
+        self.table = table
+        self.columns = columns
+        self.keys = keys
+        self.desc = desc
+
+    def cursor(self, kind, key):
+        if all(isinstance(v, int) for v in key):
+            return kind + '.'.join(map(str, key))
+        return f"{kind}.{key[-1]}"
+
+    def _bound(self, token):
+        """SQL row value and params for the key encoded in a cursor"""
+        values = token.split('.')
+        if len(values) == 2 and values[0] == '' and len(self.keys) > 1:
+            row_id = int(values[1])
+            lookup = ', '.join(f"(SELECT {k} FROM {self.table} WHERE id=?)" for k in self.keys[:-1])
+            return f"{lookup}, ?", [row_id] * len(self.keys)
+        if len(values) != len(self.keys):
+            raise ValueError(token)
+        return ', '.join('?' * len(values)), [int(v) for v in values]
+
+    def _query(self, head, where, params, op=None, bound=None, reverse=False):
+        conditions = [where] if where else []
+        params = list(params)
+        if bound is not None:
+            conditions.append(f"({', '.join(self.keys)}) {op} ({bound[0]})")
+            params += bound[1]
+        direction = 'DESC' if self.desc != reverse else 'ASC'
+        sql = (f"SELECT {head} FROM {self.table}"
+               + (f" WHERE {' AND '.join(conditions)}" if conditions else '')
+               + f" ORDER BY {', '.join(f'{k} {direction}' for k in self.keys)}")
+        return sql, params
+
+    def page(self, c, where, params, page, size, cursor=None):
+        """Rows of one page of `size` rows and its PageNav
+
+        page is the 0-indexed number of the page being drawn, cursor one of
+        the PageNav cursors of a page drawn before or a jump_cursors cursor
+        (None draws the first page).
+        """
+        head = f"{self.columns}, {', '.join(self.keys)}"
+        after, before = ('<', '>') if self.desc else ('>', '<')
+        kind, bound = cursor[:1] if cursor else None, None
+        if kind in ('a', 'n', 'p') and not (kind == 'a' and page == 0):
+            try:
+                bound = self._bound(cursor[1:])
+            except ValueError:
+                pass
+        if bound is None:
+            sql, args = self._query(head, where, params)
+            c.execute(sql + ' LIMIT ?', args + [size + 1])
+            rows = c.fetchall()
+            page, has_prev, has_next = 0, False, len(rows) > size
+        elif kind == 'p':
+            sql, args = self._query(head, where, params, before, bound, reverse=True)
+            c.execute(sql + ' LIMIT ?', args + [size + 1])
+            rows = c.fetchall()
+            if len(rows) <= size:
+                # Дошли до начала списка: первая страница целиком
+                return self.page(c, where, params, 0, size)
+            rows = rows[size - 1::-1]
+            page, has_prev, has_next = max(page, 1), True, True
+        else:
+            sql, args = self._query(head, where, params, after + '=' if kind == 'a' else after, bound)
+            c.execute(sql + ' LIMIT ?', args + [size + 1])
+            rows = c.fetchall()
+            if not rows:
+                # Строки за курсором пропали (удаление) — последняя страница
+                return self._last_page(c, where, params, page, size)
+            page = max(page, 1)
+            has_prev, has_next = True, len(rows) > size
+        rows = rows[:size]
+        return self._nav(rows, page, has_prev, has_next)
+
+    def _nav(self, rows, page, has_prev, has_next):
+        if not rows:
+            return [], PageNav(page, None, None, None)
+        n = len(self.keys)
+        first, last = rows[0][-n:], rows[-1][-n:]
+        nav = PageNav(page,
+                      self.cursor('p', first) if has_prev else None,
+                      self.cursor('a', first),
+                      self.cursor('n', last) if has_next else None)
+        return [row[:-n] for row in rows], nav
+
+    def _last_page(self, c, where, params, page, size):
+        """Last `size` rows of the list, drawn as page number `page`"""
+        head = f"{self.columns}, {', '.join(self.keys)}"
+        sql, args = self._query(head, where, params, reverse=True)
+        c.execute(sql + ' LIMIT ?', args + [size + 1])
+        rows = c.fetchall()
+        if len(rows) <= size:
+            return self.page(c, where, params, 0, size)
+        return self._nav(rows[size - 1::-1], max(page, 1), True, False)
+
+    def _keys(self, c, where, params, limit, op=None, bound=None, reverse=False):
+        sql, args = self._query(', '.join(self.keys), where, params, op, bound, reverse)
+        c.execute(sql + ' LIMIT ?', args + [limit])
+        return c.fetchall()
+
+    def jump_cursors(self, c, where, params, size, total, wanted, current=0, here=None):
+        """Cursors of the pages in `wanted` for a "go to page" menu: {page: cursor}
+
+        Every page is counted from the nearest of three anchors: the start of
+        the list, its end (`total` rows, usually count_cached) and the current
+        page, whose PageNav.here is `here`. Only the keys between an anchor and
+        the farthest page counted from it are read. Page 0 maps to None; a
+        page that can't be reached (list shrank) is left out.
+        """
+        after, before = ('<', '>') if self.desc else ('>', '<')
+        anchor = None
+        if here and here[:1] == 'a' and current > 0:
+            try:
+                anchor = self._bound(here[1:])
+            except ValueError:
+                pass
+        # Для каждой опоры: {страница: номер её первой строки в просмотре от опоры}
+        plan = {'top': {}, 'end': {}, 'fwd': {}, 'back': {}}
+        for p in wanted:
+            if p <= 0:
+                continue
+            options = [(p * size, 'top')]
+            if p * size < total:
+                options.append((total - 1 - p * size, 'end'))
+            if anchor is not None:
+                if p >= current:
+                    options.append(((p - current) * size, 'fwd'))
+                else:
+                    options.append(((current - p) * size - 1, 'back'))
+            index, side = min(options)
+            plan[side][p] = index
+        scans = {'top': (None, False), 'end': (None, True),
+                 'fwd': (after + '=', False), 'back': (before, True)}
+        cursors = {0: None} if 0 in wanted else {}
+        for side, pages in plan.items():
+            if not pages:
+                continue
+            op, reverse = scans[side]
+            keys = self._keys(c, where, params, max(pages.values()) + 1, op,
+                              anchor if op else None, reverse)
+            for p, index in pages.items():
+                if index < len(keys):
+                    cursors[p] = self.cursor('a', keys[index])
+        return cursors
+
+def jump_pages(pages, current=0):
+    """Page numbers a "go to page" menu offers: both ends and around current"""
+    near = range(current - PAGER_JUMP_AROUND, current + PAGER_JUMP_AROUND + 1)
+    ends = [*range(PAGER_JUMP_ENDS), *range(pages - PAGER_JUMP_ENDS, pages)]
+    return sorted(p for p in {*near, *ends} if 0 <= p < pages)
+
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+def count_cached(c, sql, params=()):
+    """Result of a COUNT query, reused for COUNT_CACHE_TTL seconds"""
+    key = (sql, tuple(params))
+    now = time.monotonic()
+    with _count_cache_lock:
+        hit = _count_cache.get(key)
+    if hit and hit[1] > now:
+        return hit[0]
+    c.execute(sql, params)
+    total = c.fetchone()[0]
+    with _count_cache_lock:
+        if len(_count_cache) >= PAGER_MAX_QUERIES:
+            _count_cache.clear()
+        _count_cache[key] = (total, now + COUNT_CACHE_TTL)
+    return total
+
+GAME_HISTORY_COLUMNS = 'id, game_name, amount, is_win, is_rolled_back, created_at'
+history_pager = KeysetPager('game_history', GAME_HISTORY_COLUMNS, ('id',))
+game_feed_pager = KeysetPager('game_history', '*', ('id',))
+admin_logs_pager = KeysetPager('admin_logs', '*', ('id',))
+
+ROLLED_BACK_WHERE = {None: '', False: 'is_rolled_back=0', True: 'is_rolled_back=1'}
+
+def get_game_feed(page=0, page_size=10, rolled_back=None, cursor=None):
+    """Admin feed of all games (newest first): (rows, approximate total, PageNav)"""
+    flush_game_log()
+    where = ROLLED_BACK_WHERE[rolled_back]
+    with db_cursor() as c:
+        rows, nav = game_feed_pager.page(c, where, (), page, page_size, cursor)
+        total = count_game_feed(rolled_back, c)
+    return rows, total, nav
+
+def get_game_feed_jumps(page_size=10, rolled_back=None, current=0, here=None):
+    """Go-to-page menu of the admin game feed: (pages, {page: cursor})"""
+    flush_game_log()
+    where = ROLLED_BACK_WHERE[rolled_back]
+    with db_cursor() as c:
+        total = count_game_feed(rolled_back, c)
+        pages = (total + page_size - 1) // page_size or 1
+        cursors = game_feed_pager.jump_cursors(c, where, (), page_size, total,
+                                               jump_pages(pages, current), current, here)
+    return pages, cursors
+
+def count_game_feed(rolled_back=None, c=None):
+    """Cached number of games in the admin feed"""
+    where = ROLLED_BACK_WHERE[rolled_back]
+    sql = 'SELECT COUNT(*) FROM game_history' + (f' WHERE {where}' if where else '')
+    if c is not None:
+        return count_cached(c, sql)
+    with db_cursor() as c:
+        return count_cached(c, sql)
+
+# ─────────── GAME HISTORY QUERIES ───────────
+def _history_filter(uid, rolled_back=None, game_name=None, is_win=None, games=None):
+    """WHERE clauses (page, count) and params for a user's filtered game history"""
+    games = sorted(set(games or ())) or ([game_name] if game_name else [])
+    conditions = ["uid=?"]
+    params = [uid]
+
+    if rolled_back is not None:
+        if rolled_back:
+            conditions.append("is_rolled_back=1")
+        else:
+            conditions.append("is_rolled_back=0")
+
+    count_conditions = list(conditions)
+    if len(games) == 1:
+        conditions.append("game_name=?")
+        count_conditions.append("game_name=?")
+    elif games:
+        # Для страницы: '+' не даёт взять индекс (uid, game_name, ...), который
+        # не упорядочен по id для нескольких игр; идём по (uid, is_rolled_back, id)
+        # до первых page_size совпадений. Для COUNT индекс по играм как раз нужен.
+        placeholders = ', '.join('?' * len(games))
+        conditions.append(f"+game_name IN ({placeholders})")
+        count_conditions.append(f"game_name IN ({placeholders})")
+    params.extend(games)
+
+    if is_win is not None:
+        conditions.append("is_win=?")
+        count_conditions.append("is_win=?")
+        params.append(1 if is_win else 0)
+
+    return " AND ".join(conditions), " AND ".join(count_conditions), params
+
+def count_history(uid, rolled_back=False, game_name=None, is_win=None, games=None):
+    """Number of games in a user's filtered history"""
+    flush_game_log()
+    _, count_where, params = _history_filter(uid, rolled_back, game_name, is_win, games)
+    with db_cursor() as c:
+        # по индексу uid — дёшево и точно
+        c.execute(f'SELECT COUNT(*) FROM game_history WHERE {count_where}', params)
+        return c.fetchone()[0]
+
+def get_history_paged(uid, page=0, page_size=5, rolled_back=None, game_name=None, is_win=None, games=None,
+                      cursor=None):
+    """Get user's game history with pagination and optional filters: (rows, total, PageNav)
+
+    Args:
+        uid: user id
+        page: page number (0-indexed)
+        page_size: number of items per page (use -1 for all)
+        rolled_back: None (all), False (not rolled back), True (rolled back)
+        game_name: filter by game name (None = all games)
+        is_win: True (wins only), False (losses only), None (all)
+        games: filter by several game names (None or empty = all games)
+        cursor: PageNav or jump_cursors cursor (None = first page)
+    """
+    flush_game_log()
+    where_clause, count_where, params = _history_filter(uid, rolled_back, game_name, is_win, games)
+    with db_cursor() as c:
+        # Get total count (по индексу uid — дёшево и точно)
+        c.execute(f'SELECT COUNT(*) FROM game_history WHERE {count_where}', params)
+        total = c.fetchone()[0]
+
+        # Get rows
+        if page_size > 0:
+            rows, nav = history_pager.page(c, where_clause, params, page, page_size, cursor)
+        else:
+            # page_size = -1 means get all
+            c.execute(f'SELECT {GAME_HISTORY_COLUMNS} FROM game_history WHERE {where_clause} ORDER BY id DESC', params)
+            rows, nav = c.fetchall(), NO_PAGE_NAV
+    return rows, total, nav
+
+def get_history_jumps(uid, page_size=5, rolled_back=False, is_win=None, games=None, current=0, here=None):
+    """Go-to-page menu of a user's filtered history: (pages, {page: cursor})"""
+    flush_game_log()
+    where_clause, count_where, params = _history_filter(uid, rolled_back, None, is_win, games)
+    with db_cursor() as c:
+        c.execute(f'SELECT COUNT(*) FROM game_history WHERE {count_where}', params)
+        total = c.fetchone()[0]
+        pages = (total + page_size - 1) // page_size or 1
+        cursors = history_pager.jump_cursors(c, where_clause, params, page_size, total,
+                                             jump_pages(pages, current), current, here)
+    return pages, cursors
+
+def get_all_games():
+    """Get list of all game names"""
+    with db_cursor() as c:
+        c.execute('SELECT DISTINCT game_name FROM game_history ORDER BY game_name')
+        games = [r[0] for r in c.fetchall()]
+    return games
+
+def get_game_info(game_id):
+    flush_game_log()
+    with db_cursor() as c:
+        c.execute('SELECT game_name, details, amount, is_win, is_rolled_back, created_at FROM game_history WHERE id=?', (game_id,))
+        row = c.fetchone()
+    return row
+
+def set_field(uid, field, value):
+    if field == 'coins':
+        # Баланс меняется только с записью в журнал
+        raise ValueError("use set_coins() to change a balance")
+    with db_cursor() as c:
+        c.execute(f'UPDATE users SET {field}=? WHERE id=?', (value, uid))
+    _patch_cached_user(uid, **{field: value})
+
+def can_claim_hourly(uid):
+    row = get_user(uid)
+    if not row.last_hourly: return True
+    last = datetime.fromisoformat(row.last_hourly)
+    return datetime.now() - last >= timedelta(hours=1)
+
+def time_until_hourly(uid):
+    row = get_user(uid)
+    if not row.last_hourly: return "0м"
+    last = datetime.fromisoformat(row.last_hourly)
+    diff = timedelta(hours=1) - (datetime.now() - last)
+    if diff.total_seconds() <= 0: return "0м"
+    m = int(diff.total_seconds() // 60)
+    s = int(diff.total_seconds() % 60)
+    return f"{m}м {s}с"
+
+# ─────────── ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ───────────
+
+def format_number(num):
+    """Format large numbers with K, M, B, T suffixes for better readability"""
+    if num is None:
+        return "0"
+    try:
+        num = int(num)
+    except (ValueError, TypeError):
+        return str(num)
+
+    if num >= 1_000_000_000_000:
+        return f"{num / 1_000_000_000_000:.2f}T"
+    elif num >= 1_000_000_000:
+        return f"{num / 1_000_000_000:.2f}B"
+    elif num >= 1_000_000:
+        return f"{num / 1_000_000:.2f}M"
+    elif num >= 1_000:
+        return f"{num / 1_000:.2f}K"
+    else:
+        return str(num)
+
+def format_number_full(num):
+    """Format full number with separators for display in alerts"""
+    if num is None:
+        return "0"
+    try:
+        num = int(num)
+    except (ValueError, TypeError):
+        return str(num)
+    return f"{num:,}"
+
+def is_game_rolled_back(is_rolled_back):
+    """Check if game is rolled back. Returns True if is_rolled_back == 1, False otherwise (including None)"""
+    # Обрабатываем разные типы данных
+    if is_rolled_back is None:
+        return False
+    if isinstance(is_rolled_back, int):
+        return is_rolled_back == 1
+    if isinstance(is_rolled_back, str):
+        return is_rolled_back == '1' or is_rolled_back == 'True'
+    return bool(is_rolled_back)
+
+# ─────────── KEYBOARDS ───────────
+
+def main_menu_kb(uid=None):
+    kb = [
+        [InlineKeyboardButton("🎮 Игры", callback_data='games_menu'),
+         InlineKeyboardButton("👤 Профиль", callback_data='profile')],
+        [InlineKeyboardButton("🏆 Топ игроков", callback_data='leaderboard'),
+         InlineKeyboardButton("🎁 Бонус", callback_data='hourly_bonus')],
+        [InlineKeyboardButton("🎡 Колесо фортуны", callback_data='wheel_menu')],
+        [InlineKeyboardButton("🎫 Промокод", callback_data='promo_enter'),
+         InlineKeyboardButton("👥 Реферал", callback_data='referral')]
+    ]
+
+    # Добавляем кнопку админ-панели только для админов
+    if uid is not None and is_admin(uid):
+        kb.append([InlineKeyboardButton("🔧 Админ-Панель", callback_data='admin_menu')])
+
+    return InlineKeyboardMarkup(kb)
+
+def games_menu_kb():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("🪙 Монетка", callback_data='cf_menu'),
+         InlineKeyboardButton("🎰 Слоты",   callback_data='slots_menu')],
+        [InlineKeyboardButton("⛏️ Минёр",   callback_data='miner_menu'),
+         InlineKeyboardButton("🗼 Башня",    callback_data='tower_menu')],
+        [InlineKeyboardButton("🚀 Джетпак", callback_data='jp_menu')],
+        [InlineKeyboardButton("🔙 Назад",   callback_data='main_menu')]
+    ])
+
+# ── СЛОТЫ: символы с весами ──
+SLOTS_SYMBOLS = ['🍒', '🍋', '🔔', '⭐', '💎', '7️⃣']
+SLOTS_WEIGHTS = [35, 25, 18, 12, 7, 3]  # сумма = 100, чем реже — тем ценнее
+SLOTS_PAYOUTS = {
+    ('🍒','🍒','🍒'): 3,
+    ('🍋','🍋','🍋'): 5,
+    ('🔔','🔔','🔔'): 10,
+    ('⭐','⭐','⭐'): 15,
+    ('💎','💎','💎'): 25,
+    ('7️⃣','7️⃣','7️⃣'): 50,
+}
+
+def spin_slots():
+    population = SLOTS_SYMBOLS
+    weights = SLOTS_WEIGHTS
+    return [random.choices(population, weights=weights, k=1)[0] for _ in range(3)]
+
+def check_slots(reels, bet):
+    t = tuple(reels)
+    if t in SLOTS_PAYOUTS:
+        return SLOTS_PAYOUTS[t], int(bet * SLOTS_PAYOUTS[t])
+    # Два одинаковых — возврат ставки
+    if reels[0]==reels[1] or reels[1]==reels[2] or reels[0]==reels[2]:
+        return 1, bet
+    return 0, 0
+
+# ── БАШНЯ: коэффициенты по этажам ──
+TOWER_FLOORS = 12  # Увеличено с 8 до 12 этажей
+
+# Коэффициенты для 1 бомбы (стандартный режим)
+# Расчёт: каждый этаж увеличивает риск, но и награду
+# Вероятность пройти этаж = 2/3 (66.7%)
+# Матожидание: 0.667 * coeff_next должно быть >= 1 для привлекательности
+TOWER_COEFFS_1BOMB = [1.5, 2.0, 2.8, 4.0, 5.5, 8.0, 12.0, 18.0, 28.0, 42.0, 65.0, 100.0]
+
+# Коэффициенты для 2 бомб (хардкорный режим)
+# Вероятность пройти этаж = 1/3 (33.3%) - выше риск, выше награда
+# Матожидание: 0.333 * coeff_next должно быть >= 1
+TOWER_COEFFS_2BOMBS = [2.0, 4.0, 8.0, 16.0, 32.0, 64.0, 130.0, 260.0, 520.0, 1050.0, 2100.0, 4200.0]
+
+def tower_keyboard(floor, traps_count=1):
+    """Generate tower keyboard. floor = current floor (0-indexed). traps_count = 1 or 2 bombs per floor."""
+    kb = []
+    for f in range(TOWER_FLOORS - 1, -1, -1):
+        row = []
+        for cell in range(3):
+            if f > floor:
+                row.append(InlineKeyboardButton("⬜", callback_data='dummy'))
+            elif f == floor:
+                row.append(InlineKeyboardButton("🟦", callback_data=f'tower_cell_{f}_{cell}'))
+            else:
+                row.append(InlineKeyboardButton("✅", callback_data='dummy'))
+        kb.append(row)
+    
+    # Выбираем коэффициенты в зависимости от количества бомб
+    coeffs = TOWER_COEFFS_2BOMBS if traps_count == 2 else TOWER_COEFFS_1BOMB
+
+    # Если floor = 0, значит игрок ещё не прошёл ни одного этажа, кнопка "Забрать" недоступна
+    # Если floor > 0, значит игрок прошёл floor этажей и coeff для floor-1
+    if floor > 0:
+        coeff = coeffs[floor - 1]  # коэффициент за пройденные этажи
+        kb.append([InlineKeyboardButton(f"💳 Забрать (x{coeff:.1f})", callback_data='tower_cashout')])
+    else:
+        # На нулевом этаже показываем коэффициент за первый этаж, но кнопка недоступна
+        kb.append([InlineKeyboardButton("💳 Забрать (x1.0)", callback_data='tower_cashout')])
+
+    kb.append([InlineKeyboardButton("🔙 Выйти", callback_data='tower_menu')])
+    return InlineKeyboardMarkup(kb)
+
+# ── КОЛЕСО ФОРТУНЫ ──
+# EV ≈ 27 монет за бесплатный спин каждые 8ч — небольшой бонус, не ломает экономику
+# Платный спин стоит 100 монет, EV = 27 - 100 = -73 (невыгодно спамить)
+WHEEL_SECTORS = [
+    ('Ничего 😔', 0, 50),
+    ('+15 монет', 15, 20),
+    ('+30 монет', 30, 15),
+    ('+75 монет', 75, 8),
+    ('+150 монет', 150, 5),
+    ('+300 монет 🎉', 300, 2),
+]
+WHEEL_PAID_COST = 100  # стоимость платного спина
+
+def miner_keyboard(session):
+    kb = []
+    for row in range(5):
+        r = []
+        for col in range(5):
+            idx = cell_index(row, col)
+            if session.opened >> idx & 1:
+                emoji = '💣' if session.board >> idx & 1 else '💎'
+                r.append(InlineKeyboardButton(emoji, callback_data='dummy'))
+            else:
+                r.append(InlineKeyboardButton('🟦', callback_data=f'miner_cell_{idx}'))
+        kb.append(r)
+    kb.append([InlineKeyboardButton("💳 Забрать выигрыш", callback_data='miner_cashout')])
+    kb.append([InlineKeyboardButton("🔙 Выйти в меню", callback_data='miner_menu')])
+    return InlineKeyboardMarkup(kb)
+
+# ─────────── GAME SESSIONS ───────────
+# Состояние начатых раундов многоходовых игр (минёр, башня, свечи, монетка)
+# хранится не в context.user_data, а в game_sessions: ставка к этому
+# моменту уже списана, поэтому раунд должен пережить перезапуск бота.
+# Раунды компактные: поле минёра - две 25-битные маски (мины и открытые
+# ячейки), ловушки башни - по полубайту на этаж, свечи - bytes. В памяти
+# держатся только начатые раунды, каждый ход пишется в таблицу. Раунд,
+# брошенный дольше GAME_SESSION_IDLE, или заменённый новым, записывается
+# в историю проигрышем (как и раньше: ставка сгорает). Конец раунда -
+# finish и settle_game - идёт одной транзакцией settlement_txn: падение
+# между ними не теряет ни выплату, ни сам раунд.
+GAME_SESSION_IDLE = 6 * 3600       # секунд без ходов до выселения
+GAME_SESSION_SWEEP_INTERVAL = 600
+
+class GameSession:
+    """Base of the round classes: stake is the ledger id of the round's bet (set by the store)"""
+    __slots__ = ('stake',)
+
+class MinerSession(GameSession):
+    """Miner round: mines and opened safe cells as 25-bit masks"""
+    __slots__ = ('bet', 'mines', 'board', 'opened')
+    NAME = "Минёр"
+
+    def __init__(self, bet, mines, board, opened=0):
+        self.bet = bet
+        self.mines = mines
+        self.board = board
+        self.opened = opened
+
+    @classmethod
+    def deal(cls, bet, mines):
+        return cls(bet, mines, deal_board(mines))
+
+    def pack(self):
+        return [self.bet, self.mines, self.board, self.opened]
+
+    @classmethod
+    def unpack(cls, values):
+        return cls(*values)
+
+    def cleared(self):
+        return popcount(self.opened)
+
+    def coeff(self):
+        return MINER_COEFFS[self.mines][popcount(self.opened)]
+
+    def reveal(self, idx):
+        """Open a cell: 'boom', 'full' (last safe cell), 'safe', or None if already open"""
+        outcome, self.opened = reveal(self.board, self.opened, idx)
+        return outcome
+
+    def details(self, result):
+        return {'bet': self.bet, 'mines': self.mines, 'mine_positions': mask_positions(self.board),
+                'cleared': self.cleared(), 'result': result}
+
+class TowerSession(GameSession):
+    """Tower round: trapped cells of floor f in bits 4f..4f+2 of traps"""
+    __slots__ = ('bet', 'traps_count', 'traps', 'floor')
+    NAME = "Башня"
+
+    def __init__(self, bet, traps_count, traps, floor=0):
+        self.bet = bet
+        self.traps_count = traps_count
+        self.traps = traps
+        self.floor = floor
+
+    @classmethod
+    def deal(cls, bet, traps_count):
+        traps = 0
+        for f in range(TOWER_FLOORS):
+            for cell in random.sample(range(3), traps_count):
+                traps |= 1 << (4 * f + cell)
+        return cls(bet, traps_count, traps)
+
+    def pack(self):
+        return [self.bet, self.traps_count, self.traps, self.floor]
+
+    @classmethod
+    def unpack(cls, values):
+        return cls(*values)
+
+    def is_trap(self, floor, cell):
+        return bool(self.traps >> (4 * floor + cell) & 1)
+
+    def trap_lists(self):
+        return [mask_positions(self.traps >> (4 * f) & 0xF) for f in range(TOWER_FLOORS)]
+
+    def details(self, result, **extra):
+        return {'bet': self.bet, 'traps': self.trap_lists(), 'floor_reached': self.floor,
+                'traps_count': self.traps_count, **extra, 'result': result}
+
+class CandlesSession(GameSession):
+    """Candles round: shown candle changes as bytes (offset by 16) and the hidden next one"""
+    __slots__ = ('bet', 'coeff', 'candles', 'next_change')
+    NAME = "Свечи"
+    SHOWN = 5
+
+    def __init__(self, bet, coeff, candles, next_change):
+        self.bet = bet
+        self.coeff = coeff
+        self.candles = candles
+        self.next_change = next_change
+
+    def pack(self):
+        return [self.bet, self.coeff, self.candles.hex(), self.next_change]
+
+    @classmethod
+    def unpack(cls, values):
+        bet, coeff, candles, next_change = values
+        return cls(bet, coeff, bytes.fromhex(candles), next_change)
+
+    def changes(self):
+        return [b - 16 for b in self.candles]
+
+    def push(self, change):
+        self.candles += bytes((change + 16,))
+
+    def moves(self):
+        """Guessed directions so far (every candle after the first SHOWN)"""
+        return [f"✅{'📈' if change > 0 else '📉'}" for change in self.changes()[self.SHOWN:]]
+
+    def details(self, result, moves=None):
+        return {'bet': self.bet, 'moves': self.moves() if moves is None else moves,
+                'coeff': round(self.coeff, 1), 'result': result}
+
+class CoinflipSession(GameSession):
+    """Coinflip round: guessed results as bits (1 = heads)"""
+    __slots__ = ('bet', 'wins', 'results')
+    NAME = "Монетка"
+
+    def __init__(self, bet, wins=0, results=0):
+        self.bet = bet
+        self.wins = wins
+        self.results = results
+
+    def pack(self):
+        return [self.bet, self.wins, self.results]
+
+    @classmethod
+    def unpack(cls, values):
+        return cls(*values)
+
+    @property
+    def coeff(self):
+        return float(2 ** self.wins)
+
+    def moves(self):
+        return [f"✅{'🦅 Орёл' if self.results >> i & 1 else '🪙 Решка'}" for i in range(self.wins)]
+
+    def details(self, result, moves=None):
+        return {'bet': self.bet, 'moves': self.moves() if moves is None else moves,
+                'coeff': int(self.coeff), 'result': result}
+
+GAME_SESSION_TYPES = {'miner': MinerSession, 'tower': TowerSession,
+                      'candles': CandlesSession, 'cf': CoinflipSession}
+
+class GameSessionStore:
+    """Active game rounds by (uid, game), written through to the game_sessions table"""
+
+    # Порядок блокировок один: сначала запись в БД (BEGIN IMMEDIATE), потом
+    # self.lock. Под self.lock без транзакции допустимо только чтение — в WAL
+    # оно не ждёт писателя. Иначе start_game_session (ставка + start) и
+    # save/finish из соседнего потока ждали бы друг друга.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    @staticmethod
+    def _unpack(game, state, stake):
+        session = GAME_SESSION_TYPES[game].unpack(json.loads(state))
+        session.stake = stake
+        return session
+
+    def _load(self, uid, game):
+        with db_cursor() as c:
+            c.execute('SELECT state, stake FROM game_sessions WHERE uid=? AND game=?', (uid, game))
+            row = c.fetchone()
+        if row is None:
+            return None
+        return self._unpack(game, *row)
+
+    def _write(self, uid, game, session):
+        with db_cursor() as c:
+            c.execute('''INSERT INTO game_sessions (uid, game, state, updated_at, stake) VALUES (?, ?, ?, ?, ?)
+                         ON CONFLICT(uid, game) DO UPDATE SET state=excluded.state, updated_at=excluded.updated_at,
+                                                              stake=excluded.stake''',
+                      (uid, game, json.dumps(session.pack()), int(time.time()), session.stake))
+
+    def get(self, uid, game):
+        """The active round, or None"""
+        key = (uid, game)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None:
+                session = self._load(uid, game)
+                if session is not None:
+                    self.sessions[key] = session
+            return session
+
+    def start(self, uid, game, session):
+        """Register a new round; returns the round it replaced, if any"""
+        key = (uid, game)
+        with db_cursor(immediate=True), self.lock:
+            previous = self.sessions.get(key) or self._load(uid, game)
+            self.sessions[key] = session
+            self._write(uid, game, session)
+        return previous
+
+    def save(self, uid, game, session):
+        """Persist a move; no-op if the round was finished or evicted meanwhile"""
+        with db_cursor(immediate=True), self.lock:
+            if self.sessions.get((uid, game)) is session:
+                self._write(uid, game, session)
+
+    def finish(self, uid, game):
+        """Remove the round and return it; None if it is already over (double click)"""
+        key = (uid, game)
+        with db_cursor(immediate=True) as c, self.lock:
+            session = self.sessions.pop(key, None) or self._load(uid, game)
+            if session is None:
+                return None
+            c.execute('DELETE FROM game_sessions WHERE uid=? AND game=?', key)
+            return session
+
+    def forget_user(self, uid):
+        """Drop every round of uid without settling it (user purge)"""
+        with db_cursor(immediate=True) as c, self.lock:
+            c.execute('DELETE FROM game_sessions WHERE uid=?', (uid,))
+            for key in [key for key in self.sessions if key[0] == uid]:
+                del self.sessions[key]
+
+    def evict_idle(self, idle=GAME_SESSION_IDLE):
+        """Remove rounds without moves for idle seconds; returns [(uid, game, session)]"""
+        cutoff = int(time.time()) - idle
+        with db_cursor(immediate=True) as c, self.lock:
+            c.execute('SELECT uid, game, state, stake FROM game_sessions WHERE updated_at<?', (cutoff,))
+            rows = c.fetchall()
+            c.execute('DELETE FROM game_sessions WHERE updated_at<?', (cutoff,))
+            for uid, game, _, _ in rows:
+                self.sessions.pop((uid, game), None)
+        return [(uid, game, self._unpack(game, state, stake)) for uid, game, state, stake in rows]
+
+game_sessions = GameSessionStore()
+
+def forfeit_game_session(uid, session, result):
+    """Record an unfinished round as lost (its bet was debited at start)"""
+    settle_game(uid, session.NAME, json.dumps(session.details(result)), session.bet, False, stake=session.stake)
+
+def start_game_session(uid, game, session):
+    """Debit the bet and register the round in one transaction; False if the balance is short"""
+    with settlement_txn():
+        stake = place_bet(uid, session.bet)
+        if stake is None:
+            return False
+        session.stake = stake.ledger_id
+        previous = game_sessions.start(uid, game, session)
+        if previous is not None:
+            forfeit_game_session(uid, previous, 'abandoned')
+    return True
+
+def sweep_game_sessions(context):
+    """job_queue callback: forfeit rounds abandoned for longer than GAME_SESSION_IDLE"""
+    with settlement_txn():
+        evicted = game_sessions.evict_idle()
+        for uid, game, session in evicted:
+            forfeit_game_session(uid, session, 'timeout')
+    if evicted:
+        print(f"[GAMES] Evicted {len(evicted)} idle game session(s)")
+
+# ─────────── EDIT GOVERNOR ───────────
+# Частые edit_message_text (анимация джетпака) идут через регулятор: общий
+# token bucket на бота и по bucket на чат. Для каждого сообщения хранится
+# только последний кадр — промежуточные склеиваются. Срочные кадры (краш,
+# сбор) уходят вне очереди и не ждут лимита чата. На RetryAfter регулятор
+# ставит всю отправку на паузу и вдвое снижает частоту кадров того чата,
+# где пришёл отказ; частота чата понемногу восстанавливается с каждой его
+# успешной правкой. Остальные чаты идут на своей частоте.
+EDIT_GLOBAL_RATE = 25.0      # правок в секунду на весь бот
+EDIT_GLOBAL_BURST = 30
+EDIT_CHAT_RATE = 1.0         # правок в секунду на чат
+EDIT_CHAT_BURST = 2
+EDIT_CHAT_MIN_RATE = 0.2
+EDIT_RATE_RECOVERY = 0.02    # прибавка к частоте чата за успешную правку
+EDIT_WORKERS = 8
+
+class TokenBucket:
+    """Token bucket: rate tokens per second, at most capacity stored"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.stamp = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        # Может уйти в минус: срочный кадр берёт токен в долг
+        self._refill(now)
+        self.tokens -= 1
+
+class EditGovernor:
+    """Rate-limited, coalescing sender of edit_message_text calls"""
+
+    def __init__(self, workers=EDIT_WORKERS):
+        self.workers = workers
+        self.cond = threading.Condition()
+        self.urgent = {}      # (chat_id, msg_id) -> кадр; dict хранит порядок вставки
+        self.frames = {}
+        self.in_flight = set()
+        self.global_bucket = TokenBucket(EDIT_GLOBAL_RATE, EDIT_GLOBAL_BURST)
+        self.chat_buckets = {}  # chat_id -> TokenBucket, rate - текущая частота чата
+        self.paused_until = 0.0
+        self.threads = []
+        self.stats = {'sent': 0, 'coalesced': 0, 'retry_after': 0, 'errors': 0}
+
+    def submit(self, bot, chat_id, msg_id, text, markup=None, urgent=False, what='edit'):
+        """Queue a frame; a newer frame for the same message replaces the old one"""
+        key = (chat_id, msg_id)
+        frame = (bot, text, markup, what)
+        with self.cond:
+            if urgent:
+                if self.frames.pop(key, None) is not None:
+                    self.stats['coalesced'] += 1
+                self.urgent[key] = frame
+            elif key in self.urgent:
+                # Итоговый кадр уже ждёт отправки — промежуточный не нужен
+                self.stats['coalesced'] += 1
+                return
+            else:
+                if key in self.frames:
+                    self.stats['coalesced'] += 1
+                    del self.frames[key]
+                self.frames[key] = frame
+            self.cond.notify()
+        self._start()
+
+    def pending(self):
+        with self.cond:
+            return len(self.urgent) + len(self.frames)
+
+    def throttled_chats(self):
+        """Number of chats whose frame rate is below EDIT_CHAT_RATE after a RetryAfter"""
+        with self.cond:
+            return sum(1 for b in self.chat_buckets.values() if b.rate < EDIT_CHAT_RATE)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) > 10000:
+                # Чаты без очереди, с полным ведром и полной частотой ничего не помнят — выкидываем
+                busy = {k[0] for k in self.urgent} | {k[0] for k in self.frames} | {k[0] for k in self.in_flight}
+                self.chat_buckets = {c: b for c, b in self.chat_buckets.items()
+                                     if c in busy or b.tokens < b.capacity or b.rate < EDIT_CHAT_RATE}
+            bucket = self.chat_buckets[chat_id] = TokenBucket(EDIT_CHAT_RATE, EDIT_CHAT_BURST)
+        return bucket
+
+    def _next(self):
+        """Pick the next sendable frame under self.cond; returns (key, frame) or a wait time"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        wait = self.global_bucket.wait_time(now)
+        if wait > 0:
+            return wait
+        for key in self.urgent:
+            if key not in self.in_flight:
+                self._chat_bucket(key[0]).take(now)
+                self.global_bucket.take(now)
+                return key, self.urgent.pop(key), True
+        wait = None
+        for key in self.frames:
+            if key in self.in_flight:
+                continue
+            bucket = self._chat_bucket(key[0])
+            chat_wait = bucket.wait_time(now)
+            if chat_wait == 0:
+                bucket.take(now)
+                self.global_bucket.take(now)
+                return key, self.frames.pop(key), False
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+        return wait
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while True:
+                    picked = self._next()
+                    if isinstance(picked, tuple):
+                        break
+                    self.cond.wait(picked)
+                key, frame, urgent = picked
+                self.in_flight.add(key)
+            bot, text, markup, what = frame
+            try:
+                bot.edit_message_text(chat_id=key[0], message_id=key[1], text=text, reply_markup=markup)
+                ok, retry = True, None
+            except RetryAfter as e:
+                ok, retry = False, e.retry_after
+            except Exception as e:
+                ok, retry = False, None
+                if 'Message is not modified' not in str(e):
+                    self.stats['errors'] += 1
+                    print(f"[EDIT] Error sending {what}: {e}")
+            with self.cond:
+                self.in_flight.discard(key)
+                bucket = self._chat_bucket(key[0])
+                if ok:
+                    self.stats['sent'] += 1
+                    bucket.rate = min(EDIT_CHAT_RATE, bucket.rate + EDIT_RATE_RECOVERY)
+                elif retry is not None:
+                    self.stats['retry_after'] += 1
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry)
+                    bucket.rate = max(EDIT_CHAT_MIN_RATE, bucket.rate / 2)
+                    print(f"[EDIT] RetryAfter {retry}s, frame rate of chat {key[0]} now {bucket.rate:.2f}/s")
+                    # Повторяем, если за это время не пришёл кадр новее
+                    queue = self.urgent if urgent else self.frames
+                    if key not in self.urgent and key not in queue:
+                        queue[key] = frame
+                self.cond.notify_all()
+
+    def _start(self):
+        if self.threads:
+            return
+        with self.cond:
+            if not self.threads:
+                for i in range(self.workers):
+                    t = threading.Thread(target=self._worker, name=f'edit-governor-{i}', daemon=True)
+                    t.start()
+                    self.threads.append(t)
+
+edit_governor = EditGovernor()
+
+# ─────────── JETPACK SCHEDULER ───────────
+# Все полёты ведёт один поток-тикер: раз в JP_TICK секунд он двигает
+# коэффициент у каждого активного полёта, а авто-сборы и краши этого тика
+# рассчитывает одной транзакцией (settle_games). Кадры отправляет
+# edit_governor, так что медленный Telegram не тормозит тики.
+JP_TICK = 0.5          # Обновление каждые 0.5 секунды для плавности
+JP_GRACE = 2.5         # сколько секунд после краша ещё принимается «Забрать»
+JP_METRICS_EVERY = 120  # тиков между строками метрик в логе (~1 минута)
+JP_SETTLE_ATTEMPTS = 20  # тиков, после которых несведённый полёт выбрасывается
+
+_jp_ticker = None
+jp_metrics = {'active': 0, 'ticks': 0, 'tick_lag': 0.0, 'max_tick_lag': 0.0, 'tick_time': 0.0, 'settled': 0}
+# Завершённые полёты, которые не удалось рассчитать: повторяем на следующем
+# тике, но не дольше JP_SETTLE_ATTEMPTS тиков. Трогает только поток тикера.
+jp_unsettled = []
+
+def _jp_end_markup():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("🔄 Играть снова", callback_data='jp_menu')],
+        [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+    ])
+
+def _jp_flight_frame(game):
+    coeff, bet = game['current'], game['bet']
+    winnings = int(bet * coeff)
+    height = min(int((coeff - 1.0) / 0.5) + 1, 10)
+    text = (
+        f"{'🚀' * height}\n"
+        f"═══════════════\n"
+        f"🔥 Коэффициент: {coeff:.2f}x\n"
+        f"💰 Выигрыш: {winnings} монет\n"
+        f"(Ставка: {bet} монет)\n"
+        f"═══════════════\n"
+        f"Нажмите ЗАБРАТЬ пока не поздно!"
+    )
+    markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"💳 Забрать {winnings} монет!", callback_data='jp_collect')]
+    ])
+    return text, markup
+
+def _jp_result_frame(game, result, balance):
+    bet, crash = game['bet'], game['crash']
+    if result == 'auto':
+        auto = game['auto']
+        text = f"🤖 Авто-сбор сработал на {auto:.2f}x!\n💰 Выиграно: {int(bet*auto)} монет\n💰 Баланс: {balance} монет"
+    else:
+        bar = "💥" * min(int(crash), 10)
+        text = (
+            f"🚀 Джетпак | Ставка: {bet} монет\n\n"
+            f"{bar}\n"
+            f"💥 КРАШ на {crash:.2f}x!\n"
+            f"Потеряли {bet} монет.\n"
+            f"💰 Баланс: {balance} монет"
+        )
+    return text, _jp_end_markup()
+
+def _jp_submit_edit(game, frame, what, urgent=False):
+    edit_governor.submit(game['bot'], game['chat_id'], game['msg_id'], frame[0], frame[1],
+                         urgent=urgent, what=what)
+
+def jp_tick():
+    """Advance every active flight one step and settle the ones that ended"""
+    now = time.time()
+    finished, frames, stale = [], [], []
+    with jp_lock:
+        for uid, game in jp_games.items():
+            if not game['active']:
+                # Завершённые полёты убираем, краш — после окна JP_GRACE
+                if not game['crashed'] or now - game['crashed_at'] > JP_GRACE:
+                    stale.append(uid)
+                continue
+            # Динамический шаг: чем выше полет, тем быстрее растет (геометрическая прогрессия)
+            # Начинаем с 0.04 каждые 0.5с (эквивалентно 0.2 в секунду)
+            coeff = game['current']
+            step = round(0.04 * (coeff ** 1.2), 2)
+            coeff = round(coeff + step, 2)
+            game['current'] = coeff
+            game['iteration'] += 1
+            if game['iteration'] % 10 == 0:
+                print(f"[JP] User {uid}: coeff={coeff:.2f}x, crash={game['crash']:.2f}x, step={step:.2f}")
+
+            auto = game.get('auto', 0.0)
+            if auto > 1.0 and coeff >= auto:
+                # Превращаем в обычный сбор, но по цене 'auto'
+                print(f"[JP] Auto-cashout for user {uid} at {auto:.2f}x")
+                game['active'] = False
+                finished.append((uid, game, 'auto'))
+            elif coeff >= game['crash']:
+                # CRASH — record crash time, give grace period
+                print(f"[JP] Crash for user {uid} at {game['crash']:.2f}x")
+                game['active'] = False
+                game['crashed'] = True
+                game['crashed_at'] = now
+                finished.append((uid, game, 'crash'))
+            else:
+                frames.append(game)
+        for uid in stale:
+            del jp_games[uid]
+        jp_metrics['active'] = len(frames)
+
+    # Полёты выше уже помечены неактивными, поэтому «Забрать» их не примет;
+    # выплату по ним не теряем, пока settle_games не пройдёт
+    finished = jp_unsettled + finished
+    jp_unsettled.clear()
+    if finished:
+        rounds = []
+        for uid, game, result in finished:
+            bet, crash = game['bet'], game['crash']
+            if result == 'auto':
+                payout = int(bet * game['auto'])
+                details = json.dumps({'bet': bet, 'crash': crash, 'collect': game['auto'], 'result': 'auto'})
+                rounds.append((uid, "Джетпак", details, payout, True, 0, payout, game.get('stake')))
+            else:
+                details = json.dumps({'bet': bet, 'crash': crash, 'collect': None, 'result': 'crash'})
+                rounds.append((uid, "Джетпак", details, bet, False, 0, 0, game.get('stake')))
+        try:
+            balances = settle_games(rounds)
+        except Exception as e:
+            print(f"[JP] Settle error for {len(rounds)} flights: {e}")
+            balances = [e]
+            if len(rounds) > 1:
+                # Один сбойный раунд не должен держать остальные: считаем поштучно
+                balances = []
+                for rnd in rounds:
+                    try:
+                        balances.append(settle_games([rnd])[0])
+                    except Exception as e:
+                        balances.append(e)
+        for (uid, game, result), balance in zip(finished, balances):
+            if isinstance(balance, Exception):
+                game['settle_attempts'] = game.get('settle_attempts', 0) + 1
+                if game['settle_attempts'] < JP_SETTLE_ATTEMPTS:
+                    jp_unsettled.append((uid, game, result))
+                else:
+                    print(f"[JP] Dropping {result} flight of user {uid} after "
+                          f"{JP_SETTLE_ATTEMPTS} failed settlements: {balance}")
+                continue
+            jp_metrics['settled'] += 1
+            if balance is not None:
+                _jp_submit_edit(game, _jp_result_frame(game, result, balance), f"{result} message", urgent=True)
+        if jp_unsettled:
+            print(f"[JP] {len(jp_unsettled)} flights retried next tick")
+
+    for game in frames:
+        _jp_submit_edit(game, _jp_flight_frame(game), "display update")
+
+def _jp_ticker_loop():
+    next_tick = time.monotonic() + JP_TICK
+    while True:
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        started = time.monotonic()
+        lag = started - next_tick
+        # Если отстали больше чем на тик, не догоняем пачкой тиков, а идём дальше
+        next_tick = next_tick + JP_TICK if lag < JP_TICK else started + JP_TICK
+        try:
+            jp_tick()
+        except Exception as e:
+            print(f"[JP] Tick error: {e}")
+        jp_metrics['ticks'] += 1
+        jp_metrics['tick_lag'] = lag
+        jp_metrics['max_tick_lag'] = max(jp_metrics['max_tick_lag'], lag)
+        jp_metrics['tick_time'] = time.monotonic() - started
+        if jp_metrics['ticks'] % JP_METRICS_EVERY == 0 and jp_metrics['active']:
+            print(f"[JP] active={jp_metrics['active']} lag={jp_metrics['tick_lag']*1000:.0f}ms "
+                  f"max_lag={jp_metrics['max_tick_lag']*1000:.0f}ms tick={jp_metrics['tick_time']*1000:.0f}ms "
+                  f"settled={jp_metrics['settled']} edits={edit_governor.stats} "
+                  f"pending={edit_governor.pending()} throttled_chats={edit_governor.throttled_chats()}")
+
+def _start_jp_ticker():
+    global _jp_ticker
+    if _jp_ticker is not None:
+        return
+    with jp_lock:
+        if _jp_ticker is None:
+            _jp_ticker = threading.Thread(target=_jp_ticker_loop, name='jp-ticker', daemon=True)
+            _jp_ticker.start()
+
+# ─────────── START ───────────
+
+def is_admin(uid):
+    """Check if user is admin"""
+    if uid in ADMINS:
+        return True
+    with db_cursor() as c:
+        c.execute('SELECT id FROM admins WHERE id=?', (uid,))
+        result = c.fetchone()
+    return result is not None
+
+@with_user_cache
+def start(update: Update, context: CallbackContext):
+    uid = update.effective_user.id
+    user = update.effective_user
+    is_new = get_user(uid).coins == 500  # freshly created
+
+    # /start после разблокировки бота — снова получатель рассылок
+    unmark_bot_blocked(uid)
+
+    # Save username
+    uname = user.username or user.first_name or ''
+    with db_cursor() as c:
+        c.execute('UPDATE users SET username=? WHERE id=?', (uname, uid))
+        db_on_commit(lambda: leaderboard.set_name(uid, uname))
+        db_on_commit(lambda: username_resolver.invalidate(uid))
+    _patch_cached_user(uid, username=uname)
+
+    # Handle referral with simple bot protection
+    args = context.args
+    if args and args[0].startswith('ref_'):
+        try:
+            referrer_id = int(args[0].replace('ref_', ''))
+            if referrer_id != uid:
+                row = get_user(uid)
+                if row.referrer_id is None:  # not yet referred
+                    # Store referrer_id temporarily in user_data for confirmation
+                    context.user_data['pending_referrer'] = referrer_id
+
+                    # Show simple human verification
+                    update.message.reply_text(
+                        "🤖 Проверка: Вы человек?",
+                        reply_markup=InlineKeyboardMarkup([
+                            [InlineKeyboardButton("✅ Да, я человек", callback_data='confirm_human_yes')],
+                            [InlineKeyboardButton("❌ Нет, я бот", callback_data='confirm_human_no')]
+                        ])
+                    )
+                    return
+                else:
+                    update.message.reply_text("⚠️ Вы уже были приглашены кем-то ранее.")
+        except (ValueError, IndexError):
+            pass
+
+    row = get_user(uid)
+    update.message.reply_text(
+        f"👋 Добро пожаловать, {uname}!\n💰 Баланс: {row.coins} монет\n\nВыберите действие:",
+        reply_markup=main_menu_kb(uid)
+    )
+
+def admin_command(update: Update, context: CallbackContext):
+    """Admin panel command"""
+    uid = update.effective_user.id
+    if not is_admin(uid):
+        update.message.reply_text("❌ У вас нет доступа к админ-панели!")
+        return
+
+    update.message.reply_text(
+        "🔧 Админ-панель\n\nВыберите действие:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📊 Статистика", callback_data='admin_stats')],
+            [InlineKeyboardButton("👥 Пользователи", callback_data='admin_users')],
+            [InlineKeyboardButton("📢 Рассылки", callback_data='admin_broadcasts')],
+            [InlineKeyboardButton("🎫 Промокоды", callback_data='admin_promos')],
+            [InlineKeyboardButton("👨‍💻 Админы", callback_data='admin_admins')],
+            [InlineKeyboardButton("📜 Логи", callback_data='admin_logs')],
+            [InlineKeyboardButton("💰 Глобальный баланс", callback_data='admin_global_balance')],
+            [InlineKeyboardButton("🔙 Выход", callback_data='main_menu')]
+        ])
+    )
+
+# ─────────── CALLBACK ROUTER ───────────
+# callback_data разбирается не цепочкой if/elif, а словарём точных совпадений
+# (O(1)) и префиксным деревом для маршрутов с параметрами. Шаблон
+# 'user_info_{target_uid:int}' кладёт литеральный префикс 'user_info_' в
+# дерево, а хвост разбирает регуляркой в именованные аргументы обработчика.
+# Шаблон 'history_page_*' ловит любой хвост без разбора. Точное совпадение
+# важнее префиксного, из префиксных побеждает самый длинный, а маршруты с
+# одинаковым префиксом пробуются в порядке регистрации.
+
+ROUTE_PARAM_TYPES = {
+    'int': (r'-?\d+', int),
+    'str': (r'.+?', str),
+}
+
+class CallbackRouter:
+    """Exact-match dict plus prefix trie for callback_data dispatch"""
+
+    def __init__(self):
+        self.exact = {}
+        self.trie = {}  # символ -> узел; маршруты узла лежат под ключом ''
+
+    def route(self, *patterns):
+        """Decorator: register handler(q, uid, d, context, **params) for patterns"""
+        def decorator(handler):
+            for pattern in patterns:
+                self.add(pattern, handler)
+            return handler
+        return decorator
+
+    def add(self, pattern, handler):
+        if '{' not in pattern and not pattern.endswith('*'):
+            if pattern in self.exact:
+                raise ValueError(f"Маршрут {pattern!r} уже зарегистрирован")
+            self.exact[pattern] = handler
+            return
+        if pattern.endswith('*'):
+            prefix, tail = pattern[:-1], None
+        else:
+            prefix = pattern[:pattern.index('{')]
+            tail = self._compile_tail(pattern[len(prefix):])
+        node = self.trie
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node.setdefault('', []).append((tail, handler))
+
+    @staticmethod
+    def _compile_tail(tail):
+        regex, converters, pos = '', {}, 0
+        for m in re.finditer(r'\{(\w+)(?::(\w+))?\}', tail):
+            part, conv = ROUTE_PARAM_TYPES[m.group(2) or 'str']
+            regex += re.escape(tail[pos:m.start()]) + f'(?P<{m.group(1)}>{part})'
+            converters[m.group(1)] = conv
+            pos = m.end()
+        regex += re.escape(tail[pos:])
+        return re.compile(regex + r'\Z'), converters
+
+    def resolve(self, data):
+        """Return (handler, params) for callback data, or (None, None)"""
+        handler = self.exact.get(data)
+        if handler is not None:
+            return handler, {}
+        node, pos, candidates = self.trie, 0, []
+        while node is not None:
+            if '' in node:
+                candidates.append((pos, node['']))
+            if pos == len(data):
+                break
+            node = node.get(data[pos])
+            pos += 1
+        for pos, routes in reversed(candidates):
+            for tail, handler in routes:
+                if tail is None:
+                    return handler, {}
+                regex, converters = tail
+                m = regex.match(data, pos)
+                if m:
+                    return handler, {k: converters[k](v) for k, v in m.groupdict().items()}
+        return None, None
+
+callback_router = CallbackRouter()
+callback_route = callback_router.route
+
+def dispatch_callback(q, uid, d, context):
+    """Run the handler registered for d; returns False if nothing matched"""
+    handler, params = callback_router.resolve(d)
+    if handler is None:
+        return False
+    handler(q, uid, d, context, **params)
+    return True
+
+# ─────────── BUTTON HANDLER ───────────
+
+# Экраны, которые читают game_history: перед ними сбрасываем очередь истории
+GAME_HISTORY_VIEWS = ('admin_', 'user_', 'history', 'gameview_')
+
+def _btn_handler(q, uid, d, context):
+    # Referral bonuses are paid by award_due_referrals, not here
+    update_last_activity(uid)
+    if d.startswith(GAME_HISTORY_VIEWS):
+        flush_game_log()
+    dispatch_callback(q, uid, d, context)
+
+@with_user_cache
+def btn(update: Update, context: CallbackContext):
+    q = update.callback_query
+    uid = q.from_user.id
+    d = q.data
+    try:
+        q.answer()
+    except Exception:
+        pass
+
+    # Check if user is blocked (except for admin functions)
+    if not d.startswith('admin_') and not is_admin(uid):
+        row = get_user(uid)
+        is_blocked = row.is_blocked
+        if is_blocked:
+            try:
+                q.edit_message_text(
+                    "🚫 Вы заблокированы!\n\nОбратитесь к администратору.",
+                    reply_markup=None
+                )
+            except Exception:
+                pass
+            return
+
+    try:
+        _btn_handler(q, uid, d, context)
+    except Exception as e:
+        if 'Message is not modified' in str(e):
+            pass  # silently ignore duplicate clicks
+        else:
+            raise
+
+# ─────────── ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ДЛЯ НОВЫХ ФУНКЦИЙ ───────────
+
+# ─────────── CHANNEL SUBSCRIPTION ───────────
+CHANNEL_USERNAME = 'dihwn_tgk'
+CHANNEL_MEMBER_STATUSES = ('member', 'administrator', 'creator')
+
+# Результат get_chat_member кэшируется по uid: подписка — надолго, отсутствие
+# подписки — ненадолго (пользователь мог только что подписаться). Одновременные
+# проверки одного uid ждут один запрос. Ошибки не кэшируются.
+CHANNEL_CACHE_TTL_POSITIVE = 300.0
+CHANNEL_CACHE_TTL_NEGATIVE = 15.0
+CHANNEL_CACHE_MAX = 10000
+
+class MembershipCache:
+    """TTL cache of channel membership with single-flight lookups"""
+
+    def __init__(self, ttl_positive=CHANNEL_CACHE_TTL_POSITIVE, ttl_negative=CHANNEL_CACHE_TTL_NEGATIVE):
+        self.ttl_positive = ttl_positive
+        self.ttl_negative = ttl_negative
+        self.lock = threading.Lock()
+        self.entries = {}    # uid -> (is_subscribed, expires_at)
+        self.inflight = {}   # uid -> [threading.Event, результат]
+
+    def get(self, uid):
+        """Cached result or None"""
+        with self.lock:
+            entry = self.entries.get(uid)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def put(self, uid, is_subscribed):
+        now = time.monotonic()
+        ttl = self.ttl_positive if is_subscribed else self.ttl_negative
+        with self.lock:
+            if len(self.entries) >= CHANNEL_CACHE_MAX:
+                self.entries = {k: v for k, v in self.entries.items() if v[1] > now}
+            self.entries[uid] = (is_subscribed, now + ttl)
+
+    def check(self, bot, uid):
+        """Is uid subscribed; asks Telegram at most once per TTL (False on errors)"""
+        cached = self.get(uid)
+        if cached is not None:
+            return cached
+        with self.lock:
+            flight = self.inflight.get(uid)
+            leader = flight is None
+            if leader:
+                flight = self.inflight[uid] = [threading.Event(), False]
+        if not leader:
+            flight[0].wait()
+            return flight[1]
+        try:
+            chat_member = bot.get_chat_member(chat_id=f'@{CHANNEL_USERNAME}', user_id=uid)
+            flight[1] = chat_member.status in CHANNEL_MEMBER_STATUSES
+            self.put(uid, flight[1])
+        except Exception as e:
+            print(f"Error checking subscription: {e}")
+        finally:
+            with self.lock:
+                del self.inflight[uid]
+            flight[0].set()
+        return flight[1]
+
+channel_membership = MembershipCache()
+
+def check_channel_subscription_sync(bot, uid):
+    """Check if user is subscribed to the channel (cached, see MembershipCache)"""
+    return channel_membership.check(bot, uid)
+
+def update_channel_subscription_status(uid, is_subscribed):
+    """Update user's channel subscription status"""
+    now = datetime.now().isoformat()
+    with db_cursor() as c:
+        c.execute('UPDATE users SET channel_subscribed=?, channel_last_check=? WHERE id=?',
+                  (1 if is_subscribed else 0, now, uid))
+    _patch_cached_user(uid, channel_subscribed=1 if is_subscribed else 0, channel_last_check=now)
+
+def get_channel_reward_status(uid):
+    """Check if user received channel reward"""
+    row = get_user(uid)
+    return row.channel_reward_received
+
+def set_channel_reward_received(uid):
+    """Mark that user received channel reward"""
+    set_field(uid, 'channel_reward_received', 1)
+
+# ─────────── SUBSCRIPTION SWEEPER ───────────
+# Отписку от канала проверяет фоновая задача job_queue, а не клик игрока.
+# Раз в CHANNEL_SWEEP_INTERVAL берём порцию получивших награду, начиная с
+# давно не проверенных (индекс по channel_reward_received, channel_last_check),
+# опрашиваем get_chat_member через бота диспетчера с ограничением частоты и
+# одной транзакцией списываем награду у отписавшихся.
+CHANNEL_SWEEP_INTERVAL = 60          # секунд между проходами
+CHANNEL_SWEEP_BATCH = 100
+CHANNEL_SWEEP_RATE = 10.0            # get_chat_member в секунду
+CHANNEL_RECHECK_AFTER = timedelta(hours=6)
+CHANNEL_PENALTY = 200
+
+channel_sweep_bucket = TokenBucket(CHANNEL_SWEEP_RATE, CHANNEL_SWEEP_RATE)
+
+def _sweep_get_status(bot, uid):
+    """Channel member status, or None if Telegram gave no definite answer"""
+    while True:
+        wait = channel_sweep_bucket.wait_time(time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+            continue
+        channel_sweep_bucket.take(time.monotonic())
+        try:
+            return bot.get_chat_member(chat_id=f'@{CHANNEL_USERNAME}', user_id=uid).status
+        except RetryAfter as e:
+            time.sleep(e.retry_after)
+        except Exception as e:
+            print(f"[SUB] Check failed for {uid}: {e}")
+            return None
+
+def sweep_channel_subscriptions(context):
+    """job_queue callback: recheck a batch of rewarded users, penalize the unsubscribed"""
+    bot = context.bot
+    cutoff = (datetime.now() - CHANNEL_RECHECK_AFTER).isoformat()
+    with db_cursor() as c:
+        c.execute('''SELECT id FROM users
+                     WHERE channel_reward_received=1 AND (channel_last_check IS NULL OR channel_last_check<?)
+                     ORDER BY channel_last_check LIMIT ?''', (cutoff, CHANNEL_SWEEP_BATCH))
+        uids = [r[0] for r in c.fetchall()]
+    if not uids:
+        return
+
+    checked, unsubscribed = [], []
+    for uid in uids:
+        status = _sweep_get_status(bot, uid)
+        if status is None:
+            # Без ответа штраф не списываем, но сдвигаем проверку в конец очереди
+            checked.append((uid, None))
+        elif status in CHANNEL_MEMBER_STATUSES:
+            checked.append((uid, 1))
+            channel_membership.put(uid, True)
+        else:
+            unsubscribed.append(uid)
+            channel_membership.put(uid, False)
+
+    now = datetime.now().isoformat()
+    penalized = []
+    with db_cursor(immediate=True) as c:
+        c.executemany('UPDATE users SET channel_subscribed=COALESCE(?, channel_subscribed), channel_last_check=? '
+                      'WHERE id=?', [(sub, now, uid) for uid, sub in checked])
+        for uid in unsubscribed:
+            # Повторная проверка флага внутри транзакции: награду не снимаем дважды
+            c.execute('SELECT coins FROM users WHERE id=? AND channel_reward_received=1', (uid,))
+            row = c.fetchone()
+            if row is None:
+                continue
+            coins = max(row[0] - CHANNEL_PENALTY, 0)
+            c.execute('''UPDATE users SET coins=?, channel_reward_received=0, channel_subscribed=0,
+                         channel_last_check=? WHERE id=?''', (coins, now, uid))
+            ledger_append(c, uid, coins - row[0], COIN_BONUS)
+            penalized.append((uid, coins))
+    for uid, coins in penalized:
+        leaderboard.set_coins(uid, coins)
+    print(f"[SUB] Checked {len(uids)}, penalized {len(penalized)}")
+
+    for uid, _ in penalized:
+        try:
+            bot.send_message(uid, f"⚠️ Вы отписались от канала @{CHANNEL_USERNAME}!\n"
+                                  f"-{CHANNEL_PENALTY} монет списано с баланса.")
+        except Exception:
+            pass
+
+# ─────────── USER MANAGEMENT ───────────
+def block_user(uid):
+    """Block user"""
+    set_field(uid, 'is_blocked', 1)
+
+def unblock_user(uid):
+    """Unblock user"""
+    set_field(uid, 'is_blocked', 0)
+
+def is_user_blocked(uid):
+    """Check if user is blocked"""
+    row = get_user(uid)
+    return row.is_blocked
+
+# ─────────── PROMO CODES EXTENDED ───────────
+def create_promocode(code, reward, max_uses=None, max_per_user=1, created_by=None):
+    """Create a new promocode"""
+    with db_cursor() as c:
+        try:
+            c.execute('''INSERT INTO promocodes (code, reward, max_uses, max_per_user, created_by)
+                         VALUES (?, ?, ?, ?, ?)''', (code, reward, max_uses, max_per_user, created_by))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+def delete_promocode(code):
+    """Delete promocode completely"""
+    with db_cursor() as c:
+        # Delete from promocodes table
+        c.execute('DELETE FROM promocodes WHERE code=?', (code,))
+        # Delete from promo_usage table
+        rollup_forget_promo_usage(c, 'code=?', (code,))
+        c.execute('DELETE FROM promo_usage WHERE code=?', (code,))
+
+def clear_all_promocodes():
+    """Delete ALL promocodes and their usage records"""
+    with db_cursor() as c:
+        # Delete all promo usage records first
+        rollup_forget_promo_usage(c, '1=1')
+        c.execute('DELETE FROM promo_usage')
+        # Delete all promocodes
+        c.execute('DELETE FROM promocodes')
+
+def get_all_promocodes(include_deleted=False):
+    """Get all promocodes"""
+    with db_cursor() as c:
+        if include_deleted:
+            c.execute('SELECT * FROM promocodes ORDER BY created_at DESC')
+        else:
+            c.execute('SELECT * FROM promocodes WHERE deleted=0 ORDER BY created_at DESC')
+        promocodes = c.fetchall()
+    return promocodes
+
+def get_promocode_usage(code):
+    """Get promocode usage statistics"""
+    with db_cursor() as c:
+        c.execute('''SELECT pu.uid, u.username, pu.used_at FROM promo_usage pu
+                     JOIN users u ON pu.uid = u.id
+                     WHERE pu.code = ? ORDER BY pu.used_at DESC''', (code,))
+        usage = c.fetchall()
+    return usage
+
+def check_promocode_usage_count(uid, code):
+    """Check how many times user used this promocode"""
+    with db_cursor() as c:
+        c.execute('SELECT COUNT(*) FROM promo_usage WHERE uid=? AND code=?', (uid, code))
+        count = c.fetchone()[0]
+    return count
+
+# ─────────── ADMIN LOGS ───────────
+def log_admin_action(admin_id, action, target_type, target_id, details=None):
+    """Log admin action; returns the log id"""
+    with db_cursor() as c:
+        c.execute('''INSERT INTO admin_logs (admin_id, action, target_type, target_id, details)
+                     VALUES (?, ?, ?, ?, ?)''', (admin_id, action, target_type, target_id, details))
+        return c.lastrowid
+
+# ─────────── STATISTICS HELPER FUNCTIONS ───────────
+def get_stats_by_period(period='all'):
+    """Get statistics by time period: day, week, month, year, all"""
+    flush_game_log()
+    modifier = STATS_PERIOD_MODIFIERS.get(period)
+    day_filter = "WHERE day >= date('now', ?)" if modifier else ""
+    params = (modifier,) if modifier else ()
+    with db_cursor() as c:
+        # Total users, coins in circulation, active users (last 24 hours)
+        c.execute('SELECT COUNT(*), SUM(coins), SUM(last_activity > datetime("now", "-24 hours")) FROM users')
+        total_users, total_coins, active_users = c.fetchone()
+
+        # Games, wins/losses, total won/lost
+        c.execute(f'SELECT SUM(games), SUM(wins), SUM(losses), SUM(won), SUM(lost) FROM stats_daily_games {day_filter}', params)
+        total_games, total_wins, total_losses, total_won, total_lost = c.fetchone()
+
+        # New users (by registration_time) and promocodes used (by used_at)
+        c.execute(f'SELECT counter, SUM(value) FROM stats_daily_counters {day_filter} GROUP BY counter', params)
+        counters = dict(c.fetchall())
+
+    return {
+        'total_users': total_users,
+        'active_users': active_users or 0,
+        'total_coins': total_coins or 0,
+        'total_games': total_games or 0,
+        'total_wins': total_wins or 0,
+        'total_losses': total_losses or 0,
+        'total_won': total_won or 0,
+        'total_lost': total_lost or 0,
+        'new_users': counters.get('new_users', 0) if modifier else total_users,
+        'promos_used': counters.get('promos_used', 0)
+    }
+
+def get_game_stats_by_period(game_name, period='all'):
+    """Get game statistics by time period"""
+    flush_game_log()
+    modifier = STATS_PERIOD_MODIFIERS.get(period)
+    day_filter = "AND day >= date('now', ?)" if modifier else ""
+    params = (game_name, modifier) if modifier else (game_name,)
+    with db_cursor() as c:
+        c.execute(f'SELECT SUM(games), SUM(wins), SUM(losses), SUM(won), SUM(lost) FROM stats_daily_games '
+                  f'WHERE game_name=? {day_filter}', params)
+        total_games, wins, losses, total_won, total_lost = c.fetchone()
+
+        # Unique players
+        c.execute(f'SELECT COUNT(DISTINCT uid) FROM stats_daily_players WHERE game_name=? {day_filter}', params)
+        unique_players = c.fetchone()[0]
+
+    return {
+        'total_games': total_games or 0,
+        'wins': wins or 0,
+        'losses': losses or 0,
+        'total_won': total_won or 0,
+        'total_lost': total_lost or 0,
+        'unique_players': unique_players
+    }
+
+def rollback_game(game_id):
+    """Rollback a specific game - toggles between rolled and not rolled"""
+    flush_game_log()
+    with db_cursor(immediate=True) as c:
+        c.execute('SELECT * FROM game_history WHERE id=?', (game_id,))
+        game = c.fetchone()
+        if not game:
+            return False, "Игра не найдена"
+
+        game_id, game_uid, gname, details, amount, is_win, is_rolled_back, created_at = game
+
+        # Получаем текущий статус - проверяем, откатана ли игра
+        is_currently_rolled = is_game_rolled_back(is_rolled_back)
+
+        if is_currently_rolled:
+            # === ОБРАТНЫЙ ОТКАТ (снимаем откат) ===
+            # Игра была откатана: если был выигрыш - вычли монеты, если проигрыш - добавили
+            # Теперь возвращаем всё обратно:
+            # - Если был выигрыш: возвращаем вычтенные монеты
+            # - Если был проигрыш: забираем добавленные монеты
+        
+            if is_win:
+                # Был выигрыш, при откате вычли - возвращаем
+                add_coins(game_uid, amount, COIN_GAME, game_id)
+                sign = "+"
+                action = "возвращены"
+            else:
+                # Был проигрыш, при откате добавили - забираем
+                add_coins(game_uid, -amount, COIN_GAME, game_id)
+                sign = "-"
+                action = "списаны"
+        
+            # Помечаем как НЕоткатанную (ставим 0)
+            c.execute('UPDATE game_history SET is_rolled_back=0 WHERE id=?', (game_id,))
+            return True, f"✅ Отмена отката: {sign}{amount} монет {action} пользователю"
+        else:
+            # === ПЕРВЫЙ ОТКАТ ===
+            # Игра не откатана: если выигрыш - вычесть монеты, если проигрыш - добавить
+        
+            if is_win:
+                # Выигрыш - вычитаем монеты
+                add_coins(game_uid, -amount, COIN_GAME, game_id)
+                sign = "-"
+                action = "списаны"
+            else:
+                # Проигрыш - добавляем монеты
+                add_coins(game_uid, amount, COIN_GAME, game_id)
+                sign = "+"
+                action = "возвращены"
+
+            # Помечаем как откаченную (ставим 1)
+            c.execute('UPDATE game_history SET is_rolled_back=1 WHERE id=?', (game_id,))
+        return True, f"↩️ Откат игры: {sign}{amount} монет {action} пользователю"
+
+ROLLBACK_CHUNK = 500
+
+def rollback_games(game_ids):
+    """Toggle rollback of many games at once (same effect as rollback_game for each id)
+
+    Everything happens in one transaction: balances change by one UPDATE per
+    user with the net delta, and is_rolled_back is set per chunk of ids.
+    Returns a report: {'rolled', 'restored', 'missing', 'users', 'net'}.
+    """
+    flush_game_log()
+    ids = list(dict.fromkeys(game_ids))
+    deltas, moves = {}, []
+    to_roll, to_restore = [], []
+    with db_cursor(immediate=True) as c:
+        for i in range(0, len(ids), ROLLBACK_CHUNK):
+            chunk = ids[i:i + ROLLBACK_CHUNK]
+            c.execute(f"SELECT id, uid, amount, is_win, is_rolled_back FROM game_history "
+                      f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            for gid, g_uid, amount, is_win, is_rolled_back in c.fetchall():
+                rolled = is_game_rolled_back(is_rolled_back)
+                # Откат выигрыша и отмена отката проигрыша списывают, остальное возвращает
+                delta = amount if bool(is_win) == rolled else -amount
+                deltas[g_uid] = deltas.get(g_uid, 0) + delta
+                moves.append((g_uid, delta, gid))
+                (to_restore if rolled else to_roll).append(gid)
+
+        c.executemany('UPDATE users SET coins=coins+? WHERE id=?',
+                      [(delta, g_uid) for g_uid, delta in deltas.items() if delta])
+        ledger_append_many(c, moves, COIN_GAME)
+        for value, group in ((1, to_roll), (0, to_restore)):
+            for i in range(0, len(group), ROLLBACK_CHUNK):
+                chunk = group[i:i + ROLLBACK_CHUNK]
+                c.execute(f"UPDATE game_history SET is_rolled_back=? WHERE id IN ({', '.join('?' * len(chunk))})",
+                          [value] + chunk)
+        for g_uid, delta in deltas.items():
+            if delta:
+                db_on_commit(functools.partial(leaderboard.add_coins, g_uid, delta))
+    invalidate_user_cache()
+
+    return {
+        'rolled': len(to_roll),
+        'restored': len(to_restore),
+        'missing': len(ids) - len(to_roll) - len(to_restore),
+        'users': len(deltas),
+        'net': sum(deltas.values()),
+    }
+
+# ─────────── GLOBAL BALANCE JOBS ───────────
+# «Добавить / вычесть / установить всем» идут не одним UPDATE по всей
+# таблице users, а фоновым заданием: игроки обходятся по id порциями по
+# BALANCE_JOB_CHUNK, каждая порция - короткая транзакция, так что расчёты
+# игр между порциями не ждут. Изменение каждого игрока пишется в
+# balance_ledger, откат и повторное применение идут по журналу тем же
+# порядком. Прогресс редактирует сообщение админа, после перезапуска
+# незавершённые задания продолжаются с last_uid.
+BALANCE_JOB_CHUNK = 500
+BALANCE_JOB_PAUSE = 0.02
+BALANCE_JOB_PROGRESS_EVERY = 3.0
+GLOBAL_BALANCE_ACTIONS = {'global_add': 'add', 'global_sub': 'sub', 'global_set': 'set'}
+
+def _balance_job_new_coins(op, amount, coins):
+    if op == 'add':
+        return coins + amount
+    if op == 'sub':
+        return max(0, coins - amount)
+    return amount
+
+def start_balance_job(admin_id, action, amount, chat_id=None, msg_id=None):
+    """Queue a global balance operation; returns its admin log id"""
+    with db_cursor(immediate=True) as c:
+        log_id = log_admin_action(admin_id, action, 'all', 0, f'{amount} coins')
+        c.execute('''INSERT INTO balance_jobs (log_id, op, amount, progress_chat_id, progress_msg_id)
+                     VALUES (?, ?, ?, ?, ?)''', (log_id, GLOBAL_BALANCE_ACTIONS[action], amount, chat_id, msg_id))
+    balance_jobs.wake()
+    return log_id
+
+def get_balance_job(log_id):
+    """(op, amount, status, affected) of a balance job, or None for logs without a ledger"""
+    with db_cursor() as c:
+        c.execute('SELECT op, amount, status, affected FROM balance_jobs WHERE log_id=?', (log_id,))
+        return c.fetchone()
+
+def toggle_balance_job(log_id, rolled_back):
+    """Queue undo (or redo, if already rolled back) of a finished job; returns (success, msg)"""
+    status = 'redo' if rolled_back else 'undo'
+    with db_cursor(immediate=True) as c:
+        c.execute("UPDATE balance_jobs SET status=?, last_uid=0 WHERE log_id=? AND status='done'", (status, log_id))
+        if not c.rowcount:
+            return False, "Операция ещё выполняется, попробуйте позже"
+        c.execute('UPDATE admin_logs SET is_rolled_back=? WHERE id=?', (0 if rolled_back else 1, log_id))
+        c.execute('SELECT COUNT(*) FROM balance_ledger WHERE log_id=?', (log_id,))
+        users = c.fetchone()[0]
+    balance_jobs.wake()
+    if rolled_back:
+        return True, f"ОБРАТНЫЙ откат запущен: {users} пользователей"
+    return True, f"Откат запущен: {users} пользователей"
+
+def run_balance_job_chunk(log_id, op, amount, status, last_uid):
+    """Process one chunk of a job in its own transaction; returns False when the job is finished"""
+    with db_cursor(immediate=True) as c:
+        if status == 'running':
+            c.execute('SELECT id, coins FROM users WHERE id>? AND is_blocked=0 ORDER BY id LIMIT ?',
+                      (last_uid, BALANCE_JOB_CHUNK))
+            rows = c.fetchall()
+            deltas = [(uid, _balance_job_new_coins(op, amount, coins or 0) - (coins or 0)) for uid, coins in rows]
+            deltas = [(uid, delta) for uid, delta in deltas if delta]
+            c.executemany('INSERT INTO balance_ledger (log_id, uid, delta) VALUES (?, ?, ?)',
+                          [(log_id, uid, delta) for uid, delta in deltas])
+        else:
+            c.execute('SELECT uid, delta FROM balance_ledger WHERE log_id=? AND uid>? ORDER BY uid LIMIT ?',
+                      (log_id, last_uid, BALANCE_JOB_CHUNK))
+            rows = c.fetchall()
+            sign = -1 if status == 'undo' else 1
+            deltas = [(uid, sign * delta) for uid, delta in rows]
+        c.executemany('UPDATE users SET coins=coins+? WHERE id=?', [(delta, uid) for uid, delta in deltas])
+        ledger_append_many(c, deltas, COIN_ADMIN, log_id)
+        for uid, delta in deltas:
+            db_on_commit(functools.partial(leaderboard.add_coins, uid, delta))
+
+        done = len(rows) < BALANCE_JOB_CHUNK
+        c.execute('''UPDATE balance_jobs SET last_uid=?, status=?, affected=affected+? WHERE log_id=?''',
+                  (rows[-1][0] if rows else last_uid, 'done' if done else status,
+                   len(rows) if status == 'running' else 0, log_id))
+    invalidate_user_cache()
+    return not done
+
+class BalanceJobRunner:
+    """Background worker for balance_jobs"""
+
+    def __init__(self):
+        self.bot = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def start(self, bot):
+        """Start the worker; unfinished jobs resume automatically"""
+        self.bot = bot
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name='balance-jobs', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def _loop(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                while self._step():
+                    pass
+            except Exception as e:
+                print(f"[BALANCE] Error: {e}")
+
+    def _step(self):
+        """Run the oldest unfinished job to the end; False when idle"""
+        with db_cursor() as c:
+            c.execute("SELECT log_id, op, amount, status, progress_chat_id, progress_msg_id "
+                      "FROM balance_jobs WHERE status!='done' ORDER BY log_id LIMIT 1")
+            job = c.fetchone()
+        if job is None:
+            return False
+        log_id, op, amount, status, chat_id, msg_id = job
+        print(f"[BALANCE] Job #{log_id} {op} {amount}: {status}")
+        last_report = time.monotonic()
+        while True:
+            with db_cursor() as c:
+                c.execute('SELECT last_uid FROM balance_jobs WHERE log_id=?', (log_id,))
+                last_uid = c.fetchone()[0]
+            if not run_balance_job_chunk(log_id, op, amount, status, last_uid):
+                break
+            if time.monotonic() - last_report >= BALANCE_JOB_PROGRESS_EVERY:
+                last_report = time.monotonic()
+                self._report(log_id, status, chat_id, msg_id)
+            time.sleep(BALANCE_JOB_PAUSE)
+        leaderboard.load()
+        self._report(log_id, status, chat_id, msg_id, final=True)
+        print(f"[BALANCE] Job #{log_id} finished")
+        return True
+
+    def _report(self, log_id, status, chat_id, msg_id, final=False):
+        if not chat_id or not msg_id or self.bot is None:
+            return
+        with db_cursor() as c:
+            c.execute('SELECT op, amount, affected, last_uid FROM balance_jobs WHERE log_id=?', (log_id,))
+            op, amount, affected, last_uid = c.fetchone()
+            c.execute('SELECT COUNT(*) FROM balance_ledger WHERE log_id=? AND uid<=?', (log_id, last_uid))
+            ledger_done = c.fetchone()[0]
+        title = {'add': f"➕ Добавление {amount} монет", 'sub': f"➖ Вычитание {amount} монет",
+                 'set': f"🔄 Установка {amount} монет"}[op]
+        if status == 'undo':
+            title = f"↩️ Откат: {title.lower()}"
+        elif status == 'redo':
+            title = f"↪️ Повтор: {title.lower()}"
+        if status == 'running':
+            line = f"👊 Затронуто: {affected} пользователей"
+        else:
+            line = f"👊 Обработано: {ledger_done} пользователей"
+        text = f"{title}\n{'✅ Готово!' if final else '⏳ Выполняется...'}\n{line}"
+        markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_global_balance')]])
+        edit_governor.submit(self.bot, chat_id, msg_id, text, markup, urgent=final, what='balance job progress')
+
+balance_jobs = BalanceJobRunner()
+
+def rollback_admin_log(log_id, admin_id):
+    """Rollback an admin log action - can be done multiple times (reverse each time)
+
+    Returns (success, message)
+    """
+    with db_cursor() as c:
+        c.execute('SELECT * FROM admin_logs WHERE id=?', (log_id,))
+        log = c.fetchone()
+    if not log:
+        return False, "Лог не найден"
+
+    log_id, log_admin_id, action, target_type, target_id, details, is_rolled_back, created_at = log
+
+    # Проверяем текущий статус отката
+    is_rolled = is_game_rolled_back(is_rolled_back)
+
+    # Глобальные операции с журналом откатываются точно, по каждому игроку
+    if action in GLOBAL_BALANCE_ACTIONS and get_balance_job(log_id):
+        return toggle_balance_job(log_id, is_rolled)
+
+    # Откатываем действие в зависимости от типа и статуса
+    success = True
+    msg = ""
+
+    if is_rolled:
+        # ОБРАТНЫЙ ОТКАТ - возвращаем всё обратно
+        if action == 'add_balance':
+            # Было: добавили монеты, откат: вычли монеты
+            # Обратный откат: возвращаем монеты
+            try:
+                amount = int(details.split()[0])
+                add_coins(target_id, amount, COIN_ADMIN, log_id)
+                msg = f"ОБРАТНЫЙ откат: возвращено {amount} монет пользователю {target_id}"
+            except:
+                success = False
+                msg = "Ошибка при обратном откате"
+
+        elif action == 'sub_balance':
+            # Было: вычли монеты, откат: вернули монеты
+            # Обратный откат: снова вычитаем
+            try:
+                amount = int(details.split()[0])
+                add_coins(target_id, -amount, COIN_ADMIN, log_id)
+                msg = f"ОБРАТНЫЙ откат: повторно вычтено {amount} монет у пользователя {target_id}"
+            except:
+                success = False
+                msg = "Ошибка при обратном откате"
+
+        elif action == 'set_balance':
+            # Обратный откат: снова применяем ту же разницу
+            moved = get_admin_ledger_delta(log_id)
+            if moved:
+                add_coins(target_id, moved[1], COIN_ADMIN, log_id)
+                msg = f"ОБРАТНЫЙ откат: повторно установлен баланс пользователю {target_id} ({moved[1]:+} монет)"
+            else:
+                msg = f"ОБРАТНЫЙ откат действия: {action}"
+
+        elif action == 'block_user':
+            # Было: заблокировали, откат: разблокировали
+            # Обратный откат: снова блокируем
+            set_field(target_id, 'is_blocked', 1)
+            msg = f"ОБРАТНЫЙ откат: пользователь {target_id} снова заблокирован"
+
+        elif action == 'unblock_user':
+            # Было: разблокировали, откат: заблокировали
+            # Обратный откат: снова разблокируем
+            set_field(target_id, 'is_blocked', 0)
+            msg = f"ОБРАТНЫЙ откат: пользователь {target_id} снова разблокирован"
+
+        elif action == 'delete_promo':
+            # Было: удалили промокод, откат: восстановили
+            # Обратный откат: снова удаляем
+            with db_cursor() as c:
+                c.execute('UPDATE promocodes SET deleted=1 WHERE code=?', (str(target_id),))
+            msg = f"ОБРАТНЫЙ откат: промокод {target_id} снова удален"
+
+        else:
+            msg = f"ОБРАТНЫЙ откат действия: {action}"
+
+        if success:
+            # Помечаем как НЕоткатанную
+            with db_cursor() as c:
+                c.execute('UPDATE admin_logs SET is_rolled_back=0 WHERE id=?', (log_id,))
+
+    else:
+        # ПЕРВЫЙ ОТКАТ
+        if action == 'add_balance':
+            # Откат добавления баланса
+            try:
+                amount = int(details.split()[0])
+                add_coins(target_id, -amount, COIN_ADMIN, log_id)
+                msg = f"Откат добавления {amount} монет пользователю {target_id}"
+            except:
+                success = False
+                msg = "Ошибка при откате добавления баланса"
+
+        elif action == 'sub_balance':
+            # Откат вычитания баланса (возвращаем вычтенное)
+            try:
+                amount = int(details.split()[0])
+                add_coins(target_id, amount, COIN_ADMIN, log_id)
+                msg = f"Откат вычитания {amount} монет пользователю {target_id}"
+            except:
+                success = False
+                msg = "Ошибка при откате вычитания баланса"
+
+        elif action == 'set_balance':
+            # Откат установки баланса: разница со старым балансом лежит в журнале
+            moved = get_admin_ledger_delta(log_id)
+            if moved:
+                add_coins(target_id, -moved[1], COIN_ADMIN, log_id)
+                msg = f"Откат установки баланса пользователю {target_id}: {-moved[1]:+} монет"
+            else:
+                msg = f"Откат установки баланса пользователю {target_id}"
+
+        elif action == 'global_add':
+            # Откат глобального добавления
+            try:
+                amount = int(details.split()[0])
+                with db_cursor(immediate=True) as c:
+                    ledger_append_where(c, -amount, COIN_ADMIN, 'coins>=?', (amount,), ref=log_id)
+                    c.execute('UPDATE users SET coins=coins-? WHERE coins>=?', (amount, amount))
+                    affected = c.rowcount
+                invalidate_user_cache()
+                leaderboard.load()
+                msg = f"Откат глобального добавления {amount} монет ({affected} пользователей)"
+            except:
+                success = False
+                msg = "Ошибка при откате глобального добавления"
+
+        elif action == 'global_sub':
+            # Откат глобального вычитания
+            try:
+                amount = int(details.split()[0])
+                with db_cursor(immediate=True) as c:
+                    ledger_append_where(c, amount, COIN_ADMIN, 'id!=?', (admin_id,), ref=log_id)
+                    c.execute('UPDATE users SET coins=coins+? WHERE id!=?', (amount, admin_id))
+                    affected = c.rowcount
+                invalidate_user_cache()
+                leaderboard.load()
+                msg = f"Откат глобального вычитания {amount} монет ({affected} пользователей)"
+            except:
+                success = False
+                msg = "Ошибка при откате глобального вычитания"
+
+        elif action == 'global_set':
+            # Откат глобальной установки - просто помечаем
+            msg = f"Откат глобальной установки баланса"
+
+        elif action == 'delete_promo':
+            # Откат удаления промокода
+            with db_cursor() as c:
+                c.execute('UPDATE promocodes SET deleted=0 WHERE code=?', (str(target_id),))
+            msg = f"Откат удаления промокода {target_id}"
+
+        elif action == 'delete_user':
+            # Откат удаления пользователя - невозможно (пользователь уже удален)
+            success = False
+            msg = "Невозможно откатить удаление пользователя"
+
+        elif action == 'block_user':
+            # Откат блокировки пользователя
+            set_field(target_id, 'is_blocked', 0)
+            msg = f"Откат блокировки пользователя {target_id}"
+
+        elif action == 'unblock_user':
+            # Откат разблокировки пользователя
+            set_field(target_id, 'is_blocked', 1)
+            msg = f"Откат разблокировки пользователя {target_id}"
+
+        else:
+            # Другие действия просто помечаем как откаченные
+            msg = f"Откат действия: {action}"
+
+        if success:
+            # Помечаем лог как откаченный
+            with db_cursor() as c:
+                c.execute('UPDATE admin_logs SET is_rolled_back=1 WHERE id=?', (log_id,))
+
+    return success, msg
+
+def rollback_promo_usage(promo_usage_id):
+    """Rollback a specific promocode usage"""
+    with db_cursor(immediate=True) as c:
+        c.execute('SELECT * FROM promo_usage WHERE id=?', (promo_usage_id,))
+        usage = c.fetchone()
+        if not usage:
+            return False, "Использование промокода не найдено"
+
+        # Таблица promo_usage имеет 6 столбцов: id, code, uid, used_at, created_at (после миграции)
+        pu_id, code, uid, used_at = usage[0], usage[1], usage[2], usage[3]
+
+        # Get promocode reward
+        c.execute('SELECT reward FROM promocodes WHERE code=?', (code,))
+        promo = c.fetchone()
+        if not promo:
+            return False, "Промокод не найден"
+
+        reward = promo[0]
+
+        # Remove coins from user
+        add_coins(uid, -reward, COIN_PROMO, pu_id)
+
+        # Decrement promocode uses
+        c.execute('UPDATE promocodes SET uses=uses-1 WHERE code=?', (code,))
+
+        # Delete usage record
+        rollup_forget_promo_usage(c, 'id=?', (pu_id,))
+        c.execute('DELETE FROM promo_usage WHERE id=?', (pu_id,))
+
+    return True, f"Откат промокода {code}: -{reward} монет"
+
+# ─────────── USER PURGE ───────────
+# Полное удаление и полный откат игрока. История игр фермы бывает в сотни
+# тысяч строк, поэтому сначала она удаляется порциями по PURGE_CHUNK, каждая
+# порция - своя транзакция: между ними блокировка записи отпускается и игры
+# остальных игроков проходят. Остальное (промокоды, логи, рефералы, сама
+# запись) делается одной короткой транзакцией множественными запросами по
+# индексам миграции 7.
+PURGE_CHUNK = 500
+PURGE_PAUSE = 0.02
+
+def purge_user_games(uid):
+    """Delete uid's game_history in chunked transactions; returns rows deleted"""
+    flush_game_log()
+    deleted = 0
+    while True:
+        with db_cursor(immediate=True) as c:
+            c.execute('SELECT id, uid, game_name, details, amount, is_win, created_at FROM game_history '
+                      'WHERE uid=? LIMIT ?', (uid, PURGE_CHUNK))
+            rows = c.fetchall()
+            if rows:
+                _rollup_game_rows(c, [row[1:] for row in rows], sign=-1)
+                c.execute(f"DELETE FROM game_history WHERE id IN ({','.join('?' * len(rows))})",
+                          [row[0] for row in rows])
+                deleted += c.rowcount
+        if len(rows) < PURGE_CHUNK:
+            return deleted
+        time.sleep(PURGE_PAUSE)
+
+def _purge_user_records(c, uid, log_action):
+    """Drop uid's promo redemptions and admin logs; returns (promos, logs) deleted"""
+    # Счётчики промокодов уменьшаются одним запросом на все коды сразу
+    c.execute('''UPDATE promocodes SET uses=uses-u.n
+                 FROM (SELECT code, COUNT(*) AS n FROM promo_usage WHERE uid=? GROUP BY code) AS u
+                 WHERE promocodes.code=u.code''', (uid,))
+    rollup_forget_promo_usage(c, 'uid=?', (uid,))
+    c.execute('DELETE FROM promo_usage WHERE uid=?', (uid,))
+    promos = c.rowcount
+
+    # Логи об игроке, логи самого игрока как админа и запись о его откате/удалении
+    logs = 0
+    for where, params in (("target_type='user' AND target_id=?", (uid,)),
+                          ('admin_id=?', (uid,)),
+                          ('target_id=? AND action=?', (uid, log_action))):
+        c.execute(f'DELETE FROM admin_logs WHERE {where}', params)
+        logs += c.rowcount
+    return promos, logs
+
+def delete_user_completely(target_uid):
+    """Completely delete user from database: delete user record, all games, all promos, all logs, update stats"""
+    with db_cursor() as c:
+        c.execute('SELECT 1 FROM users WHERE id=?', (target_uid,))
+        if not c.fetchone():
+            return False, "Пользователь не найден"
+
+    games_deleted = purge_user_games(target_uid)
+    # Flush-лок раньше блокировки записи (как в settle_games): пачка, уже
+    # взятая писателем истории, не запишется после нашей транзакции
+    with _game_log_flush_lock, db_cursor(immediate=True) as c:
+        c.execute('SELECT referrer_id, coins FROM users WHERE id=?', (target_uid,))
+        user = c.fetchone()
+        if not user:
+            return False, "Пользователь не найден"
+        referrer_id, current_balance = user
+
+        # Игры, сыгранные, пока шло порционное удаление, и ещё не записанные
+        rollup_forget_user_games(c, target_uid)
+        c.execute('DELETE FROM game_history WHERE uid=?', (target_uid,))
+        games_deleted += c.rowcount + drop_queued_games(target_uid)
+
+        promos_deleted, logs_deleted = _purge_user_records(c, target_uid, 'delete_user')
+        # Начатые раунды не рассчитываем: игрока больше нет
+        game_sessions.forget_user(target_uid)
+
+        # Update referrer's total refs count (an unpaid referral was never counted)
+        if referrer_id and not forget_pending_referral(c, target_uid):
+            c.execute('UPDATE users SET total_refs=total_refs-1 WHERE id=?', (referrer_id,))
+
+        # Remove user from admins table if they were admin
+        c.execute('DELETE FROM admins WHERE id=?', (target_uid,))
+
+        # Update all users who had this user as referrer (set referrer_id to NULL)
+        c.execute('UPDATE users SET referrer_id=NULL WHERE referrer_id=?', (target_uid,))
+        refs_cleared = c.rowcount
+
+        # Delete user record; the ledger is closed to zero so a re-registration starts clean.
+        # Контрольная точка 0 на закрывающей записи: у игроков до журнала есть только
+        # засеянная точка без записей, и сумма журнала сама по себе в ноль не сходится
+        rollup_forget_registration(c, target_uid)
+        c.execute('DELETE FROM users WHERE id=?', (target_uid,))
+        ledger_append(c, target_uid, -(current_balance or 0), COIN_ADMIN)
+        c.execute('''INSERT INTO coin_checkpoints (uid, coins, ledger_id)
+                     SELECT ?, 0, COALESCE(MAX(id), 0) FROM coin_ledger WHERE uid=?
+                     ON CONFLICT(uid) DO UPDATE SET coins=0, ledger_id=excluded.ledger_id''',
+                  (target_uid, target_uid))
+        db_on_commit(lambda: leaderboard.remove(target_uid))
+        db_on_commit(lambda: username_resolver.invalidate(target_uid))
+    with jp_lock:
+        jp_games.pop(target_uid, None)
+    invalidate_user_cache()
+
+    return True, f"Пользователь удалён! Игр: {games_deleted}, Промо: {promos_deleted}, Логов: {logs_deleted}, Рефы очищены: {refs_cleared}"
+
+def rollback_user_completely(target_uid):
+    """Completely rollback user: reset balance, delete all games, delete all promos, delete logs, clear refs"""
+    with db_cursor() as c:
+        c.execute('SELECT 1 FROM users WHERE id=?', (target_uid,))
+        if not c.fetchone():
+            return False, "Пользователь не найден"
+
+    games_deleted = purge_user_games(target_uid)
+    # Flush-лок раньше блокировки записи (как в settle_games): пачка, уже
+    # взятая писателем истории, не запишется после нашей транзакции
+    with _game_log_flush_lock, db_cursor(immediate=True) as c:
+        c.execute('SELECT referrer_id, coins FROM users WHERE id=?', (target_uid,))
+        result = c.fetchone()
+        if not result:
+            return False, "Пользователь не найден"
+        referrer_id, current_balance = result
+
+        # Игры, сыгранные, пока шло порционное удаление, и ещё не записанные
+        rollup_forget_user_games(c, target_uid)
+        c.execute('DELETE FROM game_history WHERE uid=?', (target_uid,))
+        games_deleted += c.rowcount + drop_queued_games(target_uid)
+
+        promos_deleted, logs_deleted = _purge_user_records(c, target_uid, 'rollback_user')
+
+        # Update referrer's total refs count (remove this user from their ref count)
+        if referrer_id and not forget_pending_referral(c, target_uid):
+            c.execute('UPDATE users SET total_refs=total_refs-1 WHERE id=?', (referrer_id,))
+
+        # Reset user balance, referrer and other stats
+        c.execute('''UPDATE users SET coins=?, referrer_id=NULL, total_refs=0, consecutive_wins=0,
+                     jetpack_best=0.0, jetpack_auto=0.0, last_hourly=NULL, last_wheel=NULL WHERE id=?''',
+                  (START_COINS, target_uid))
+        ledger_append(c, target_uid, START_COINS - (current_balance or 0), COIN_ADMIN)
+        db_on_commit(lambda: leaderboard.set_coins(target_uid, START_COINS))
+    invalidate_user_cache()
+
+    return True, f"Пользователь откачен! Игр: {games_deleted}, Промо: {promos_deleted}, Логов: {logs_deleted}, Баланс сброшен на 500"
+
+def get_action_description(action, target_type, target_id):
+    """Get human-readable description of admin action"""
+    action_map = {
+        'add_balance': '💰 Добавил баланс',
+        'sub_balance': '💸 Вычел баланс',
+        'set_balance': '🔄 Установил баланс',
+        'block': '🚫 Заблокировал',
+        'unblock': '✅ Разблокировал',
+        'give_admin': '👨‍💻 Выдал админку',
+        'remove_admin': '❌ Снял админку',
+        'delete_promo': '🗑️ Удалил промокод',
+        'create_promo': '🎫 Создал промокод',
+        'reset_refs': '👥 Обнулил рефералов',
+        'block_refs': '🚫 Заблокировал рефералов',
+        'send_message': '📢 Отправил сообщение',
+        'create_broadcast': '📢 Создал рассылку',
+        'create_broadcast_photo': '📢 Создал рассылку с фото',
+        'add_admin': '👨‍💻 Добавил админа',
+        'global_add': '💰 Добавил баланс',
+        'global_sub': '💸 Вычел баланс',
+        'global_set': '🔄 Установил баланс',
+        'rollback_game': '↩️ Откатил игру',
+        'mass_rollback_games': '↩️ Массово откатил игр:',
+        'rollback_admin': '↩️ Откатил действие',
+        'rollback_user': '↩️ Полностью откатил',
+        'rollback_promo': '↩️ Откатил промокод',
+        'clear_all_promos': '🗑️ Очистил все промокоды',
+    }
+
+    action_desc = action_map.get(action, action)
+
+    if target_type == 'user':
+        target_desc = f"пользователю #{target_id}"
+    elif target_type == 'admin':
+        target_desc = f"админу #{target_id}"
+    elif target_type == 'promocode':
+        target_desc = f"промокод {target_id}"
+    elif target_type == 'all':
+        target_desc = "всем пользователям"
+    elif target_type == 'game':
+        target_desc = f"игру #{target_id}"
+    elif target_type == 'log':
+        target_desc = f"лог #{target_id}"
+    elif target_type == 'promo_usage':
+        target_desc = f"использование #{target_id}"
+    else:
+        target_desc = str(target_id) if target_id else ""
+
+    # Для глобальных действий добавляем "всем пользователям"
+    if action in ['global_add', 'global_sub', 'global_set', 'clear_all_promos']:
+        return f"{action_desc} всем пользователям"
+
+    return f"{action_desc} {target_desc}"
+
+def get_admin_logs(limit=100, page=0, rolled_back=None, cursor=None):
+    """Get admin logs with pagination and optional filter by rolled_back status: (logs, total, PageNav)
+
+    Args:
+        limit: number of logs per page
+        page: page number (0-indexed)
+        rolled_back: None (all), False (not rolled back), True (rolled back)
+        cursor: PageNav or jump_cursors cursor (None = first page)
+    """
+    where = ROLLED_BACK_WHERE[rolled_back]
+    with db_cursor() as c:
+        total = count_admin_logs(rolled_back, c)
+        logs, nav = admin_logs_pager.page(c, where, (), page, limit, cursor)
+    return logs, total, nav
+
+def get_admin_logs_jumps(limit=10, rolled_back=None, current=0, here=None):
+    """Go-to-page menu of the admin logs: (pages, {page: cursor})"""
+    where = ROLLED_BACK_WHERE[rolled_back]
+    with db_cursor() as c:
+        total = count_admin_logs(rolled_back, c)
+        pages = (total + limit - 1) // limit or 1
+        cursors = admin_logs_pager.jump_cursors(c, where, (), limit, total,
+                                                jump_pages(pages, current), current, here)
+    return pages, cursors
+
+def count_admin_logs(rolled_back=None, c=None):
+    """Cached number of admin log entries"""
+    where = ROLLED_BACK_WHERE[rolled_back]
+    sql = 'SELECT COUNT(*) FROM admin_logs' + (f' WHERE {where}' if where else '')
+    if c is not None:
+        return count_cached(c, sql)
+    with db_cursor() as c:
+        return count_cached(c, sql)
+
+# ─────────── ADMIN MANAGEMENT ───────────
+def get_all_admins():
+    """Get all admins"""
+    with db_cursor() as c:
+        c.execute('''SELECT a.id, a.added_by, a.added_at, u.username FROM admins a
+                     LEFT JOIN users u ON a.id = u.id ORDER BY a.id''')
+        admins = c.fetchall()
+    return admins
+
+def add_admin(admin_id, added_by):
+    """Add new admin"""
+    with db_cursor() as c:
+        try:
+            c.execute('INSERT INTO admins (id, added_by) VALUES (?, ?)', (admin_id, added_by))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+def remove_admin(admin_id):
+    """Remove admin"""
+    with db_cursor() as c:
+        c.execute('DELETE FROM admins WHERE id=?', (admin_id,))
+
+# ─────────── USER MANAGEMENT EXTENDED ───────────
+def search_users(query, page=0, page_size=10):
+    """Search users by ID or username"""
+    offset = page * page_size
+    with db_cursor() as c:
+        # Try to parse as ID first
+        try:
+            uid = int(query)
+            c.execute('SELECT id, username, coins, total_refs FROM users WHERE id=?', (uid,))
+        except ValueError:
+            # Search by username
+            c.execute('SELECT id, username, coins, total_refs FROM users WHERE username LIKE ? LIMIT ? OFFSET ?',
+                      (f'%{query}%', page_size, offset))
+
+        users = c.fetchall()
+    return users
+
+USER_LIST_COLUMNS = 'id, username, coins, total_refs'
+# sort_by -> (условие, ключ сортировки, по убыванию)
+USER_SORTS = {
+    'coins': ('', ('coins', 'id'), True),
+    'coins_asc': ('', ('coins', 'id'), False),
+    'refs': ('', ('total_refs', 'id'), True),
+    'refs_asc': ('', ('total_refs', 'id'), False),
+    'id': ('', ('id',), True),
+    'id_asc': ('', ('id',), False),
+    'reg': ('', ("COALESCE(registration_time, '')", 'id'), True),
+    'reg_asc': ('', ("COALESCE(registration_time, '')", 'id'), False),
+    'blocked': ('is_blocked=1', ('id',), True),
+    'active': ('is_blocked=0', ('id',), True),
+}
+user_pagers = {sort_by: KeysetPager('users', USER_LIST_COLUMNS, keys, desc)
+               for sort_by, (where, keys, desc) in USER_SORTS.items()}
+
+def sort_users(sort_by, page=0, page_size=10, cursor=None):
+    """Sort users by parameter: (users, PageNav)"""
+    if sort_by not in USER_SORTS:
+        sort_by = 'id'  # 'all' и неизвестные — новые сверху
+    with db_cursor() as c:
+        return user_pagers[sort_by].page(c, USER_SORTS[sort_by][0], (), page, page_size, cursor)
+
+# ─────────── BROADCASTS ───────────
+def create_broadcast(message_type, content, file_id=None, scheduled_at=None, created_by=None):
+    """Create a broadcast (text or image)"""
+    with db_cursor() as c:
+        c.execute('''INSERT INTO admin_broadcasts (message_type, content, file_id, scheduled_at, created_by)
+                     VALUES (?, ?, ?, ?, ?)''', (message_type, content, file_id, scheduled_at, created_by))
+        broadcast_id = c.lastrowid
+    return broadcast_id
+
+BROADCAST_SELECT = ('SELECT id, message_type, content, file_id, scheduled_at, sent_at, status, created_by, '
+                    'created_at, repeat_every FROM admin_broadcasts')
+
+def get_broadcasts(status=None):
+    """Get broadcasts, optionally filtered by status"""
+    with db_cursor() as c:
+        if status:
+            c.execute(BROADCAST_SELECT + ' WHERE status=? ORDER BY id DESC', (status,))
+        else:
+            c.execute(BROADCAST_SELECT + ' ORDER BY id DESC')
+        broadcasts = c.fetchall()
+    return broadcasts
+
+def delete_broadcast(broadcast_id):
+    """Delete a broadcast"""
+    with db_cursor() as c:
+        c.execute('DELETE FROM broadcast_deliveries WHERE broadcast_id=?', (broadcast_id,))
+        c.execute('DELETE FROM admin_broadcasts WHERE id=?', (broadcast_id,))
+
+def mark_broadcast_sent(broadcast_id):
+    """Mark broadcast as sent (a cancelled one stays cancelled)"""
+    with db_cursor() as c:
+        c.execute('''UPDATE admin_broadcasts SET status='sent', sent_at=?
+                     WHERE id=? AND status!='cancelled' ''', (datetime.now().isoformat(), broadcast_id))
+
+# ─────────── BROADCAST QUEUE ───────────
+# Рассылка не идёт в обработчике админа. enqueue_broadcast ставит её в статус
+# 'scheduled' (немедленная — на текущее время). Фоновый broadcast_sender по
+# индексу (status, scheduled_at) находит наступившие рассылки и в одной
+# транзакции переводит их в 'sending' и создаёт по строке broadcast_deliveries
+# на каждого получателя (кроме заблокировавших бота), поэтому после
+# перезапуска ничего не отправится дважды. Повторяющаяся рассылка при запуске
+# порождает копию, а сама сдвигается на repeat_every секунд вперёд.
+# Одновременно идёт не больше BROADCAST_MAX_ACTIVE рассылок; отправитель
+# обходит их по очереди порциями с общим token bucket и паузой на RetryAfter.
+# Статус доставки пишется сразу после отправки — рассылка продолжается с того
+# же места. Прогресс редактируется в сообщении админа.
+BROADCAST_RATE = 25.0          # сообщений в секунду (лимит Telegram ~30/с)
+BROADCAST_BURST = 25
+BROADCAST_CHUNK = 200
+BROADCAST_MAX_ATTEMPTS = 3
+BROADCAST_MAX_ACTIVE = 2
+BROADCAST_PROGRESS_EVERY = 5.0
+BROADCAST_IDLE_POLL = 30.0
+
+# broadcast_deliveries.status
+DELIVERY_PENDING, DELIVERY_SENT, DELIVERY_FAILED, DELIVERY_BLOCKED = 0, 1, 2, 3
+
+def broadcast_time(dt):
+    """scheduled_at is stored as ISO text, so it compares correctly as a string"""
+    return dt.isoformat(sep=' ', timespec='seconds')
+
+def enqueue_broadcast(broadcast_id, progress_chat_id=None, progress_msg_id=None,
+                      scheduled_at=None, repeat_every=None):
+    """Queue a broadcast: now, or at scheduled_at (datetime), repeating every repeat_every seconds"""
+    when = broadcast_time(scheduled_at or datetime.now())
+    with db_cursor() as c:
+        c.execute('''UPDATE admin_broadcasts
+                     SET status='scheduled', scheduled_at=?, repeat_every=?, progress_chat_id=?, progress_msg_id=?
+                     WHERE id=?''', (when, repeat_every, progress_chat_id, progress_msg_id, broadcast_id))
+    broadcast_sender.wake()
+
+def cancel_broadcast(broadcast_id):
+    """Cancel a scheduled broadcast (or the remaining deliveries of a running one)"""
+    with db_cursor(immediate=True) as c:
+        c.execute('''UPDATE admin_broadcasts SET status='cancelled'
+                     WHERE id=? AND status IN ('scheduled', 'sending')''', (broadcast_id,))
+        if not c.rowcount:
+            return False
+        c.execute('DELETE FROM broadcast_deliveries WHERE broadcast_id=? AND status=?',
+                  (broadcast_id, DELIVERY_PENDING))
+    return True
+
+def promote_due_broadcasts(now=None):
+    """Move due scheduled broadcasts to 'sending' (up to BROADCAST_MAX_ACTIVE running)"""
+    now = now or datetime.now()
+    promoted = 0
+    with db_cursor(immediate=True) as c:
+        c.execute("SELECT COUNT(*) FROM admin_broadcasts WHERE status='sending'")
+        free = BROADCAST_MAX_ACTIVE - c.fetchone()[0]
+        if free <= 0:
+            return 0
+        c.execute('''SELECT id, message_type, content, file_id, scheduled_at, repeat_every,
+                            created_by, progress_chat_id, progress_msg_id
+                     FROM admin_broadcasts WHERE status='scheduled' AND scheduled_at<=?
+                     ORDER BY scheduled_at LIMIT ?''', (broadcast_time(now), free))
+        for (b_id, msg_type, content, file_id, scheduled_at, repeat_every,
+             created_by, chat_id, msg_id) in c.fetchall():
+            if repeat_every:
+                # Запуск идёт копией, сама рассылка остаётся в расписании.
+                # Пропущенные за время простоя повторы не догоняем
+                c.execute('''INSERT INTO admin_broadcasts
+                             (message_type, content, file_id, scheduled_at, status, created_by,
+                              progress_chat_id, progress_msg_id)
+                             VALUES (?, ?, ?, ?, 'sending', ?, ?, ?)''',
+                          (msg_type, content, file_id, scheduled_at, created_by, chat_id, msg_id))
+                run_id = c.lastrowid
+                next_at = datetime.fromisoformat(scheduled_at)
+                while next_at <= now:
+                    next_at += timedelta(seconds=repeat_every)
+                c.execute('UPDATE admin_broadcasts SET scheduled_at=? WHERE id=?',
+                          (broadcast_time(next_at), b_id))
+            else:
+                run_id = b_id
+                c.execute("UPDATE admin_broadcasts SET status='sending' WHERE id=?", (b_id,))
+            c.execute('''INSERT OR IGNORE INTO broadcast_deliveries (broadcast_id, uid)
+                         SELECT ?, id FROM users WHERE id NOT IN (SELECT uid FROM bot_blocked_users)''',
+                      (run_id,))
+            promoted += 1
+    if promoted:
+        print(f"[BROADCAST] Started {promoted} scheduled broadcast(s)")
+    return promoted
+
+def next_broadcast_due_in(now=None):
+    """Seconds until the next scheduled broadcast, or None"""
+    with db_cursor() as c:
+        c.execute("SELECT MIN(scheduled_at) FROM admin_broadcasts WHERE status='scheduled'")
+        due = c.fetchone()[0]
+    if due is None:
+        return None
+    return max(0.0, (datetime.fromisoformat(due) - (now or datetime.now())).total_seconds())
+
+def get_broadcast_progress(broadcast_id):
+    """{'total', 'pending', 'sent', 'failed', 'blocked'} for a broadcast"""
+    with db_cursor() as c:
+        c.execute('SELECT status, COUNT(*) FROM broadcast_deliveries WHERE broadcast_id=? GROUP BY status',
+                  (broadcast_id,))
+        counts = dict(c.fetchall())
+    return {
+        'total': sum(counts.values()),
+        'pending': counts.get(DELIVERY_PENDING, 0),
+        'sent': counts.get(DELIVERY_SENT, 0),
+        'failed': counts.get(DELIVERY_FAILED, 0),
+        'blocked': counts.get(DELIVERY_BLOCKED, 0),
+    }
+
+def unmark_bot_blocked(uid):
+    """User is reachable again (e.g. pressed /start after unblocking the bot)"""
+    with db_cursor() as c:
+        c.execute('DELETE FROM bot_blocked_users WHERE uid=?', (uid,))
+
+class BroadcastSender:
+    """Background dispatcher and sender for queued broadcasts"""
+
+    def __init__(self):
+        self.bot = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.bucket = TokenBucket(BROADCAST_RATE, BROADCAST_BURST)
+        self.cursors = {}        # broadcast_id -> последний обработанный uid в текущем проходе
+        self.last_report = {}    # broadcast_id -> time.monotonic() последнего прогресса
+
+    def start(self, bot):
+        """Start (or wake) the sender; unfinished broadcasts resume automatically"""
+        self.bot = bot
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name='broadcast-sender', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def _loop(self):
+        while True:
+            try:
+                due_in = next_broadcast_due_in()
+            except Exception as e:
+                print(f"[BROADCAST] Error: {e}")
+                due_in = None
+            timeout = BROADCAST_IDLE_POLL if due_in is None else min(due_in, BROADCAST_IDLE_POLL)
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+            try:
+                while self._step():
+                    pass
+            except Exception as e:
+                print(f"[BROADCAST] Error: {e}")
+
+    def _step(self):
+        """Promote due broadcasts and send one chunk of each running one; False when idle"""
+        promote_due_broadcasts()
+        with db_cursor() as c:
+            c.execute('''SELECT id, message_type, content, file_id, progress_chat_id, progress_msg_id
+                         FROM admin_broadcasts WHERE status='sending' ORDER BY id''')
+            running = c.fetchall()
+        for broadcast in running:
+            self._send_chunk(*broadcast)
+        return bool(running)
+
+    def _send_chunk(self, broadcast_id, message_type, content, file_id, chat_id, msg_id):
+        last_uid = self.cursors.get(broadcast_id, 0)
+        with db_cursor() as c:
+            c.execute('''SELECT uid, attempts FROM broadcast_deliveries
+                         WHERE broadcast_id=? AND uid>? AND status=? ORDER BY uid LIMIT ?''',
+                      (broadcast_id, last_uid, DELIVERY_PENDING, BROADCAST_CHUNK))
+            chunk = c.fetchall()
+        if not chunk:
+            if last_uid:
+                # Конец прохода: следующий подберёт доставки, ждущие повтора.
+                # Каждая попытка увеличивает attempts, так что проходов не больше BROADCAST_MAX_ATTEMPTS
+                self.cursors[broadcast_id] = 0
+                return
+            self.cursors.pop(broadcast_id, None)
+            self.last_report.pop(broadcast_id, None)
+            mark_broadcast_sent(broadcast_id)
+            self._report(broadcast_id, chat_id, msg_id, final=True)
+            print(f"[BROADCAST] Finished #{broadcast_id}")
+            return
+        if broadcast_id not in self.last_report:
+            self.last_report[broadcast_id] = 0.0
+            print(f"[BROADCAST] Sending #{broadcast_id}")
+        for uid, attempts in chunk:
+            self._deliver(broadcast_id, message_type, content, file_id, uid, attempts)
+            if time.monotonic() - self.last_report[broadcast_id] >= BROADCAST_PROGRESS_EVERY:
+                self.last_report[broadcast_id] = time.monotonic()
+                self._report(broadcast_id, chat_id, msg_id)
+        self.cursors[broadcast_id] = chunk[-1][0]
+
+    def _deliver(self, broadcast_id, message_type, content, file_id, uid, attempts):
+        error = None
+        while True:
+            wait = self.bucket.wait_time(time.monotonic())
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            self.bucket.take(time.monotonic())
+            try:
+                if message_type == 'photo':
+                    self.bot.send_photo(uid, file_id, caption=content)
+                else:
+                    self.bot.send_message(uid, content, parse_mode='HTML')
+                status = DELIVERY_SENT
+            except RetryAfter as e:
+                print(f"[BROADCAST] RetryAfter {e.retry_after}s")
+                time.sleep(e.retry_after)
+                continue
+            except Unauthorized as e:
+                # Бот заблокирован или аккаунт удалён
+                status, error = DELIVERY_BLOCKED, str(e)
+            except NetworkError as e:
+                error = str(e)
+                status = DELIVERY_PENDING if attempts + 1 < BROADCAST_MAX_ATTEMPTS else DELIVERY_FAILED
+            except Exception as e:
+                status, error = DELIVERY_FAILED, str(e)
+            break
+        with db_cursor() as c:
+            c.execute('''UPDATE broadcast_deliveries SET status=?, attempts=attempts+1, error=?
+                         WHERE broadcast_id=? AND uid=?''', (status, error, broadcast_id, uid))
+            if status == DELIVERY_BLOCKED:
+                c.execute('INSERT OR IGNORE INTO bot_blocked_users (uid) VALUES (?)', (uid,))
+
+    def _report(self, broadcast_id, chat_id, msg_id, final=False):
+        if not chat_id or not msg_id:
+            return
+        p = get_broadcast_progress(broadcast_id)
+        done = p['total'] - p['pending']
+        if final:
+            text = (f"✅ Рассылка #{broadcast_id} завершена!\n"
+                    f"📊 Отправлено: {p['sent']}\n"
+                    f"❌ Ошибок: {p['failed']}\n"
+                    f"🚫 Заблокировали бота: {p['blocked']}")
+        else:
+            text = (f"📤 Рассылка #{broadcast_id}: {done} из {p['total']}\n"
+                    f"📊 Отправлено: {p['sent']} | ❌ Ошибок: {p['failed']} | 🚫 {p['blocked']}")
+        markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_broadcasts')]])
+        edit_governor.submit(self.bot, chat_id, msg_id, text, markup, urgent=final, what='broadcast progress')
+
+broadcast_sender = BroadcastSender()
@@ -0,0 +1,4 @@
+"""Callback handlers by area; importing the package registers their routes"""
+
+from handlers import (channel, admin, menu, candles, coinflip, miner, jetpack, slots, tower,  # noqa: F401
+                      wheel, leaderboard, referrals, human_check)
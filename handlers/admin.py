@@ -0,0 +1,2231 @@
+"""Admin panel callbacks"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import (GAME_EMOJIS, add_admin, block_user, callback_route, cancel_broadcast,
+                 clear_all_promocodes, db_cursor, delete_promocode, delete_user_completely,
+                 dispatch_callback, format_game_detail, format_number, format_number_full,
+                 get_action_description, get_admin_logs, get_admin_logs_jumps,
+                 get_broadcast_progress, get_broadcasts, get_game_feed, get_game_feed_jumps,
+                 get_game_info, get_game_stats_by_period, get_history_paged,
+                 get_stats_by_period, get_user, invalidate_user_cache, is_admin,
+                 is_game_rolled_back, log_admin_action, remove_admin, resolve_usernames,
+                 rollback_admin_log, rollback_game, rollback_games, rollback_promo_usage,
+                 rollback_user_completely, sort_users, unblock_user,
+                 username_resolver)
+
+# ── АДМИН ПАНЕЛЬ ──
+@callback_route('admin_stats')
+def _cb_admin_stats(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    period = context.user_data.get('admin_stats_period', 'all')
+    stats = get_stats_by_period(period)
+
+    period_names = {
+        'day': 'За день',
+        'week': 'За неделю',
+        'month': 'За месяц',
+        'year': 'За год',
+        'all': 'За все время'
+    }
+
+    period_name = period_names.get(period, 'За все время')
+
+    winrate = stats['total_wins'] / stats['total_games'] * 100 if stats['total_games'] > 0 else 0
+    profit = stats['total_won'] - stats['total_lost']
+
+    q.edit_message_text(
+        f"📊 Общая статистика ({period_name})\n\n"
+        f"👥 Всего пользователей: {stats['total_users']}\n"
+        f"✅ Активные (24ч): {stats['active_users']}\n"
+        f"📅 Новых пользователей: {stats['new_users']}\n"
+        f"💰 Монет в обороте: {stats['total_coins']:,}\n"
+        f"🎮 Всего игр: {stats['total_games']}\n"
+        f"✅ Побед: {stats['total_wins']}\n"
+        f"❌ Поражений: {stats['total_losses']}\n"
+        f"📈 Winrate: {winrate:.1f}%\n"
+        f"💰 Всего выиграно: {stats['total_won']:,}\n"
+        f"💸 Всего проиграно: {stats['total_lost']:,}\n"
+        f"📊 Прибыль/Убыток: {profit:+,}\n"
+        f"🎫 Промокодов использовано: {stats['promos_used']}",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📊 За день", callback_data='admin_stats_period_day'),
+             InlineKeyboardButton("📊 За неделю", callback_data='admin_stats_period_week')],
+            [InlineKeyboardButton("📊 За месяц", callback_data='admin_stats_period_month'),
+             InlineKeyboardButton("📊 За год", callback_data='admin_stats_period_year')],
+            [InlineKeyboardButton("📊 За все время", callback_data='admin_stats_period_all')],
+            [InlineKeyboardButton("🎮 Статистика по играм", callback_data='admin_stats_games')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='admin_menu')]
+        ])
+    )
+
+
+@callback_route('admin_stats_period_{period}')
+def _cb_admin_stats_period(q, uid, d, context, period):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    context.user_data['admin_stats_period'] = period
+    d = 'admin_stats'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_stats_games')
+def _cb_admin_stats_games(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    period = context.user_data.get('admin_stats_period', 'all')
+    period_names = {
+        'day': 'За день',
+        'week': 'За неделю',
+        'month': 'За месяц',
+        'year': 'За год',
+        'all': 'За все время'
+    }
+
+    q.edit_message_text(
+        f"📊 Статистика по играм ({period_names.get(period, 'За все время')})\n\nВыберите игру:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🪙 Монетка", callback_data='admin_stats_game_monetka')],
+            [InlineKeyboardButton("⛏️ Минёр", callback_data='admin_stats_game_miner')],
+            [InlineKeyboardButton("🚀 Джетпак", callback_data='admin_stats_game_jetpack')],
+            [InlineKeyboardButton("🎰 Слоты", callback_data='admin_stats_game_slots')],
+            [InlineKeyboardButton("🗼 Башня", callback_data='admin_stats_game_tower')],
+            [InlineKeyboardButton("📊 Японские свечи", callback_data='admin_stats_game_candles')],
+            [InlineKeyboardButton("🎡 Колесо фортуны", callback_data='admin_stats_game_wheel')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='admin_stats')]
+        ])
+    )
+
+
+@callback_route('admin_stats_game_{game_key}')
+def _cb_admin_stats_game(q, uid, d, context, game_key):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    game_map = {
+        'monetka': 'Монетка',
+        'miner': 'Минёр',
+        'jetpack': 'Джетпак',
+        'slots': 'Слоты',
+        'tower': 'Башня',
+        'candles': 'Свечи',
+        'wheel': 'Колесо фортуны'
+    }
+    game_name = game_map.get(game_key, d)
+
+    period = context.user_data.get('admin_stats_period', 'all')
+    period_names = {
+        'day': 'За день',
+        'week': 'За неделю',
+        'month': 'За месяц',
+        'year': 'За год',
+        'all': 'За все время'
+    }
+
+    stats = get_game_stats_by_period(game_name, period)
+
+    emoji = GAME_EMOJIS.get(game_name, '🎮')
+
+    winrate = stats['wins'] / stats['total_games'] * 100 if stats['total_games'] > 0 else 0
+    profit = stats['total_won'] - stats['total_lost']
+
+    q.edit_message_text(
+        f"{emoji} Статистика: {game_name} ({period_names.get(period, 'За все время')})\n\n"
+        f"🎮 Всего игр: {stats['total_games']}\n"
+        f"👊 Уникальных игроков: {stats['unique_players']}\n"
+        f"✅ Побед: {stats['wins']}\n"
+        f"❌ Поражений: {stats['losses']}\n"
+        f"💰 Всего выиграно: {stats['total_won']:,}\n"
+        f"💸 Всего проиграно: {stats['total_lost']:,}\n"
+        f"📈 Winrate: {winrate:.1f}%\n"
+        f"📊 Прибыль/Убыток: {profit:+,}",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Обновить", callback_data=d)],
+            [InlineKeyboardButton("🔙 Назад", callback_data='admin_stats_games')]
+        ])
+    )
+
+
+@callback_route('admin_menu')
+def _cb_admin_menu(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "🔧 Админ-панель\n\nВыберите действие:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📊 Статистика", callback_data='admin_stats')],
+            [InlineKeyboardButton("👥 Пользователи", callback_data='admin_users')],
+            [InlineKeyboardButton("📢 Рассылки", callback_data='admin_broadcasts')],
+            [InlineKeyboardButton("🎫 Промокоды", callback_data='admin_promos')],
+            [InlineKeyboardButton("👨‍💻 Админы", callback_data='admin_admins')],
+            [InlineKeyboardButton("📜 Логи", callback_data='admin_logs')],
+            [InlineKeyboardButton("💰 Глобальный баланс", callback_data='admin_global_balance')],
+            [InlineKeyboardButton("🔙 Выход", callback_data='main_menu')]
+        ])
+    )
+
+
+@callback_route('admin_users')
+def _cb_admin_users(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    # Show users list with pagination
+    sort_by = context.user_data.get('admin_users_sort', 'id_desc')
+    page = context.user_data.get('admin_users_page', 0)
+    users, nav = sort_users(sort_by, page=page, page_size=8, cursor=context.user_data.get('admin_users_cursor'))
+    page = context.user_data['admin_users_page'] = nav.number
+    context.user_data['admin_users_cursor'] = nav.here
+
+    if not users:
+        q.edit_message_text("👥 Пользователи не найдены",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_menu')]]))
+        return
+
+    # Build keyboard with user buttons
+    kb = []
+    for u_id, uname, u_coins, u_refs in users:
+        name = uname if uname else f"ID:{u_id}"
+        kb.append([InlineKeyboardButton(f"👤 {name} | 💰{u_coins} | 👥{u_refs}", callback_data=f'user_info_{u_id}')])
+
+    # Navigation buttons
+    nav_row = []
+    if nav.prev:
+        nav_row.append(InlineKeyboardButton("◀️", callback_data=f'admin_users_prev_{nav.prev}'))
+    nav_row.append(InlineKeyboardButton(f"Стр {page+1}", callback_data='dummy'))
+    if nav.next:
+        nav_row.append(InlineKeyboardButton("▶️", callback_data=f'admin_users_next_{nav.next}'))
+    if len(nav_row) > 1:
+        kb.append(nav_row)
+
+    # Bottom buttons
+    kb.append([
+        InlineKeyboardButton("🔍 Поиск", callback_data='admin_users_search'),
+        InlineKeyboardButton("📊 Сорт.", callback_data='admin_users_sort')
+    ])
+    kb.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_menu')])
+
+    q.edit_message_text(f"👥 Пользователи (стр. {page+1})\n\nНажмите на пользователя для подробностей:",
+        reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_users_prev', 'admin_users_prev_{cursor}')
+def _cb_admin_users_prev(q, uid, d, context, cursor=None):
+    page = context.user_data.get('admin_users_page', 0)
+    if page > 0:
+        context.user_data['admin_users_page'] = page - 1
+    context.user_data['admin_users_cursor'] = cursor
+    q.edit_message_text("Загрузка...", reply_markup=None)
+    # Re-show users
+    d = 'admin_users'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_users_next', 'admin_users_next_{cursor}')
+def _cb_admin_users_next(q, uid, d, context, cursor=None):
+    page = context.user_data.get('admin_users_page', 0)
+    context.user_data['admin_users_page'] = page + 1
+    context.user_data['admin_users_cursor'] = cursor
+    q.edit_message_text("Загрузка...", reply_markup=None)
+    # Re-show users
+    d = 'admin_users'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_users_search')
+def _cb_admin_users_search(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "🔍 Поиск пользователя\n\nВведите ID или username:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_users')]]))
+    context.user_data['state'] = 'admin_user_search'
+
+
+@callback_route('admin_users_sort')
+def _cb_admin_users_sort(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "📊 Сортировка пользователей\n\nВыберите критерий:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("💰 Монеты (убыв)", callback_data='admin_sort_coins_desc'),
+             InlineKeyboardButton("💰 Монеты (возр)", callback_data='admin_sort_coins_asc')],
+            [InlineKeyboardButton("👥 Рефы (убыв)", callback_data='admin_sort_refs_desc'),
+             InlineKeyboardButton("👥 Рефы (возр)", callback_data='admin_sort_refs_asc')],
+            [InlineKeyboardButton("🆔 ID (новые)", callback_data='admin_sort_id_desc'),
+             InlineKeyboardButton("🆔 ID (старые)", callback_data='admin_sort_id_asc')],
+            [InlineKeyboardButton("🚫 Заблокированные", callback_data='admin_sort_blocked'),
+             InlineKeyboardButton("✅ Активные", callback_data='admin_sort_active')],
+            [InlineKeyboardButton("👥 Все", callback_data='admin_sort_all')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='admin_users')]
+        ])
+    )
+
+
+@callback_route('admin_sort_{sort_type}')
+def _cb_admin_sort(q, uid, d, context, sort_type):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    sort_map = {
+        'coins_desc': 'coins', 'coins_asc': 'coins_asc',
+        'refs_desc': 'refs', 'refs_asc': 'refs_asc',
+        'id_desc': 'id', 'id_asc': 'id_asc',
+        'blocked': 'blocked', 'active': 'active', 'all': 'all'
+    }
+    context.user_data['admin_users_sort'] = sort_map.get(sort_type, 'id_desc')
+    context.user_data['admin_users_page'] = 0
+    q.edit_message_text("Загрузка...", reply_markup=None)
+    # Re-show users with new sort
+    d = 'admin_users'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('user_info_{d_suffix}')
+def _cb_user_info(q, uid, d, context, d_suffix):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    # Парсим target_uid и back_to
+
+    # Проверяем разные варианты формата
+    if '_back_logs' in d_suffix:
+        target_uid = int(d_suffix.replace('_back_logs', ''))
+        back_to = 'admin_logs_users'
+    elif '_admin_users' in d_suffix:
+        target_uid = int(d_suffix.replace('_admin_users', ''))
+        back_to = 'admin_users'
+    elif '_admin_logs_users' in d_suffix:
+        target_uid = int(d_suffix.replace('_admin_logs_users', ''))
+        back_to = 'admin_logs_users'
+    elif '_admin_promo_users' in d_suffix:
+        # Формат: user_info_{uid}_admin_promo_users_{code}_{page}
+        parts = d_suffix.split('_')
+        target_uid = int(parts[0])
+        back_to = f'admin_promo_users_{parts[3]}_{parts[4]}' if len(parts) > 4 else 'admin_promos_active'
+    else:
+        # Если нет суффикса, используем значение по умолчанию
+        try:
+            target_uid = int(d_suffix)
+            back_to = 'admin_users'
+        except ValueError:
+            # Если не удалось распарсить как число, попробуем разделить по подчеркиванию
+            parts = d_suffix.split('_')
+            try:
+                target_uid = int(parts[0])
+                back_to = '_'.join(parts[1:]) if len(parts) > 1 else 'admin_users'
+            except (ValueError, IndexError):
+                q.answer("Ошибка формата данных!", show_alert=True); return
+
+    # Сохраняем back_to в контексте для использования в подменю
+    context.user_data['user_info_back_to'] = back_to
+
+    with db_cursor() as c:
+        c.execute('SELECT * FROM users WHERE id=?', (target_uid,))
+        user = c.fetchone()
+        if not user:
+            q.answer("Пользователь не найден!", show_alert=True); return
+
+        # Get referral count
+        c.execute('SELECT COUNT(*) FROM users WHERE referrer_id=?', (target_uid,))
+        ref_count = c.fetchone()[0]
+
+        # Get position in leaderboard
+        c.execute('SELECT COUNT(*) FROM users WHERE coins>?', (user[2],))
+        position = c.fetchone()[0] + 1
+
+        # Get total games played
+        c.execute('SELECT COUNT(*) FROM game_history WHERE uid=?', (target_uid,))
+        total_games = c.fetchone()[0]
+
+        # Get total won/lost
+        c.execute('SELECT SUM(CASE WHEN is_win=1 THEN amount ELSE 0 END), SUM(CASE WHEN is_win=0 THEN amount ELSE 0 END) FROM game_history WHERE uid=?', (target_uid,))
+        won_lost = c.fetchone()
+        total_won = won_lost[0] or 0
+        total_lost = won_lost[1] or 0
+
+        # Get promocodes used
+        c.execute('SELECT code, COUNT(*) as cnt FROM promo_usage WHERE uid=? GROUP BY code', (target_uid,))
+        promos_used = c.fetchall()
+
+        # Check if user is admin
+        c.execute('SELECT id FROM admins WHERE id=?', (target_uid,))
+        is_admin_user = c.fetchone() is not None
+
+        is_blocked = user[14] if len(user) > 14 else 0
+        blocked_text = "🚫 ЗАБЛОКИРОВАН" if is_blocked else "✅ Активен"
+        admin_text = "👨‍💻 АДМИН" if is_admin_user else "👤 Пользователь"
+
+        reg_date = user[11] if len(user) > 11 else "Неизвестно"
+
+    text = (
+        f"👤 {user[1] if user[1] else 'Без имени'}\n"
+        f"🆔 ID: {user[0]}\n"
+        f"💰 Баланс: {format_number(user[2])} монет\n"
+        f"🏆 Место в топе: #{position}\n"
+        f"👥 Рефералов: {ref_count}\n"
+        f"📅 Регистрация: {reg_date[:10] if len(reg_date) > 10 else reg_date}\n"
+        f"🎮 Игр сыграно: {total_games}\n"
+        f"💸 Потрачено: {format_number(total_lost)} монет\n"
+        f"💰 Заработано: {format_number(total_won)} монет\n"
+        f"📊 Статус: {blocked_text}\n"
+        f"{admin_text}\n"
+        f"🎫 Промокодов активировано: {len(promos_used)}"
+    )
+
+    q.edit_message_text(text,
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("💰 Баланс", callback_data=f'user_balance_menu_{target_uid}')],
+            [InlineKeyboardButton("🎮 История игр", callback_data=f'user_game_history_{target_uid}')],
+            [InlineKeyboardButton("🎫 Промокоды", callback_data=f'user_promos_{target_uid}')],
+            [InlineKeyboardButton("👥 Рефералы", callback_data=f'user_refs_{target_uid}')],
+            [InlineKeyboardButton("👨‍💻 Админка", callback_data=f'user_admin_{target_uid}')],
+            [InlineKeyboardButton("🚫 Блок/Разблок", callback_data=f'user_toggle_block_{target_uid}')],
+            [InlineKeyboardButton("📢 Личное сообщение", callback_data=f'user_message_{target_uid}')],
+            [InlineKeyboardButton("⚠️ Откатить пользователя", callback_data=f'user_rollback_confirm_{target_uid}')],
+            [InlineKeyboardButton("🗑️ Удалить пользователя", callback_data=f'user_delete_confirm_{target_uid}')],
+            [InlineKeyboardButton("🔙 Назад", callback_data=back_to)]
+        ])
+    )
+
+
+@callback_route('user_edit_balance_{target_uid:int}')
+def _cb_user_edit_balance(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        f"💰 Изменение баланса пользователя {target_uid}\n\n"
+        f"Выберите действие:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("➕ Добавить", callback_data=f'user_add_balance_{target_uid}')],
+            [InlineKeyboardButton("➖ Вычесть", callback_data=f'user_sub_balance_{target_uid}')],
+            [InlineKeyboardButton("🔄 Установить", callback_data=f'user_set_balance_{target_uid}')],
+            [InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}')]
+        ])
+    )
+
+
+@callback_route('user_add_balance_{target_uid:int}')
+def _cb_user_add_balance(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        f"💰 Добавить монет пользователю {target_uid}\n\nВведите сумму:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}')]]))
+    context.user_data['admin_target_uid'] = target_uid
+    context.user_data['admin_balance_action'] = 'add'
+    context.user_data['state'] = 'admin_balance_amount'
+
+
+@callback_route('user_sub_balance_{target_uid:int}')
+def _cb_user_sub_balance(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        f"💰 Вычесть монет у пользователя {target_uid}\n\nВведите сумму:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}')]]))
+    context.user_data['admin_target_uid'] = target_uid
+    context.user_data['admin_balance_action'] = 'sub'
+    context.user_data['state'] = 'admin_balance_amount'
+
+
+@callback_route('user_set_balance_{target_uid:int}')
+def _cb_user_set_balance(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        f"💰 Установить баланс пользователю {target_uid}\n\nВведите сумму:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}')]]))
+    context.user_data['admin_target_uid'] = target_uid
+    context.user_data['admin_balance_action'] = 'set'
+    context.user_data['state'] = 'admin_balance_amount'
+
+
+@callback_route('user_block_refs_{target_uid:int}')
+def _cb_user_block_refs(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    with db_cursor() as c:
+        c.execute('UPDATE users SET referrer_id=NULL, is_blocked=1 WHERE referrer_id=?', (target_uid,))
+        c.execute('UPDATE users SET total_refs=0 WHERE id=?', (target_uid,))
+    invalidate_user_cache()
+
+    log_admin_action(uid, 'block_refs', 'user', target_uid)
+    q.answer("Рефералы обнулены и заблокированы!", show_alert=True)
+
+
+@callback_route('user_reset_refs_{target_uid:int}')
+def _cb_user_reset_refs(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    with db_cursor() as c:
+        c.execute('UPDATE users SET referrer_id=NULL WHERE referrer_id=?', (target_uid,))
+        c.execute('UPDATE users SET total_refs=0 WHERE id=?', (target_uid,))
+    invalidate_user_cache()
+
+    log_admin_action(uid, 'reset_refs', 'user', target_uid)
+    q.answer("Рефералы обнулены!", show_alert=True)
+
+
+@callback_route('user_block_{target_uid:int}')
+def _cb_user_block(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    block_user(target_uid)
+    log_admin_action(uid, 'block', 'user', target_uid)
+    q.answer("Пользователь заблокирован!", show_alert=True)
+
+
+@callback_route('user_unblock_{target_uid:int}')
+def _cb_user_unblock(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    unblock_user(target_uid)
+    log_admin_action(uid, 'unblock', 'user', target_uid)
+    q.answer("Пользователь разблокирован!", show_alert=True)
+
+
+@callback_route('user_message_text_{target_uid:int}')
+def _cb_user_message_text(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        f"📝 Текстовое сообщение пользователю {target_uid}\n\nВведите текст сообщения:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}')]]))
+    context.user_data['admin_target_uid'] = target_uid
+    context.user_data['state'] = 'admin_user_message'
+
+
+@callback_route('user_message_photo_{target_uid:int}')
+def _cb_user_message_photo(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        f"🖼️ Фото пользователю {target_uid}\n\nОтправьте фото с подписью (или просто фото):",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}')]]))
+    context.user_data['admin_target_uid'] = target_uid
+    context.user_data['state'] = 'admin_user_message'
+
+
+@callback_route('user_message_{target_uid:int}')
+def _cb_user_message(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        f"📢 Личное сообщение пользователю {target_uid}\n\nВыберите тип сообщения:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📝 Текстовое", callback_data=f'user_message_text_{target_uid}')],
+            [InlineKeyboardButton("🖼️ Фото", callback_data=f'user_message_photo_{target_uid}')],
+            [InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}')]
+        ]))
+
+
+@callback_route('user_balance_menu_{target_uid:int}')
+def _cb_user_balance_menu(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    row = get_user(target_uid)
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+    q.edit_message_text(
+        f"💰 Управление балансом пользователя {target_uid}\n\nТекущий баланс: {format_number(row.coins)} монет",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("➕ Добавить", callback_data=f'user_add_balance_{target_uid}')],
+            [InlineKeyboardButton("➖ Вычесть", callback_data=f'user_sub_balance_{target_uid}')],
+            [InlineKeyboardButton("🔄 Установить", callback_data=f'user_set_balance_{target_uid}')],
+            [InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}_{back_to}')]
+        ])
+    )
+
+
+@callback_route('user_game_history_*')
+def _cb_user_game_history(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    # Обработка фильтров
+    if d.startswith('user_game_history_filter_'):
+        filter_type = d.replace('user_game_history_filter_', '')
+        if filter_type == 'all':
+            context.user_data['user_game_history_rolled'] = None
+        elif filter_type == 'active':
+            context.user_data['user_game_history_rolled'] = False
+        elif filter_type == 'rolled':
+            context.user_data['user_game_history_rolled'] = True
+        # Сбрасываем страницу при смене фильтра
+        context.user_data['user_game_history_page'] = 0
+        # Получаем target_uid из контекста
+        target_uid = context.user_data.get('user_game_history_uid')
+        if not target_uid:
+            q.answer("Ошибка: пользователь не выбран", show_alert=True); return
+        page, cursor = 0, None
+    else:
+        # Правильный парсинг: user_game_history_{uid}_{page}_{cursor}
+        parts = d[len('user_game_history_'):].split('_')
+        if len(parts) < 1:
+            q.answer("Ошибка!", show_alert=True); return
+        target_uid = int(parts[0])
+        page = int(parts[1]) if len(parts) > 1 else 0
+        cursor = parts[2] if len(parts) > 2 else None
+        # Сохраняем uid в контексте
+        context.user_data['user_game_history_uid'] = target_uid
+
+    # Получаем фильтр из контекста
+    rolled_back = context.user_data.get('user_game_history_rolled', None)
+    rolled_back_text = {
+        None: "Все",
+        False: "Неоткатанные",
+        True: "Откатанные"
+    }[rolled_back]
+
+    rows, total, page_nav = get_history_paged(target_uid, page, rolled_back=rolled_back, cursor=cursor)
+    page = page_nav.number
+    back = f'{page}_{page_nav.here}'
+    pages = (total + 19) // 20 or 1
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    if not rows:
+        text = f"📜 История игр пользователя {target_uid} ({rolled_back_text}) пуста"
+        kb = [
+            [InlineKeyboardButton("🔄 Все", callback_data='user_game_history_filter_all'),
+             InlineKeyboardButton("✅ Неоткатанные", callback_data='user_game_history_filter_active'),
+             InlineKeyboardButton("↩️ Откатанные", callback_data='user_game_history_filter_rolled')],
+            [InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}_{back_to}')]
+        ]
+    else:
+        text = f"📜 История игр пользователя {target_uid} ({rolled_back_text})\n━━━━━━━━━━━━━━━━\nСтраница {page+1} из {pages} | Всего: {total}\n\nНажмите на игру для деталей:"
+        kb = []
+        for gid, gname, amount, is_win, is_rolled_back, created_at in rows:
+            g_emoji = GAME_EMOJIS.get(gname, '🎮')
+            res_emoji = "✅" if is_win else "❌"
+            sign = "+" if is_win else "-"
+            rollback_marker = " ↩️" if is_game_rolled_back(is_rolled_back) else ""
+            amount_str = format_number(amount)
+            kb.append([InlineKeyboardButton(
+                f"{res_emoji} {g_emoji} {gname}: {sign}{amount_str}{rollback_marker}",
+                callback_data=f'admin_gameview_{gid}_{target_uid}_{back}'
+            )])
+
+        # Фильтры
+        kb.append([
+            InlineKeyboardButton("🔄 Все", callback_data='user_game_history_filter_all'),
+            InlineKeyboardButton("✅ Неоткатанные", callback_data='user_game_history_filter_active'),
+            InlineKeyboardButton("↩️ Откатанные", callback_data='user_game_history_filter_rolled')
+        ])
+
+        nav = []
+        if page_nav.prev:
+            nav.append(InlineKeyboardButton("◀️", callback_data=f'user_game_history_{target_uid}_{page-1}_{page_nav.prev}'))
+        nav.append(InlineKeyboardButton(f"{page+1}/{pages}", callback_data='dummy'))
+        if page_nav.next:
+            nav.append(InlineKeyboardButton("▶️", callback_data=f'user_game_history_{target_uid}_{page+1}_{page_nav.next}'))
+        if len(nav) > 1:
+            kb.append(nav)
+
+        kb.append([InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}_{back_to}')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_gameview_{gid:int}_{target_uid:int}_{back}')
+def _cb_admin_gameview(q, uid, d, context, gid, target_uid, back):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    g = get_game_info(gid)
+    if not g:
+        q.answer("Игра не найдена", show_alert=True); return
+
+    gname, details, amount, is_win, is_rolled_back, created_at = g
+    msg = format_game_detail(gname, details, amount, is_win, created_at, is_rolled_back)
+
+    # Кнопки в зависимости от статуса отката (is_rolled_back == 1 означает откатан)
+    if is_game_rolled_back(is_rolled_back):
+        kb = [
+            [InlineKeyboardButton("↩️ Отменить откат", callback_data=f'user_rollback_game_{gid}_{target_uid}_{back}')],
+            [InlineKeyboardButton("🔙 Назад к списку", callback_data=f'user_game_history_{target_uid}_{back}')]
+        ]
+    else:
+        kb = [
+            [InlineKeyboardButton("↩️ Откатить игру", callback_data=f'user_rollback_game_{gid}_{target_uid}_{back}')],
+            [InlineKeyboardButton("🔙 Назад к списку", callback_data=f'user_game_history_{target_uid}_{back}')]
+        ]
+
+    q.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('user_rollback_game_{gid:int}_{target_uid:int}_{back}')
+def _cb_user_rollback_game(q, uid, d, context, gid, target_uid, back):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    success, message = rollback_game(gid)
+
+    if success:
+        log_admin_action(uid, 'rollback_game', 'game', gid, f'User: {target_uid}, {message}')
+
+        # Заново получаем актуальный статус игры
+        g = get_game_info(gid)
+        if g:
+            gname, details, amount, is_win, is_rolled_back, created_at = g
+            is_rolled = is_game_rolled_back(is_rolled_back)
+
+            msg = format_game_detail(gname, details, amount, is_win, created_at, is_rolled_back)
+
+            # Кнопки в зависимости от актуального статуса
+            if is_rolled:
+                kb = [
+                    [InlineKeyboardButton("↩️ Отменить откат", callback_data=f'user_rollback_game_{gid}_{target_uid}_{back}')],
+                    [InlineKeyboardButton("🔙 Назад к списку", callback_data=f'user_game_history_{target_uid}_{back}')]
+                ]
+            else:
+                kb = [
+                    [InlineKeyboardButton("↩️ Откатить игру", callback_data=f'user_rollback_game_{gid}_{target_uid}_{back}')],
+                    [InlineKeyboardButton("🔙 Назад к списку", callback_data=f'user_game_history_{target_uid}_{back}')]
+                ]
+
+            q.edit_message_text(f"✅ {message}\n\n{msg}", reply_markup=InlineKeyboardMarkup(kb))
+        else:
+            q.edit_message_text(
+                f"✅ {message}\n\nИгра успешно откачена!",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=f'user_game_history_{target_uid}_{back}')]])
+            )
+    else:
+        q.answer(message, show_alert=True)
+
+
+@callback_route('user_promos_{target_uid:int}')
+def _cb_user_promos(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    with db_cursor() as c:
+        c.execute('SELECT id, code, used_at FROM promo_usage WHERE uid=? ORDER BY used_at DESC', (target_uid,))
+        promos = c.fetchall()
+
+    if not promos:
+        text = f"🎫 Промокоды пользователя {target_uid}\n\nПользователь не активировал ни одного промокода"
+        kb = [[InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}_{back_to}')]]
+    else:
+        text = f"🎫 Промокоды пользователя {target_uid}\n\nНажмите на промокод для отката:"
+        kb = []
+        for pu_id, code, used_at in promos:
+            kb.append([InlineKeyboardButton(
+                f"🎫 {code} | {used_at[:16] if len(used_at) > 16 else used_at}",
+                callback_data=f'user_promo_rollback_{pu_id}_{target_uid}'
+            )])
+        kb.append([InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}_{back_to}')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('user_promo_rollback_{pu_id:int}_{target_uid:int}')
+def _cb_user_promo_rollback(q, uid, d, context, pu_id, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    success, message = rollback_promo_usage(pu_id)
+
+    if success:
+        log_admin_action(uid, 'rollback_promo', 'promo_usage', pu_id, f'User: {target_uid}')
+        q.edit_message_text(
+            f"✅ {message}\n\nПромокод успешно откачен!",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=f'user_promos_{target_uid}')]])
+        )
+    else:
+        q.answer(message, show_alert=True)
+
+
+@callback_route('user_refs_{target_uid:int}')
+def _cb_user_refs(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    with db_cursor() as c:
+        c.execute('SELECT id, username, coins FROM users WHERE referrer_id=? LIMIT 10', (target_uid,))
+        refs = c.fetchall()
+
+    if not refs:
+        text = f"👥 Рефералы пользователя {target_uid}\n\nНет рефералов"
+    else:
+        text = f"👥 Рефералы пользователя {target_uid} (первые 10)\n\n"
+        for ref_id, ref_name, ref_coins in refs:
+            name = ref_name if ref_name else f"ID:{ref_id}"
+            text += f"👤 {name} | 💰{format_number(ref_coins)}\n"
+
+    q.edit_message_text(text,
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🗑️ Обнулить рефералов", callback_data=f'user_reset_refs_{target_uid}')],
+            [InlineKeyboardButton("🚫 Обнулить и заблокировать всех", callback_data=f'user_block_refs_{target_uid}')],
+            [InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}_{back_to}')]
+        ])
+    )
+
+
+@callback_route('user_admin_{target_uid:int}')
+def _cb_user_admin(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    with db_cursor() as c:
+        c.execute('SELECT id FROM admins WHERE id=?', (target_uid,))
+        is_admin_user = c.fetchone() is not None
+
+    if is_admin_user:
+        q.edit_message_text(
+            f"👨‍💻 Управление админкой пользователя {target_uid}\n\nСтатус: 👨‍💻 АДМИН",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("❌ Снять админку", callback_data=f'user_remove_admin_{target_uid}')],
+                [InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}_{back_to}')]
+            ])
+        )
+    else:
+        q.edit_message_text(
+            f"👨‍💻 Управление админкой пользователя {target_uid}\n\nСтатус: 👤 Пользователь",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("✅ Дать админку", callback_data=f'user_give_admin_{target_uid}')],
+                [InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}_{back_to}')]
+            ])
+        )
+
+
+@callback_route('user_give_admin_{target_uid:int}')
+def _cb_user_give_admin(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    if add_admin(target_uid, uid):
+        log_admin_action(uid, 'give_admin', 'user', target_uid)
+        q.answer("Админка выдана!", show_alert=True)
+        # Refresh user info page
+        d = f'user_info_{target_uid}_{back_to}'
+        dispatch_callback(q, uid, d, context)
+    else:
+        q.answer("Ошибка при выдаче админки!", show_alert=True)
+
+
+@callback_route('user_remove_admin_{target_uid:int}')
+def _cb_user_remove_admin(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    # Prevent removing yourself
+    if target_uid == uid:
+        q.answer("Вы не можете снять себе админку!", show_alert=True); return
+
+    remove_admin(target_uid)
+    log_admin_action(uid, 'remove_admin', 'user', target_uid)
+    q.answer("Админка снята!", show_alert=True)
+    # Refresh user info page
+    d = f'user_info_{target_uid}_{back_to}'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('user_toggle_block_{target_uid:int}')
+def _cb_user_toggle_block(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    row = get_user(target_uid)
+    is_blocked = row.is_blocked
+
+    if is_blocked:
+        unblock_user(target_uid)
+        log_admin_action(uid, 'unblock', 'user', target_uid)
+        q.answer("Пользователь разблокирован!", show_alert=True)
+    else:
+        block_user(target_uid)
+        log_admin_action(uid, 'block', 'user', target_uid)
+        q.answer("Пользователь заблокирован!", show_alert=True)
+
+    # Refresh user info page
+    d = f'user_info_{target_uid}_{back_to}'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('user_rollback_confirm_{target_uid:int}')
+def _cb_user_rollback_confirm(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    # Prevent rolling back yourself
+    if target_uid == uid:
+        q.answer("Вы не можете откатить себя!", show_alert=True); return
+
+    q.edit_message_text(
+        f"⚠️ ПОДТВЕРЖДЕНИЕ ОТКАТА\n\n"
+        f"Вы собираетесь полностью откатить пользователя {target_uid}!\n\n"
+        f"Это действие:\n"
+        f"• Удалит всю историю игр пользователя\n"
+        f"• Удалит все активированные промокоды\n"
+        f"• Удалит все логи действий админа с этим пользователем\n"
+        f"• Сбросит баланс на 500 монет\n"
+        f"• Сбросит статистику пользователя\n\n"
+        f"⚠️ ЭТО ДЕЙСТВИЕ НЕОБРАТИМО!\n\n"
+        f"Вы уверены?",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ Да, откатить", callback_data=f'user_rollback_do_{target_uid}')],
+            [InlineKeyboardButton("❌ Отмена", callback_data=f'user_info_{target_uid}_{back_to}')]
+        ])
+    )
+
+
+@callback_route('user_rollback_do_{target_uid:int}')
+def _cb_user_rollback_do(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    # Prevent rolling back yourself
+    if target_uid == uid:
+        q.answer("Вы не можете откатить себя!", show_alert=True); return
+
+    success, message = rollback_user_completely(target_uid)
+
+    if success:
+        log_admin_action(uid, 'rollback_user', 'user', target_uid, message)
+        q.edit_message_text(
+            f"✅ {message}\n\nПользователь откачен успешно!",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=f'user_info_{target_uid}_{back_to}')]])
+        )
+    else:
+        q.answer(message, show_alert=True)
+
+
+@callback_route('user_delete_confirm_{target_uid:int}')
+def _cb_user_delete_confirm(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    # Prevent deleting yourself
+    if target_uid == uid:
+        q.answer("Вы не можете удалить себя!", show_alert=True); return
+
+    q.edit_message_text(
+        f"⚠️ ПОДТВЕРЖДЕНИЕ УДАЛЕНИЯ\n\n"
+        f"Вы собираетесь полностью удалить пользователя {target_uid}!\n\n"
+        f"Это действие:\n"
+        f"• Удалит пользователя из базы данных\n"
+        f"• Удалит всю историю игр пользователя\n"
+        f"• Удалит все активированные промокоды\n"
+        f"• Удалит все логи действий админа с этим пользователем\n"
+        f"• Удалит пользователя из реферальной системы\n"
+        f"• Снимет админку если она была\n\n"
+        f"⚠️ ЭТО ДЕЙСТВИЕ НЕОБРАТИМО!\n\n"
+        f"Вы уверены?",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ Да, удалить", callback_data=f'user_delete_do_{target_uid}')],
+            [InlineKeyboardButton("❌ Отмена", callback_data=f'user_info_{target_uid}_{back_to}')]
+        ])
+    )
+
+
+@callback_route('user_delete_do_{target_uid:int}')
+def _cb_user_delete_do(q, uid, d, context, target_uid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    back_to = context.user_data.get('user_info_back_to', 'admin_users')
+
+    # Prevent deleting yourself
+    if target_uid == uid:
+        q.answer("Вы не можете удалить себя!", show_alert=True); return
+
+    success, message = delete_user_completely(target_uid)
+
+    if success:
+        log_admin_action(uid, 'delete_user', 'user', target_uid, message)
+        q.edit_message_text(
+            f"✅ {message}\n\nПользователь удалён полностью!",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=back_to)]])
+        )
+    else:
+        q.answer(message, show_alert=True)
+
+
+@callback_route('admin_broadcasts')
+def _cb_admin_broadcasts(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "📢 Рассылки\n\nВыберите действие:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📝 Текстовая рассылка", callback_data='admin_broadcast_text')],
+            [InlineKeyboardButton("🖼️ Рассылка с фото", callback_data='admin_broadcast_photo')],
+            [InlineKeyboardButton("⏰ Запланировать рассылку", callback_data='admin_broadcast_schedule')],
+            [InlineKeyboardButton("📋 История рассылок", callback_data='admin_broadcast_history')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='admin_menu')]
+        ])
+    )
+
+
+@callback_route('admin_broadcast_text')
+def _cb_admin_broadcast_text(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "📝 Текстовая рассылка\n\nВведите текст сообщения:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_broadcasts')]]))
+    context.user_data['state'] = 'admin_broadcast_text'
+
+
+@callback_route('admin_broadcast_photo')
+def _cb_admin_broadcast_photo(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "🖼️ Рассылка с фото\n\nОтправьте фото с подписью (или просто текст подписи):",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_broadcasts')]]))
+    context.user_data['state'] = 'admin_broadcast_photo'
+
+
+@callback_route('admin_broadcast_schedule')
+def _cb_admin_broadcast_schedule(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "⏰ Запланированная рассылка\n\n"
+        "Первая строка — время ДД.ММ.ГГГГ ЧЧ:ММ и, по желанию, повтор в часах.\n"
+        "Дальше — текст сообщения.\n\n"
+        "Пример:\n31.12.2025 18:00 24\nС наступающим!",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_broadcasts')]]))
+    context.user_data['state'] = 'admin_broadcast_schedule'
+
+
+@callback_route('admin_broadcast_cancel_{broadcast_id:int}')
+def _cb_admin_broadcast_cancel(q, uid, d, context, broadcast_id):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    if cancel_broadcast(broadcast_id):
+        log_admin_action(uid, 'cancel_broadcast', 'all', 0, f'ID: {broadcast_id}')
+        q.answer(f"Рассылка #{broadcast_id} отменена")
+    else:
+        q.answer("Рассылка уже завершена", show_alert=True)
+    dispatch_callback(q, uid, 'admin_broadcast_history', context)
+
+
+@callback_route('admin_broadcast_history')
+def _cb_admin_broadcast_history(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    broadcasts = get_broadcasts()
+
+    if not broadcasts:
+        q.edit_message_text("📋 История рассылок пуста",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_broadcasts')]]))
+        return
+
+    text = "📋 История рассылок\n\n"
+    keyboard = []
+    for i, b in enumerate(broadcasts[:5]):
+        b_id, msg_type, content, file_id, scheduled_at, sent_at, status, created_by, created_at, repeat_every = b
+        status_emoji = {'sent': "✅", 'sending': "📤", 'scheduled': "⏰", 'cancelled': "🚫"}.get(status, "⏳")
+        text += f"{status_emoji} #{b_id}: {msg_type}\n"
+        if status == 'sending':
+            p = get_broadcast_progress(b_id)
+            text += f"   Отправляется: {p['total'] - p['pending']} из {p['total']}\n"
+        elif sent_at:
+            text += f"   Отправлено: {sent_at}\n"
+        elif scheduled_at:
+            text += f"   Запланировано: {scheduled_at}\n"
+            if repeat_every:
+                text += f"   🔁 Каждые {repeat_every // 3600} ч\n"
+        if status in ('scheduled', 'sending'):
+            keyboard.append([InlineKeyboardButton(f"🚫 Отменить #{b_id}", callback_data=f'admin_broadcast_cancel_{b_id}')])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_broadcasts')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+@callback_route('admin_promos')
+def _cb_admin_promos(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "🎫 Управление промокодами\n\nВыберите действие:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ Активные", callback_data='admin_promos_active')],
+            [InlineKeyboardButton("📅 Истекшие", callback_data='admin_promos_expired')],
+            [InlineKeyboardButton("➕ Создать промокод", callback_data='admin_promo_create')],
+            [InlineKeyboardButton("🗑️ Очистить все промокоды", callback_data='admin_promos_clear_confirm')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='admin_menu')]
+        ])
+    )
+
+
+@callback_route('admin_promos_clear_confirm')
+def _cb_admin_promos_clear_confirm(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "⚠️ ПОДТВЕРЖДЕНИЕ ОЧИСТКИ\n\n"
+        "Вы собираетесь удалить ВСЕ промокоды и их историю использования!\n\n"
+        "⚠️ ЭТО ДЕЙСТВИЕ НЕОБРАТИМО!\n\n"
+        "Вы уверены?",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ Да, удалить все", callback_data='admin_promos_clear_do')],
+            [InlineKeyboardButton("❌ Отмена", callback_data='admin_promos')]
+        ])
+    )
+
+
+@callback_route('admin_promos_clear_do')
+def _cb_admin_promos_clear_do(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    clear_all_promocodes()
+    log_admin_action(uid, 'clear_all_promos', 'all', 0, 'All promocodes deleted')
+    q.edit_message_text(
+        "✅ Все промокоды удалены!\n\nВключая историю использования.",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_promos')]])
+    )
+
+
+@callback_route('admin_promos_active')
+def _cb_admin_promos_active(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    with db_cursor() as c:
+        # Активные промокоды: не удалены И (нет лимита ИЛИ лимит еще не достигнут)
+        c.execute('''SELECT * FROM promocodes 
+                     WHERE deleted=0 AND (max_uses IS NULL OR uses < max_uses) 
+                     ORDER BY created_at DESC''')
+        promos = c.fetchall()
+
+    if not promos:
+        q.edit_message_text("🎫 Активных промокодов нет",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("➕ Создать промокод", callback_data='admin_promo_create')],
+                [InlineKeyboardButton("🔙 Назад", callback_data='admin_promos')]
+            ]))
+        return
+
+    text = "🎫 Активные промокоды\n\n"
+    kb = []
+    for p in promos:
+        p_id, code, reward, max_uses, uses, max_per_user, created_by, deleted = p
+        uses_info = f"{uses}/{max_uses}" if max_uses else f"{uses}/∞"
+        kb.append([InlineKeyboardButton(f"✅ {code}: +{reward} ({uses_info})", callback_data=f'admin_promo_detail_{code}')])
+
+    kb.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_promos')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_promos_expired')
+def _cb_admin_promos_expired(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    with db_cursor() as c:
+        # Истекшие промокоды: удалены ИЛИ лимит достигнут
+        c.execute('''SELECT * FROM promocodes 
+                     WHERE deleted=1 OR (max_uses IS NOT NULL AND uses >= max_uses) 
+                     ORDER BY created_at DESC''')
+        promos = c.fetchall()
+
+    if not promos:
+        q.edit_message_text("🎫 Истекших промокодов нет",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_promos')]]))
+        return
+
+    text = "🎫 Истекшие промокоды\n\n"
+    kb = []
+    for p in promos:
+        p_id, code, reward, max_uses, uses, max_per_user, created_by, deleted = p
+        uses_info = f"{uses}/{max_uses}" if max_uses else f"{uses}/∞"
+        expired_reason = "Удален" if deleted else "Лимит исчерпан"
+        kb.append([InlineKeyboardButton(f"❌ {code}: +{reward} ({uses_info}) [{expired_reason}]", callback_data=f'admin_promo_detail_{code}')])
+
+    kb.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_promos')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_promo_detail_*')
+def _cb_admin_promo_detail(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    # Используем более безопасный способ извлечения кода
+    prefix = 'admin_promo_detail_'
+    if d == prefix:
+        q.answer("Неверный формат!", show_alert=True); return
+    code = d[len(prefix):]
+
+    if not code:
+        q.answer("Код промокода пуст!", show_alert=True); return
+
+    with db_cursor() as c:
+        c.execute('SELECT * FROM promocodes WHERE code=?', (code,))
+        promo = c.fetchone()
+        if not promo:
+            # Выводим более подробную информацию для отладки
+            # Показываем все промокоды для диагностики
+            c.execute('SELECT code, reward, uses, max_uses, deleted FROM promocodes ORDER BY created_at DESC LIMIT 10')
+            all_promos = c.fetchall()
+            debug_info = "Список промокодов в БД:\n"
+            for p in all_promos:
+                debug_info += f"- {p[0]}: +{p[1]} ({p[2]}/{p[3] or '∞'}) [{'активен' if p[4]==0 else 'удалён'}]\n"
+            q.answer(f"Промокод '{code}' не найден!\n\n{debug_info[:200]}", show_alert=True); return
+
+        # Распаковка в правильном порядке: code, reward, uses, max_uses, max_per_user, deleted, created_by, created_at
+        p_code, reward, uses, max_uses, max_per_user, deleted, created_by, created_at = promo
+
+        # Считаем количество уникальных пользователей
+        c.execute('SELECT COUNT(DISTINCT uid) FROM promo_usage WHERE code=?', (code,))
+        unique_users = c.fetchone()[0]
+
+    uses_info = f"{uses}/{max_uses}" if max_uses else f"{uses}/∞"
+    status = "🚫 Истек/Удален" if deleted else "✅ Активен"
+
+    text = (
+        f"🎫 Промокод: {code}\n"
+        f"💰 Награда: {reward} монет\n"
+        f"📊 Использований: {uses_info}\n"
+        f"👥 Активировали: {unique_users} чел.\n"
+        f"👤 На пользователя: {max_per_user} раз\n"
+        f"📅 Статус: {status}\n"
+    )
+
+    # Кнопки управления
+    kb = [
+        [InlineKeyboardButton("👥 Кто активировал", callback_data=f'admin_promo_users_{code}_1')],
+        [InlineKeyboardButton("✏️ Изменить промо", callback_data=f'admin_promo_edit_{code}')],
+        [InlineKeyboardButton("🗑️ Удалить промокод", callback_data=f'admin_promo_delete_confirm_{code}')],
+        [InlineKeyboardButton("🔙 Назад", callback_data='admin_promos_active' if deleted == 0 else 'admin_promos_expired')]
+    ]
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_promo_users_{code}_{page:int}', 'admin_promo_users_{code}')
+def _cb_admin_promo_users(q, uid, d, context, code, page=1):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    with db_cursor() as c:
+        # Получаем список пользователей, активировавших промокод
+        c.execute('''SELECT pu.uid, u.username, COUNT(*) as cnt, MAX(pu.used_at) as last_use 
+                     FROM promo_usage pu 
+                     LEFT JOIN users u ON pu.uid=u.id 
+                     WHERE pu.code=? 
+                     GROUP BY pu.uid 
+                     ORDER BY last_use DESC''', (code,))
+        all_users = c.fetchall()
+
+    if not all_users:
+        q.edit_message_text(
+            f"🎫 Промокод: {code}\n\nНикто ещё не активировал этот промокод.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔙 Назад", callback_data=f'admin_promo_detail_{code}')]
+            ])
+        )
+        return
+
+    # Пагинация (5 пользователей на страницу)
+    per_page = 5
+    total = len(all_users)
+    total_pages = (total + per_page - 1) // per_page
+    start = (page - 1) * per_page
+    end = start + per_page
+    users_page = all_users[start:end]
+
+    text = f"🎫 Промокод: {code}\n👥 Активировали ({total} чел.):\n\n"
+
+    kb = []
+    for u_id, username, cnt, last_use in users_page:
+        name = username if username else f"ID:{u_id}"
+        last_use_str = last_use[:16] if last_use else "?"
+        text += f"• {name}: {cnt} раз ({last_use_str})\n"
+        kb.append([InlineKeyboardButton(f"👤 {name} ({cnt}x)", callback_data=f'user_info_{u_id}_admin_promo_users_{code}_{page}')])
+
+    # Навигация
+    nav = []
+    if page > 1:
+        nav.append(InlineKeyboardButton("◀️", callback_data=f'admin_promo_users_{code}_{page-1}'))
+    nav.append(InlineKeyboardButton(f"{page}/{total_pages}", callback_data='dummy'))
+    if page < total_pages:
+        nav.append(InlineKeyboardButton("▶️", callback_data=f'admin_promo_users_{code}_{page+1}'))
+    if len(nav) > 1:
+        kb.append(nav)
+
+    kb.append([InlineKeyboardButton("🔙 Назад", callback_data=f'admin_promo_detail_{code}')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_promo_edit_{code}')
+def _cb_admin_promo_edit(q, uid, d, context, code):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    with db_cursor() as c:
+        c.execute('SELECT reward, max_uses, max_per_user FROM promocodes WHERE code=?', (code,))
+        promo = c.fetchone()
+
+    if not promo:
+        q.answer("Промокод не найден!", show_alert=True); return
+
+    reward, max_uses, max_per_user = promo
+    max_uses_str = str(max_uses) if max_uses else "∞"
+
+    text = (
+        f"✏️ Редактирование промокода: {code}\n\n"
+        f"Текущие значения:\n"
+        f"💰 Награда: {reward}\n"
+        f"📊 Макс. использований: {max_uses_str}\n"
+        f"👤 Макс. на пользователя: {max_per_user}\n\n"
+        f"Формат: НАГРАДА [МАКС_ИСПОЛЬЗОВАНИЙ] [МАКС_НА_ПОЛЬЗОВАТЕЛЯ]\n"
+        f"Пример: 1000 50 2\n"
+        f"Для ∞ использований введите 0"
+    )
+
+    context.user_data['admin_promo_edit_code'] = code
+    context.user_data['state'] = 'admin_promo_edit'
+
+    q.edit_message_text(text,
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔙 Отмена", callback_data=f'admin_promo_detail_{code}')]
+        ]))
+
+
+@callback_route('admin_promo_delete_confirm_{code}')
+def _cb_admin_promo_delete_confirm(q, uid, d, context, code):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    q.edit_message_text(
+        f"⚠️ Подтверждение удаления\n\n"
+        f"🎫 Промокод: {code}\n\n"
+        f"Вы уверены, что хотите удалить этот промокод?\n"
+        f"Это действие нельзя отменить!",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ Да, удалить", callback_data=f'admin_promo_delete_{code}')],
+            [InlineKeyboardButton("❌ Отмена", callback_data=f'admin_promo_detail_{code}')]
+        ])
+    )
+
+
+@callback_route('admin_promo_delete_{code}')
+def _cb_admin_promo_delete(q, uid, d, context, code):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    # Delete promocode completely
+    delete_promocode(code)
+    log_admin_action(uid, 'delete_promo', 'promocode', code)
+
+    # Return to promos menu
+    q.edit_message_text(
+        "🎫 Управление промокодами\n\nВыберите действие:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ Активные", callback_data='admin_promos_active')],
+            [InlineKeyboardButton("📅 Истекшие", callback_data='admin_promos_expired')],
+            [InlineKeyboardButton("➕ Создать промокод", callback_data='admin_promo_create')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='admin_menu')]
+        ])
+    )
+
+
+@callback_route('admin_promo_create')
+def _cb_admin_promo_create(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "🎫 Создание промокода\n\nФормат: КОД НАГРАДА [МАКС_ИСПОЛЬЗОВАНИЙ] [МАКС_НА_ПОЛЬЗОВАТЕЛЯ]\n\n"
+        "Пример: BONUS2025 500 100 1\n"
+        "Это создаст промокод BONUS2025 на 500 монет, максимум 100 использований, 1 на пользователя.",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_promos')]]))
+    context.user_data['state'] = 'admin_promo_create'
+
+
+@callback_route('admin_admins')
+def _cb_admin_admins(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    with db_cursor() as c:
+        c.execute('''SELECT a.id, a.added_by, a.added_at, u.username FROM admins a
+                     LEFT JOIN users u ON a.id = u.id ORDER BY a.id''')
+        admins = c.fetchall()
+
+    text = "👨‍💻 Админы бота\n\n"
+
+    if not admins:
+        text += "Админов нет"
+        kb = [[InlineKeyboardButton("➕ Добавить админа", callback_data='admin_add_admin')]]
+    else:
+        kb = []
+        for a_id, added_by, added_at, a_uname in admins:
+            name = a_uname if a_uname else f"ID:{a_id}"
+            kb.append([InlineKeyboardButton(f"👤 {name} (ID: {a_id})", callback_data=f'user_info_{a_id}')])
+        kb.append([InlineKeyboardButton("➕ Добавить админа", callback_data='admin_add_admin')])
+
+    kb.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_menu')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_add_admin')
+def _cb_admin_add_admin(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "➕ Добавление админа\n\nВведите ID или username пользователя:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_admins')]]))
+    context.user_data['state'] = 'admin_add_admin'
+
+
+@callback_route('admin_logs')
+def _cb_admin_logs(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "📜 Логи действий\n\nВыберите тип логов:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("👤 Пользовательские", callback_data='admin_logs_users')],
+            [InlineKeyboardButton("👨‍💻 Админские", callback_data='admin_logs_admin')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='admin_menu')]
+        ])
+    )
+
+
+@callback_route('admin_logs_users', 'admin_logs_users_show_all', 'admin_logs_users_paged')
+def _cb_admin_logs_users(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    # Determine filter: None (all), False (not rolled back), True (rolled back)
+    rolled_back = context.user_data.get('admin_logs_users_filter', None)
+    rolled_back_text = {
+        None: "Все",
+        False: "Неоткатанные",
+        True: "Откатанные"
+    }[rolled_back]
+
+    # Режим показа: постраничный или всё
+    show_all = context.user_data.get('admin_logs_users_show_all', False)
+
+    # Обрабатываем переключение режима
+    if d == 'admin_logs_users_show_all':
+        show_all = True
+        context.user_data['admin_logs_users_show_all'] = True
+    elif d == 'admin_logs_users_paged':
+        show_all = False
+        context.user_data['admin_logs_users_show_all'] = False
+        context.user_data['admin_logs_users_page'] = 0
+
+    page = context.user_data.get('admin_logs_users_page', 0)
+
+    # Лимит: 50 для "показать всё", 10 для постраничного
+    if show_all:
+        logs, total, page_nav = get_game_feed(0, 50, rolled_back)
+    else:
+        logs, total, page_nav = get_game_feed(page, 10, rolled_back, context.user_data.get('admin_logs_users_cursor'))
+        page = context.user_data['admin_logs_users_page'] = page_nav.number
+        context.user_data['admin_logs_users_cursor'] = page_nav.here
+
+    # Get usernames for all users in logs
+    usernames = resolve_usernames(log[1] for log in logs)
+
+    if not logs:
+        q.edit_message_text(f"📜 Пользовательские логи ({rolled_back_text}) пусты",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔄 Все", callback_data='admin_logs_users_filter_all'),
+                 InlineKeyboardButton("✅ Неоткатанные", callback_data='admin_logs_users_filter_active'),
+                 InlineKeyboardButton("↩️ Откатанные", callback_data='admin_logs_users_filter_rolled')],
+                [InlineKeyboardButton("🔙 Назад", callback_data='admin_logs')]
+            ]))
+        return
+
+    pages = (total + 9) // 10 or 1
+
+    if show_all:
+        text = f"📜 Пользовательские логи ({rolled_back_text}) — ВСЁ\n━━━━━━━━━━━━━━━━\nПоказано: {len(logs)} из {total}\n\n"
+        for log in logs:
+            gid, g_uid, gname, details, amount, is_win, is_rolled_back, created_at = log
+            g_emoji = GAME_EMOJIS.get(gname, '🎮')
+            res_emoji = "✅" if is_win else "❌"
+            rolled_emoji = "↩️" if is_game_rolled_back(is_rolled_back) else ""
+            sign = "+" if is_win else "-"
+            uname = usernames.get(g_uid, f"ID:{g_uid}")
+            amount_str = format_number(amount)
+            text += f"{res_emoji} {rolled_emoji} {g_emoji} {uname} {gname}: {sign}{amount_str}\n"
+
+        kb = []
+        # Кнопки фильтров
+        kb.append([
+            InlineKeyboardButton("🔄 Все", callback_data='admin_logs_users_filter_all'),
+            InlineKeyboardButton("✅ Неоткатанные", callback_data='admin_logs_users_filter_active'),
+            InlineKeyboardButton("↩️ Откатанные", callback_data='admin_logs_users_filter_rolled')
+        ])
+        kb.append([InlineKeyboardButton("📄 Постраничный вид", callback_data='admin_logs_users_paged')])
+        kb.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_logs')])
+    else:
+        text = f"📜 Пользовательские логи ({rolled_back_text})\n━━━━━━━━━━━━━━━━\nСтраница {page+1} из {pages} | Всего: {total}\n\n"
+
+        kb = []
+        for log in logs:
+            gid, g_uid, gname, details, amount, is_win, is_rolled_back, created_at = log
+            g_emoji = GAME_EMOJIS.get(gname, '🎮')
+            res_emoji = "✅" if is_win else "❌"
+            # Проверяем is_rolled_back: 1 = откатан, 0 или None = не откатан
+            rolled_emoji = "↩️" if is_game_rolled_back(is_rolled_back) else ""
+            sign = "+" if is_win else "-"
+            uname = usernames.get(g_uid, f"ID:{g_uid}")
+            amount_str = format_number(amount)
+            kb.append([InlineKeyboardButton(
+                f"{res_emoji} {rolled_emoji} {g_emoji} {uname} {gname}: {sign}{amount_str}",
+                callback_data=f'admin_log_detail_game_{gid}'
+            )])
+
+        # Filter buttons
+        kb.append([
+            InlineKeyboardButton("🔄 Все", callback_data='admin_logs_users_filter_all'),
+            InlineKeyboardButton("✅ Неоткатанные", callback_data='admin_logs_users_filter_active'),
+            InlineKeyboardButton("↩️ Откатанные", callback_data='admin_logs_users_filter_rolled')
+        ])
+
+        # Pagination buttons
+        nav_row = []
+        if page_nav.prev:
+            nav_row.append(InlineKeyboardButton("◀️", callback_data=f'admin_logs_users_prev_{page_nav.prev}'))
+        nav_row.append(InlineKeyboardButton(f"{page+1}/{pages}", callback_data='admin_logs_users_goto_menu'))
+        if page_nav.next:
+            nav_row.append(InlineKeyboardButton("▶️", callback_data=f'admin_logs_users_next_{page_nav.next}'))
+        if len(nav_row) > 1:
+            kb.append(nav_row)
+
+        kb.append([InlineKeyboardButton("📄 Показать всё", callback_data='admin_logs_users_show_all')])
+        kb.append([InlineKeyboardButton("☑️ Массовый откат", callback_data='admin_logs_users_multi_mode')])
+        kb.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_logs')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_logs_users_multi_select_all')
+def _cb_admin_logs_users_multi_select_all(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    page = context.user_data.get('admin_logs_users_multi_page', 0)
+    rolled_back = context.user_data.get('admin_logs_users_filter', None)
+    selected = context.user_data.get('admin_logs_users_multi', [])
+    cursor = context.user_data.get('admin_logs_users_multi_cursor')
+    game_ids = [r[0] for r in get_game_feed(page, 10, rolled_back, cursor)[0]]
+
+    for gid in game_ids:
+        if gid not in selected:
+            selected.append(gid)
+    context.user_data['admin_logs_users_multi'] = selected
+
+    d = 'admin_logs_users_multi_mode'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_users_multi_deselect_all')
+def _cb_admin_logs_users_multi_deselect_all(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    context.user_data['admin_logs_users_multi'] = []
+    d = 'admin_logs_users_multi_mode'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_users_multi_mode', 'admin_logs_users_multi_select_*', 'admin_logs_users_multi_deselect_*', 'admin_logs_users_multi_confirm', 'admin_logs_users_multi_execute')
+def _cb_admin_logs_users_multi_mode(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    # Инициализация режима мульти-выбора
+    if d == 'admin_logs_users_multi_mode':
+        context.user_data['admin_logs_users_multi'] = []
+        context.user_data['admin_logs_users_multi_page'] = 0
+        context.user_data['admin_logs_users_multi_cursor'] = None
+
+    # Получаем текущий фильтр
+    rolled_back = context.user_data.get('admin_logs_users_filter', None)
+    rolled_back_text = {
+        None: "Все",
+        False: "Неоткатанные",
+        True: "Откатанные"
+    }[rolled_back]
+
+    # Выбранные игры
+    selected = context.user_data.get('admin_logs_users_multi', [])
+
+    # Обработка выбора/отмены выбора игры
+    if d.startswith('admin_logs_users_multi_select_'):
+        gid = int(d.replace('admin_logs_users_multi_select_', ''))
+        if gid not in selected:
+            selected.append(gid)
+            context.user_data['admin_logs_users_multi'] = selected
+        # Перерисовываем текущую страницу
+        d = 'admin_logs_users_multi_mode'
+        dispatch_callback(q, uid, d, context)
+        return
+
+    if d.startswith('admin_logs_users_multi_deselect_'):
+        gid = int(d.replace('admin_logs_users_multi_deselect_', ''))
+        if gid in selected:
+            selected.remove(gid)
+            context.user_data['admin_logs_users_multi'] = selected
+        # Перерисовываем текущую страницу
+        d = 'admin_logs_users_multi_mode'
+        dispatch_callback(q, uid, d, context)
+        return
+
+    # Выбрать все на странице
+    if d == 'admin_logs_users_multi_select_all':
+        page = context.user_data.get('admin_logs_users_multi_page', 0)
+        cursor = context.user_data.get('admin_logs_users_multi_cursor')
+        game_ids = [r[0] for r in get_game_feed(page, 10, rolled_back, cursor)[0]]
+
+        for gid in game_ids:
+            if gid not in selected:
+                selected.append(gid)
+        context.user_data['admin_logs_users_multi'] = selected
+        d = 'admin_logs_users_multi_mode'
+        dispatch_callback(q, uid, d, context)
+        return
+
+    # Снять выделение со всех
+    if d == 'admin_logs_users_multi_deselect_all':
+        context.user_data['admin_logs_users_multi'] = []
+        selected = []
+        d = 'admin_logs_users_multi_mode'
+        dispatch_callback(q, uid, d, context)
+        return
+
+    # Подтверждение массового отката
+    if d == 'admin_logs_users_multi_confirm':
+        if not selected:
+            q.answer("Нет выбранных игр!", show_alert=True)
+            return
+
+        # Получаем информацию о выбранных играх
+        with db_cursor() as c:
+            placeholders = ','.join('?' * len(selected))
+            c.execute(f'SELECT id, uid, game_name, amount, is_win, is_rolled_back FROM game_history WHERE id IN ({placeholders})', selected)
+            games = c.fetchall()
+
+        total_amount = 0
+        wins = 0
+        losses = 0
+        for gid, g_uid, gname, amount, is_win, is_rolled in games:
+            # Если игра не откатана, считаем сумму
+            if not is_game_rolled_back(is_rolled):
+                if is_win:
+                    total_amount += amount
+                    wins += 1
+                else:
+                    total_amount -= amount
+                    losses += 1
+
+        text = (
+            f"⚠️ ПОДТВЕРЖДЕНИЕ МАССОВОГО ОТКАТА\n\n"
+            f"Выбрано игр: {len(selected)}\n"
+            f"Выигрышей: {wins}\n"
+            f"Проигрышей: {losses}\n"
+            f"Общая сумма: {'+' if total_amount >= 0 else ''}{total_amount} монет\n\n"
+            f"⚠️ Это действие откатит все выбранные игры!\n\n"
+            f"Продолжить?"
+        )
+
+        kb = [
+            [InlineKeyboardButton("✅ Да, откатить", callback_data='admin_logs_users_multi_execute')],
+            [InlineKeyboardButton("❌ Отмена", callback_data='admin_logs_users_multi_mode')]
+        ]
+
+        q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+        return
+
+    # Выполнение массового отката
+    if d == 'admin_logs_users_multi_execute':
+        if not selected:
+            q.answer("Нет выбранных игр!", show_alert=True)
+            return
+
+        report = rollback_games(selected)
+        log_admin_action(uid, 'mass_rollback_games', 'games', len(selected),
+                         f"{report['rolled']} откатено, {report['restored']} восстановлено")
+
+        # Очищаем выбор
+        context.user_data['admin_logs_users_multi'] = []
+
+        net = report['net']
+        result_text = (
+            f"✅ Массовый откат завершён!\n\n"
+            f"↩️ Откатено игр: {report['rolled']}\n"
+            f"🔄 Откат отменён: {report['restored']}\n"
+            f"👥 Затронуто игроков: {report['users']}\n"
+            f"💰 Изменение балансов: {'+' if net >= 0 else ''}{format_number_full(net)} монет\n"
+            f"Ошибок: {report['missing']}"
+        )
+
+        q.edit_message_text(result_text,
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔙 К логам", callback_data='admin_logs_users')]
+            ]))
+        return
+
+    # Отображение списка игр с чекбоксами
+    page = context.user_data.get('admin_logs_users_multi_page', 0)
+    logs, total, page_nav = get_game_feed(page, 10, rolled_back, context.user_data.get('admin_logs_users_multi_cursor'))
+    page = context.user_data['admin_logs_users_multi_page'] = page_nav.number
+    context.user_data['admin_logs_users_multi_cursor'] = page_nav.here
+
+    # Получаем usernames
+    usernames = resolve_usernames(log[1] for log in logs)
+
+    pages = (total + 9) // 10 or 1
+
+    text = f"☑️ Массовый откат ({rolled_back_text})\n━━━━━━━━━━━━━━━━\nВыбрано: {len(selected)} | Страница {page+1}/{pages}\n\nНажмите на игру для выбора/отмены:"
+
+    kb = []
+    for log in logs:
+        gid, g_uid, gname, details, amount, is_win, is_rolled_back, created_at = log
+        g_emoji = GAME_EMOJIS.get(gname, '🎮')
+        res_emoji = "✅" if is_win else "❌"
+        sign = "+" if is_win else "-"
+        uname = usernames.get(g_uid, f"ID:{g_uid}")
+
+        # Определяем, выбрана ли игра
+        is_selected = gid in selected
+        check = "☑️ " if is_selected else "⬜ "
+
+        # Если игра уже откатана, показываем это
+        if is_game_rolled_back(is_rolled_back):
+            check = "↩️ "
+
+        kb.append([InlineKeyboardButton(
+            f"{check}{res_emoji} {g_emoji} {uname} {gname}: {sign}{amount}",
+            callback_data=f'admin_logs_users_multi_deselect_{gid}' if is_selected else f'admin_logs_users_multi_select_{gid}'
+        )])
+
+    # Кнопки управления
+    kb.append([
+        InlineKeyboardButton("☑️ Выбрать все", callback_data='admin_logs_users_multi_select_all'),
+        InlineKeyboardButton("⬜ Снять все", callback_data='admin_logs_users_multi_deselect_all')
+    ])
+
+    # Навигация
+    nav_row = []
+    if page_nav.prev:
+        nav_row.append(InlineKeyboardButton("◀️", callback_data=f'admin_logs_users_multi_prev_{page_nav.prev}'))
+    nav_row.append(InlineKeyboardButton(f"{page+1}/{pages}", callback_data='dummy'))
+    if page_nav.next:
+        nav_row.append(InlineKeyboardButton("▶️", callback_data=f'admin_logs_users_multi_next_{page_nav.next}'))
+    if len(nav_row) > 1:
+        kb.append(nav_row)
+
+    # Кнопка подтверждения (если есть выбранные)
+    if selected:
+        kb.append([InlineKeyboardButton(f"✅ Откатить {len(selected)} игр", callback_data='admin_logs_users_multi_confirm')])
+
+    kb.append([InlineKeyboardButton("❌ Отмена", callback_data='admin_logs_users')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_logs_users_multi_prev', 'admin_logs_users_multi_prev_{cursor}')
+def _cb_admin_logs_users_multi_prev(q, uid, d, context, cursor=None):
+    page = context.user_data.get('admin_logs_users_multi_page', 0)
+    if page > 0:
+        context.user_data['admin_logs_users_multi_page'] = page - 1
+    context.user_data['admin_logs_users_multi_cursor'] = cursor
+    d = 'admin_logs_users_multi_mode'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_users_multi_next', 'admin_logs_users_multi_next_{cursor}')
+def _cb_admin_logs_users_multi_next(q, uid, d, context, cursor=None):
+    page = context.user_data.get('admin_logs_users_multi_page', 0)
+    context.user_data['admin_logs_users_multi_page'] = page + 1
+    context.user_data['admin_logs_users_multi_cursor'] = cursor
+    d = 'admin_logs_users_multi_mode'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_users_goto_menu')
+def _cb_admin_logs_users_goto_menu(q, uid, d, context):
+    # Меню перехода на конкретную страницу
+    rolled_back = context.user_data.get('admin_logs_users_filter', None)
+    current_page = context.user_data.get('admin_logs_users_page', 0)
+    here = context.user_data.get('admin_logs_users_cursor')
+
+    # Страницы у начала, у конца и рядом с текущей, каждая со своим курсором
+    pages, cursors = get_game_feed_jumps(10, rolled_back, current_page, here)
+
+    # Сетка по 5 в ряд
+    kb = []
+    row = []
+    for i, cursor in sorted(cursors.items()):
+        if i == current_page:
+            row.append(InlineKeyboardButton(f"▶ {i+1}", callback_data='dummy'))
+        else:
+            row.append(InlineKeyboardButton(f"{i+1}", callback_data=f'admin_logs_users_page_{i}_{cursor}' if cursor
+                                            else f'admin_logs_users_page_{i}'))
+        if len(row) == 5:
+            kb.append(row)
+            row = []
+    if row:
+        kb.append(row)
+
+    kb.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_logs_users')])
+
+    q.edit_message_text(
+        f"📄 Выбор страницы (всего {pages} страниц):",
+        reply_markup=InlineKeyboardMarkup(kb)
+    )
+
+
+@callback_route('admin_logs_users_filter_all')
+def _cb_admin_logs_users_filter_all(q, uid, d, context):
+    context.user_data['admin_logs_users_filter'] = None
+    context.user_data['admin_logs_users_page'] = 0
+    d = 'admin_logs_users'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_users_filter_active')
+def _cb_admin_logs_users_filter_active(q, uid, d, context):
+    context.user_data['admin_logs_users_filter'] = False
+    context.user_data['admin_logs_users_page'] = 0
+    d = 'admin_logs_users'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_users_filter_rolled')
+def _cb_admin_logs_users_filter_rolled(q, uid, d, context):
+    context.user_data['admin_logs_users_filter'] = True
+    context.user_data['admin_logs_users_page'] = 0
+    d = 'admin_logs_users'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_users_prev', 'admin_logs_users_prev_{cursor}')
+def _cb_admin_logs_users_prev(q, uid, d, context, cursor=None):
+    page = context.user_data.get('admin_logs_users_page', 0)
+    if page > 0:
+        context.user_data['admin_logs_users_page'] = page - 1
+    else:
+        # Валидация: не выходим за пределы
+        context.user_data['admin_logs_users_page'] = 0
+    context.user_data['admin_logs_users_cursor'] = cursor
+    d = 'admin_logs_users'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_users_next', 'admin_logs_users_next_{cursor}')
+def _cb_admin_logs_users_next(q, uid, d, context, cursor=None):
+    page = context.user_data.get('admin_logs_users_page', 0)
+    context.user_data['admin_logs_users_page'] = page + 1
+    context.user_data['admin_logs_users_cursor'] = cursor
+    d = 'admin_logs_users'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_users_page_{page_num:int}', 'admin_logs_users_page_{page_num:int}_{cursor}')
+def _cb_admin_logs_users_page(q, uid, d, context, page_num, cursor=None):
+    # Без курсора - первая страница; курсор выдаёт меню перехода
+    context.user_data['admin_logs_users_page'] = page_num if cursor else 0
+    context.user_data['admin_logs_users_cursor'] = cursor
+    d = 'admin_logs_users'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_admin', 'admin_logs_admin_show_all', 'admin_logs_admin_paged')
+def _cb_admin_logs_admin(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+    # Determine filter: None (all), False (not rolled back), True (rolled back)
+    rolled_back = context.user_data.get('admin_logs_admin_filter', None)
+    rolled_back_text = {
+        None: "Все",
+        False: "Неоткатанные",
+        True: "Откатанные"
+    }[rolled_back]
+
+    # Режим показа: постраничный или всё
+    show_all = context.user_data.get('admin_logs_admin_show_all', False)
+
+    # Обрабатываем переключение режима
+    if d == 'admin_logs_admin_show_all':
+        show_all = True
+        context.user_data['admin_logs_admin_show_all'] = True
+    elif d == 'admin_logs_admin_paged':
+        show_all = False
+        context.user_data['admin_logs_admin_show_all'] = False
+        context.user_data['admin_logs_admin_page'] = 0
+
+    page = context.user_data.get('admin_logs_admin_page', 0)
+
+    # Лимит: 50 для "показать всё", 10 для постраничного
+    if show_all:
+        logs, total, page_nav = get_admin_logs(limit=50, page=0, rolled_back=rolled_back)
+    else:
+        logs, total, page_nav = get_admin_logs(limit=10, page=page, rolled_back=rolled_back,
+                                               cursor=context.user_data.get('admin_logs_admin_cursor'))
+        page = context.user_data['admin_logs_admin_page'] = page_nav.number
+        context.user_data['admin_logs_admin_cursor'] = page_nav.here
+
+    if not logs:
+        q.edit_message_text(f"📜 Админские логи ({rolled_back_text}) пусты",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔄 Все", callback_data='admin_logs_admin_filter_all'),
+                 InlineKeyboardButton("✅ Неоткатанные", callback_data='admin_logs_admin_filter_active'),
+                 InlineKeyboardButton("↩️ Откатанные", callback_data='admin_logs_admin_filter_rolled')],
+                [InlineKeyboardButton("🔙 Назад", callback_data='admin_logs')]
+            ]))
+        return
+
+    # Get admin usernames
+    admin_names = resolve_usernames(log[1] for log in logs)
+
+    pages = (total + 9) // 10 or 1
+
+    if show_all:
+        text = f"📜 Админские логи ({rolled_back_text}) — ВСЁ\n━━━━━━━━━━━━━━━━\nПоказано: {len(logs)} из {total}\n\n"
+        for log in logs:
+            l_id, admin_id, action, target_type, target_id, details, is_rolled_back, created_at = log
+            action_desc = get_action_description(action, target_type, target_id)
+            rolled_emoji = "↩️" if is_game_rolled_back(is_rolled_back) else ""
+            admin_name = admin_names.get(admin_id, f"ID:{admin_id}")
+            text += f"{rolled_emoji} {admin_name}: {action_desc}\n"
+
+        kb = []
+        # Кнопки фильтров
+        kb.append([
+            InlineKeyboardButton("🔄 Все", callback_data='admin_logs_admin_filter_all'),
+            InlineKeyboardButton("✅ Неоткатанные", callback_data='admin_logs_admin_filter_active'),
+            InlineKeyboardButton("↩️ Откатанные", callback_data='admin_logs_admin_filter_rolled')
+        ])
+        kb.append([InlineKeyboardButton("📄 Постраничный вид", callback_data='admin_logs_admin_paged')])
+        kb.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_logs')])
+    else:
+        text = f"📜 Админские логи ({rolled_back_text})\n━━━━━━━━━━━━━━━━\nСтраница {page+1} из {pages} | Всего: {total}\n\n"
+
+        kb = []
+        for log in logs:
+            l_id, admin_id, action, target_type, target_id, details, is_rolled_back, created_at = log
+            action_desc = get_action_description(action, target_type, target_id)
+            # Проверяем is_rolled_back: 1 = откатан, 0 или None = не откатан
+            rolled_emoji = "↩️" if is_game_rolled_back(is_rolled_back) else ""
+            admin_name = admin_names.get(admin_id, f"ID:{admin_id}")
+            kb.append([InlineKeyboardButton(
+                f"{rolled_emoji} {admin_name}: {action_desc}",
+                callback_data=f'admin_log_detail_admin_{l_id}'
+            )])
+
+        # Filter buttons
+        kb.append([
+            InlineKeyboardButton("🔄 Все", callback_data='admin_logs_admin_filter_all'),
+            InlineKeyboardButton("✅ Неоткатанные", callback_data='admin_logs_admin_filter_active'),
+            InlineKeyboardButton("↩️ Откатанные", callback_data='admin_logs_admin_filter_rolled')
+        ])
+
+        # Pagination buttons
+        nav_row = []
+        if page_nav.prev:
+            nav_row.append(InlineKeyboardButton("◀️", callback_data=f'admin_logs_admin_prev_{page_nav.prev}'))
+        nav_row.append(InlineKeyboardButton(f"{page+1}/{pages}", callback_data='admin_logs_admin_goto_menu'))
+        if page_nav.next:
+            nav_row.append(InlineKeyboardButton("▶️", callback_data=f'admin_logs_admin_next_{page_nav.next}'))
+        if len(nav_row) > 1:
+            kb.append(nav_row)
+
+        kb.append([InlineKeyboardButton("📄 Показать всё", callback_data='admin_logs_admin_show_all')])
+        kb.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_logs')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_logs_admin_goto_menu')
+def _cb_admin_logs_admin_goto_menu(q, uid, d, context):
+    # Меню перехода на конкретную страницу
+    rolled_back = context.user_data.get('admin_logs_admin_filter', None)
+    current_page = context.user_data.get('admin_logs_admin_page', 0)
+    here = context.user_data.get('admin_logs_admin_cursor')
+
+    # Страницы у начала, у конца и рядом с текущей, каждая со своим курсором
+    pages, cursors = get_admin_logs_jumps(10, rolled_back, current_page, here)
+
+    # Сетка по 5 в ряд
+    kb = []
+    row = []
+    for i, cursor in sorted(cursors.items()):
+        if i == current_page:
+            row.append(InlineKeyboardButton(f"▶ {i+1}", callback_data='dummy'))
+        else:
+            row.append(InlineKeyboardButton(f"{i+1}", callback_data=f'admin_logs_admin_page_{i}_{cursor}' if cursor
+                                            else f'admin_logs_admin_page_{i}'))
+        if len(row) == 5:
+            kb.append(row)
+            row = []
+    if row:
+        kb.append(row)
+
+    kb.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_logs_admin')])
+
+    q.edit_message_text(
+        f"📄 Выбор страницы (всего {pages} страниц):",
+        reply_markup=InlineKeyboardMarkup(kb)
+    )
+
+
+@callback_route('admin_logs_admin_filter_all')
+def _cb_admin_logs_admin_filter_all(q, uid, d, context):
+    context.user_data['admin_logs_admin_filter'] = None
+    context.user_data['admin_logs_admin_page'] = 0
+    d = 'admin_logs_admin'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_admin_filter_active')
+def _cb_admin_logs_admin_filter_active(q, uid, d, context):
+    context.user_data['admin_logs_admin_filter'] = False
+    context.user_data['admin_logs_admin_page'] = 0
+    d = 'admin_logs_admin'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_admin_filter_rolled')
+def _cb_admin_logs_admin_filter_rolled(q, uid, d, context):
+    context.user_data['admin_logs_admin_filter'] = True
+    context.user_data['admin_logs_admin_page'] = 0
+    d = 'admin_logs_admin'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_admin_prev', 'admin_logs_admin_prev_{cursor}')
+def _cb_admin_logs_admin_prev(q, uid, d, context, cursor=None):
+    page = context.user_data.get('admin_logs_admin_page', 0)
+    if page > 0:
+        context.user_data['admin_logs_admin_page'] = page - 1
+    else:
+        context.user_data['admin_logs_admin_page'] = 0
+    context.user_data['admin_logs_admin_cursor'] = cursor
+    d = 'admin_logs_admin'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_admin_next', 'admin_logs_admin_next_{cursor}')
+def _cb_admin_logs_admin_next(q, uid, d, context, cursor=None):
+    page = context.user_data.get('admin_logs_admin_page', 0)
+    context.user_data['admin_logs_admin_page'] = page + 1
+    context.user_data['admin_logs_admin_cursor'] = cursor
+    d = 'admin_logs_admin'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_logs_admin_page_{page_num:int}', 'admin_logs_admin_page_{page_num:int}_{cursor}')
+def _cb_admin_logs_admin_page(q, uid, d, context, page_num, cursor=None):
+    # Без курсора - первая страница; курсор выдаёт меню перехода
+    context.user_data['admin_logs_admin_page'] = page_num if cursor else 0
+    context.user_data['admin_logs_admin_cursor'] = cursor
+    d = 'admin_logs_admin'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_log_detail_game_{gid:int}')
+def _cb_admin_log_detail_game(q, uid, d, context, gid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+
+    with db_cursor() as c:
+        c.execute('SELECT * FROM game_history WHERE id=?', (gid,))
+        game = c.fetchone()
+
+    if not game:
+        q.answer("Игра не найдена", show_alert=True); return
+
+    game_id, game_uid, gname, details, amount, is_win, is_rolled_back, created_at = game
+
+    # Get username
+    username = username_resolver.get(game_uid)
+    if username is None:
+        username = f"ID:{game_uid}"
+
+    # Используем правильный формат с is_rolled_back
+    msg = format_game_detail(gname, details, amount, is_win, created_at, is_rolled_back)
+
+    # Кнопка возврата с учетом текущего фильтра
+    back_callback = 'admin_logs_users'
+
+    # Добавляем кнопку отката или отмены отката
+    if is_game_rolled_back(is_rolled_back):
+        kb = [
+            [InlineKeyboardButton("👤 Пользователь", callback_data=f'user_info_{game_uid}_admin_logs_users')],
+            [InlineKeyboardButton("↩️ Отменить откат", callback_data=f'admin_log_rollback_game_{gid}')],
+            [InlineKeyboardButton("🔙 Назад", callback_data=back_callback)]
+        ]
+    else:
+        kb = [
+            [InlineKeyboardButton("👤 Пользователь", callback_data=f'user_info_{game_uid}_admin_logs_users')],
+            [InlineKeyboardButton("↩️ Откатить игру", callback_data=f'admin_log_rollback_game_{gid}')],
+            [InlineKeyboardButton("🔙 Назад", callback_data=back_callback)]
+        ]
+
+    q.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_log_detail_admin_{log_id:int}')
+def _cb_admin_log_detail_admin(q, uid, d, context, log_id):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+
+    with db_cursor() as c:
+        c.execute('SELECT * FROM admin_logs WHERE id=?', (log_id,))
+        log = c.fetchone()
+
+    if not log:
+        q.answer("Лог не найден", show_alert=True); return
+
+    l_id, admin_id, action, target_type, target_id, details, is_rolled_back, created_at = log
+
+    # Get admin username if available
+    names = username_resolver.get_many([admin_id, target_id] if target_type == 'user' else [admin_id])
+    admin_name = names.get(admin_id, f"ID:{admin_id}")
+
+    # Get target username if it's a user
+    target_name = names.get(target_id) if target_type == 'user' else None
+
+    action_desc = get_action_description(action, target_type, target_id)
+
+    text = (
+        f"📜 Детали лога #{l_id}\n\n"
+        f"📅 Дата: {created_at}\n"
+        f"👤 Админ: {admin_name} (ID: {admin_id})\n"
+        f"⚡ Действие: {action_desc}\n"
+    )
+    if target_name:
+        text += f"🎯 Цель: {target_name} (ID: {target_id})\n"
+    else:
+        text += f"🆔 ID цели: {target_id}\n"
+    if details:
+        text += f"ℹ️ Детали: {details}\n"
+    # Проверяем is_rolled_back: 1 = откатан, 0 или None = не откатан
+    if is_game_rolled_back(is_rolled_back):
+        text += f"\n↩️ Это действие было откачено"
+
+    # Кнопка возврата: фильтр списка хранится в user_data
+    back_callback = 'admin_logs_admin'
+
+    # Собираем кнопки
+    row1 = []
+
+    # Кнопка просмотра пользователя, если это действие над пользователем
+    if target_type == 'user' and target_id:
+        row1.append(InlineKeyboardButton("👤 Пользователь", callback_data=f'user_info_{target_id}_admin_logs_admin'))
+
+    # Кнопка отката или снятия отката
+    if is_game_rolled_back(is_rolled_back):
+        row1.append(InlineKeyboardButton("↩️ Снять откат", callback_data=f'admin_log_rollback_admin_{log_id}'))
+    else:
+        row1.append(InlineKeyboardButton("↩️ Откатить действие", callback_data=f'admin_log_rollback_admin_{log_id}'))
+
+    kb = [row1, [InlineKeyboardButton("🔙 Назад", callback_data=back_callback)]]
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('admin_log_rollback_game_{gid:int}')
+def _cb_admin_log_rollback_game(q, uid, d, context, gid):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+
+    success, msg = rollback_game(gid)
+
+    if success:
+        # НЕ логируем откат игры в админ-логах - это засоряет логи
+        # Но обновляем сообщение
+        q.answer(msg, show_alert=True)
+    else:
+        q.answer(msg, show_alert=True)
+        return
+
+    # Возвращаемся к списку логов (не к деталям)
+    d = 'admin_logs_users'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_log_rollback_admin_{log_id:int}')
+def _cb_admin_log_rollback_admin(q, uid, d, context, log_id):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+
+
+    success, msg = rollback_admin_log(log_id, uid)
+
+    if success:
+        log_admin_action(uid, 'rollback_admin', 'log', log_id, msg)
+        q.answer(msg, show_alert=True)
+    else:
+        q.answer(msg, show_alert=True)
+        return
+
+    # Возвращаемся к списку логов (не к деталям)
+    d = 'admin_logs_admin'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('admin_global_balance')
+def _cb_admin_global_balance(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "💰 Глобальный баланс\n\nВыберите действие:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("➕ Добавить всем", callback_data='admin_global_add')],
+            [InlineKeyboardButton("➖ Вычесть у всех", callback_data='admin_global_sub')],
+            [InlineKeyboardButton("🔄 Установить всем", callback_data='admin_global_set')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='admin_menu')]
+        ])
+    )
+
+
+@callback_route('admin_global_add')
+def _cb_admin_global_add(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "💰 Добавить монет всем\n\nВведите сумму:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_global_balance')]]))
+    context.user_data['state'] = 'admin_global_add'
+
+
+@callback_route('admin_global_sub')
+def _cb_admin_global_sub(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "💰 Вычесть монет у всех\n\nВведите сумму:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_global_balance')]]))
+    context.user_data['state'] = 'admin_global_sub'
+
+
+@callback_route('admin_global_set')
+def _cb_admin_global_set(q, uid, d, context):
+    if not is_admin(uid):
+        q.answer("Нет доступа!", show_alert=True); return
+    q.edit_message_text(
+        "💰 Установить баланс всем\n\nВведите сумму:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_global_balance')]]))
+    context.user_data['state'] = 'admin_global_set'
@@ -0,0 +1,185 @@
+"""Japanese candles game callbacks"""
+
+import json
+import random
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import (CandlesSession, callback_route, game_sessions, get_user, settle_game,
+                 settlement_txn, start_game_session)
+
+# ════════════════════════════
+# ── ЯПОНСКИЕ СВЕЧИ ──
+# ════════════════════════════
+@callback_route('candles_menu')
+def _cb_candles_menu(q, uid, d, context):
+    bet = context.user_data.get('candles_bet', 0)
+    row = get_user(uid)
+    can_start = bet > 0
+    q.edit_message_text(
+        f"📊 Японские свечи\n💰 Баланс: {row.coins} монет\nСтавка: {bet} монет\n\n"
+        f"Угадайте направление следующей свечи: 📈 Вверх или 📉 Вниз!\n"
+        f"Правильный прогноз = x1.9",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("▶️ Начать игру", callback_data='candles_start') if can_start
+             else InlineKeyboardButton("▶️ Начать (сделайте ставку)", callback_data='candles_need_bet')],
+            [InlineKeyboardButton(f"💰 Сделать ставку ({bet} монет)", callback_data='candles_set_bet')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='games_menu')]
+        ])
+    )
+
+
+@callback_route('candles_need_bet')
+def _cb_candles_need_bet(q, uid, d, context):
+    q.answer("Сначала сделайте ставку!", show_alert=True)
+
+
+@callback_route('candles_set_bet')
+def _cb_candles_set_bet(q, uid, d, context):
+    q.edit_message_text(
+        "💰 Введите сумму ставки для Свечей:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='candles_menu')]]))
+    context.user_data['state'] = 'candles_bet'
+
+
+def candles_chart(changes):
+    """Chart lines for the last 6 candles"""
+    chart_lines = []
+    current_price = 100
+    display_candles = changes[-6:]
+    for i, change in enumerate(display_candles):
+        prev_price = current_price
+        current_price += change
+        emoji = "📈" if change > 0 else "📉" if change < 0 else "➡️"
+        candle_num = len(changes) - len(display_candles) + i + 1
+        chart_lines.append(f"{emoji} Свеча {candle_num}: {prev_price} → {current_price} ({change:+d})")
+    return "\n".join(chart_lines)
+
+
+def next_candle_change():
+    """Hidden change of the next candle: 1..16 up or -15..-1 down"""
+    if random.choice(['up', 'down']) == 'up':
+        return random.randint(1, 16)
+    return random.randint(-15, -1)
+
+
+@callback_route('candles_start')
+def _cb_candles_start(q, uid, d, context):
+    bet = context.user_data.get('candles_bet', 0)
+    row = get_user(uid)
+    if bet <= 0:
+        q.answer("Сначала сделайте ставку!", show_alert=True); return
+    if bet > row.coins:
+        # Если баланса недостаточно, предложим изменить ставку
+        q.answer(f"Недостаточно монет! У вас {row.coins}, а ставка {bet}. Измените ставку.", show_alert=True)
+        return
+
+    # Generate initial 5 candles for display
+    candles = []
+    for i in range(CandlesSession.SHOWN):
+        # Генерируем изменение, исключая 0
+        while True:
+            change = random.randint(-15, 15)
+            if change != 0:
+                break
+        candles.append(change)
+
+    session = CandlesSession(bet, 1.0, bytes(change + 16 for change in candles), next_candle_change())
+    if not start_game_session(uid, 'candles', session):
+        q.answer("Недостаточно монет!", show_alert=True); return
+
+    q.edit_message_text(
+        f"📊 Японские свечи | Ставка: {bet} монет\n\n"
+        f"График последних 5 свечей:\n{candles_chart(candles)}\n\n"
+        f"Куда пойдёт следующая свеча?",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📈 Вверх", callback_data='candles_up'),
+             InlineKeyboardButton("📉 Вниз", callback_data='candles_down')]
+        ])
+    )
+
+
+@callback_route('candles_up', 'candles_down')
+def _cb_candles_up(q, uid, d, context):
+    session = game_sessions.get(uid, 'candles')
+    if session is None:
+        q.answer("Игра не активна! Начните новую игру.", show_alert=True); return
+
+    bet = session.bet
+    coeff = session.coeff
+    actual = 'up' if session.next_change > 0 else 'down'
+    prediction = 'up' if d == 'candles_up' else 'down'
+    won = (prediction == actual)
+
+    # Add the result candle to chart
+    moves = session.moves()
+    session.push(session.next_change)
+    chart_text = candles_chart(session.changes())
+
+    if won:
+        # Correct prediction - increase coefficient and continue
+        new_coeff = coeff * 1.9
+        session.coeff = new_coeff
+        session.next_change = next_candle_change()
+        game_sessions.save(uid, 'candles', session)
+        potential = int(bet * new_coeff)
+
+        q.edit_message_text(
+            f"🎉 Правильно! Свеча пошла {'📈 Вверх' if actual == 'up' else '📉 Вниз'}!\n\n"
+            f"График:\n{chart_text}\n\n"
+            f"🔥 Коэффициент: {new_coeff:.1f}x\n"
+            f"💰 Возможный выигрыш: {potential} монет\n\n"
+            f"Продолжить или забрать?",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("📈 Вверх", callback_data='candles_up'),
+                 InlineKeyboardButton("📉 Вниз", callback_data='candles_down')],
+                [InlineKeyboardButton(f"💳 Забрать {potential} монет", callback_data='candles_cashout')]
+            ])
+        )
+    else:
+        # Wrong prediction - game over
+        with settlement_txn():
+            finished = game_sessions.finish(uid, 'candles') is not None
+            if finished:
+                moves.append(f"❌{'📈' if actual == 'up' else '📉'}")
+
+                settle_game(uid, "Свечи", json.dumps(session.details('loss', moves)), bet, False, stake=session.stake)
+        if not finished:
+            q.answer("Игра не активна! Начните новую игру.", show_alert=True); return
+
+        row = get_user(uid)
+        q.edit_message_text(
+            f"😞 Не угадали! Свеча пошла {'📈 Вверх' if actual == 'up' else '📉 Вниз'}!\n\n"
+            f"График:\n{chart_text}\n\n"
+            f"💸 Потеряли {bet} монет\n"
+            f"💰 Баланс: {row.coins} монет",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔄 Играть снова", callback_data='candles_menu')],
+                [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+            ])
+        )
+
+
+@callback_route('candles_cashout')
+def _cb_candles_cashout(q, uid, d, context):
+    with settlement_txn():
+        session = game_sessions.finish(uid, 'candles')
+        if session is not None:
+            bet = session.bet
+            coeff = session.coeff
+            winnings = int(bet * coeff)
+
+            settle_game(uid, "Свечи", json.dumps(session.details('cashout')), winnings, True, payout=winnings, stake=session.stake)
+    if session is None:
+        q.answer("Нет активной игры!", show_alert=True); return
+
+    row = get_user(uid)
+    profit = winnings - bet
+
+    q.edit_message_text(
+        f"✅ Выигрыш забран!\n💰 +{winnings} монет (x{coeff:.1f}) | Прибыль: +{profit}\n💰 Баланс: {row.coins} монет",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Играть снова", callback_data='candles_menu')],
+            [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+        ])
+    )
@@ -0,0 +1,60 @@
+"""Callbacks of the channel subscription check"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import (CHANNEL_USERNAME, COIN_BONUS, add_coins, callback_route,
+                 check_channel_subscription_sync, get_channel_reward_status, get_user,
+                 main_menu_kb, set_channel_reward_received, update_channel_subscription_status)
+
+# ── ПРОВЕРКА ПОДПИСКИ НА КАНАЛ ──
+@callback_route('channel_check')
+def _cb_channel_check(q, uid, d, context):
+    is_subscribed = check_channel_subscription_sync(q.bot, uid)
+    update_channel_subscription_status(uid, is_subscribed)
+
+    if is_subscribed:
+        if not get_channel_reward_status(uid):
+            add_coins(uid, 200, COIN_BONUS)
+            set_channel_reward_received(uid)
+            row = get_user(uid)
+            try:
+                q.edit_message_text(
+                    f"✅ Вы подписаны на канал!\n\n"
+                    f"🎁 +200 монет добавлено на баланс!\n"
+                    f"💰 Ваш баланс: {row.coins} монет\n\n"
+                    f"⚠️ Если вы от подпишетесь, 200 монет будут списаны!",
+                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Продолжить", callback_data='main_menu')]])
+                )
+            except Exception:
+                pass
+        else:
+            try:
+                q.edit_message_text(
+                    f"✅ Вы подписаны на канал!\n\n"
+                    f"Вы уже получали награду за подписку.",
+                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Продолжить", callback_data='main_menu')]])
+                )
+            except Exception:
+                pass
+    else:
+        try:
+            q.edit_message_text(
+                f"❌ Вы не подписаны на канал!\n\n"
+                f"📢 Пожалуйста, подпишитесь на канал: @{CHANNEL_USERNAME}\n"
+                f"Затем нажмите \"Проверить\" снова.",
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("✅ Проверить снова", callback_data='channel_check')],
+                    [InlineKeyboardButton("⏭️ Пропустить", callback_data='channel_skip')]
+                ])
+            )
+        except Exception:
+            pass
+
+
+@callback_route('channel_skip')
+def _cb_channel_skip(q, uid, d, context):
+    # Просто закрываем всплывающее окно, возвращаемся в главное меню
+    q.edit_message_text(
+        "⏭️ Пропущено. Следующее предложение появится позже.",
+        reply_markup=main_menu_kb(uid)
+    )
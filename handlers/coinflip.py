@@ -0,0 +1,139 @@
+"""Coinflip game callbacks"""
+
+import json
+import random
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import (CoinflipSession, callback_route, forfeit_game_session, game_sessions, get_user,
+                 settle_game, settlement_txn, start_game_session)
+
+# ════════════════════════════
+# ── МОНЕТКА ──
+# ════════════════════════════
+@callback_route('cf_menu')
+def _cb_cf_menu(q, uid, d, context):
+    bet = context.user_data.get('cf_bet', 0)
+    row = get_user(uid)
+    can_start = bet > 0
+    q.edit_message_text(
+        f"🪙 Монетка\n💰 Баланс: {row.coins} монет\nСтавка: {bet} монет",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("▶️ Начать игру", callback_data='cf_start') if can_start
+             else InlineKeyboardButton("▶️ Начать (сначала сделайте ставку)", callback_data='cf_need_bet')],
+            [InlineKeyboardButton(f"💰 Сделать ставку ({bet} монет)", callback_data='cf_set_bet')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='games_menu')]
+        ])
+    )
+
+
+@callback_route('cf_need_bet')
+def _cb_cf_need_bet(q, uid, d, context):
+    q.answer("Сначала сделайте ставку!", show_alert=True)
+
+
+@callback_route('cf_set_bet')
+def _cb_cf_set_bet(q, uid, d, context):
+    q.edit_message_text(
+        "💰 Введите сумму ставки для Монетки:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='cf_menu')]]))
+    context.user_data['state'] = 'cf_bet'
+
+
+@callback_route('cf_start')
+def _cb_cf_start(q, uid, d, context):
+    bet = context.user_data.get('cf_bet', 0)
+    row = get_user(uid)
+    if bet <= 0:
+        q.answer("Сначала сделайте ставку!", show_alert=True); return
+    if bet > row.coins:
+        q.answer("Недостаточно монет!", show_alert=True); return
+    if not start_game_session(uid, 'cf', CoinflipSession(bet)):
+        q.answer("Недостаточно монет!", show_alert=True); return
+    q.edit_message_text(
+        f"🪙 Монетка | Ставка: {bet} монет\nВыберите: орёл или решка?",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🦅 Орёл", callback_data='cf_heads'),
+             InlineKeyboardButton("🪙 Решка", callback_data='cf_tails')],
+            [InlineKeyboardButton("❌ Выйти (ставка сгорит)", callback_data='cf_forfeit')]
+        ])
+    )
+
+
+@callback_route('cf_heads', 'cf_tails')
+def _cb_cf_heads(q, uid, d, context):
+    session = game_sessions.get(uid, 'cf')
+    if session is None:
+        q.answer("Игра не активна! Начните новую игру.", show_alert=True); return
+    bet = session.bet
+    choice = 'heads' if d == 'cf_heads' else 'tails'
+    result = random.choice(['heads', 'tails'])
+    won = (choice == result)
+    result_emoji = "🦅 Орёл" if result == 'heads' else "🪙 Решка"
+
+    if won:
+        if result == 'heads':
+            session.results |= 1 << session.wins
+        session.wins += 1
+        game_sessions.save(uid, 'cf', session)
+        new_coeff = session.coeff
+        potential = int(bet * new_coeff)
+        q.edit_message_text(
+            f"🎉 Выпало: {result_emoji} — Угадали!\n\nСтавка: {bet} монет\n🔥 Коэффициент: {new_coeff:.0f}x\n💰 Возможный выигрыш: {potential} монет\n\nПродолжить или забрать?",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🦅 Орёл", callback_data='cf_heads'),
+                 InlineKeyboardButton("🪙 Решка", callback_data='cf_tails')],
+                [InlineKeyboardButton(f"💳 Забрать {potential} монет", callback_data='cf_cashout')]
+            ])
+        )
+    else:
+        with settlement_txn():
+            finished = game_sessions.finish(uid, 'cf') is not None
+            if finished:
+                moves = session.moves()
+                moves.append(f"❌{result_emoji}")
+                settle_game(uid, "Монетка", json.dumps(session.details('loss', moves)), bet, False, stake=session.stake)
+        if not finished:
+            q.answer("Игра не активна! Начните новую игру.", show_alert=True); return
+        row = get_user(uid)
+        q.edit_message_text(
+            f"😞 Выпало: {result_emoji} — Не угадали!\nВы проиграли {bet} монет.\n💰 Баланс: {row.coins} монет",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔄 Играть снова", callback_data='cf_menu')],
+                [InlineKeyboardButton("🔙 Назад", callback_data='games_menu')]
+            ])
+        )
+
+
+@callback_route('cf_cashout')
+def _cb_cf_cashout(q, uid, d, context):
+    with settlement_txn():
+        session = game_sessions.finish(uid, 'cf')
+        if session is not None:
+            bet = session.bet
+            coeff = session.coeff
+            winnings = int(bet * coeff)
+            settle_game(uid, "Монетка", json.dumps(session.details('cashout')), winnings, True, payout=winnings, stake=session.stake)
+    if session is None:
+        q.answer("Нет активной игры!", show_alert=True); return
+    row = get_user(uid)
+    profit = winnings - bet
+    q.edit_message_text(
+        f"✅ Выигрыш забран!\n💰 +{winnings} монет (x{coeff:.0f}) | Прибыль: +{profit}\n💰 Баланс: {row.coins} монет",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Играть снова", callback_data='cf_menu')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='games_menu')]
+        ])
+    )
+
+
+@callback_route('cf_forfeit')
+def _cb_cf_forfeit(q, uid, d, context):
+    with settlement_txn():
+        session = game_sessions.finish(uid, 'cf')
+        if session is not None:
+            forfeit_game_session(uid, session, 'forfeit')
+    row = get_user(uid)
+    q.edit_message_text(
+        f"❌ Вы вышли. Ставка потеряна.\n💰 Баланс: {row.coins} монет",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='games_menu')]]))
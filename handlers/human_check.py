@@ -0,0 +1,55 @@
+"""Human check (anti-bot) callbacks"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import REFERRAL_BONUS, callback_route, get_user, main_menu_kb, register_referral
+
+# ════════════════════════════
+# ── ПОДТВЕРЖДЕНИЕ ЧЕЛОВЕКА (БОТ ЗАЩИТА) ──
+# ════════════════════════════
+@callback_route('confirm_human_yes')
+def _cb_confirm_human_yes(q, uid, d, context):
+    if 'pending_referrer' in context.user_data:
+        referrer_id = context.user_data['pending_referrer']
+        uid = q.from_user.id
+
+        # Set referrer; the referrer's bonus is queued and paid after REFERRAL_DELAY
+        if register_referral(uid, referrer_id):
+            try:
+                q.bot.send_message(referrer_id, f"👥 Вы привели нового реферала!\n"
+                                                f"+{REFERRAL_BONUS} монет придут через 5 минут 🎉")
+            except Exception:
+                pass
+
+        # Get referrer info for message
+        referrer_row = get_user(referrer_id)
+        referrer_name = referrer_row.username if referrer_row.username else f"ID:{referrer_id}"
+
+        # Show welcome message to new user
+        row = get_user(uid)
+        q.edit_message_text(
+            f"🎉 Спасибо за подтверждение!\n👥 Вы были приглашены: {referrer_name}\n💰 Баланс: {row.coins} монет\n\nВыберите действие:",
+            reply_markup=main_menu_kb(uid)
+        )
+
+        # Clear pending referrer
+        if 'pending_referrer' in context.user_data:
+            del context.user_data['pending_referrer']
+
+
+@callback_route('confirm_human_no')
+def _cb_confirm_human_no(q, uid, d, context):
+    if 'pending_referrer' in context.user_data:
+        del context.user_data['pending_referrer']
+    q.edit_message_text(
+        "❌ Регистрация по реферальной ссылке отменена.\nНапишите /start для начала.",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Начать заново", callback_data='start_cancelled')]])
+    )
+
+
+@callback_route('start_cancelled')
+def _cb_start_cancelled(q, uid, d, context):
+    q.edit_message_text(
+        "Напишите /start для начала.",
+        reply_markup=None
+    )
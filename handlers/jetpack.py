@@ -0,0 +1,164 @@
+"""Jetpack game callbacks"""
+
+import json
+import random
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import (JP_GRACE, _start_jp_ticker, callback_route, get_user, jp_games, jp_lock,
+                 place_bet, set_field, settle_game)
+
+# ════════════════════════════
+# ── ДЖЕТПАК ──
+# ════════════════════════════
+@callback_route('jp_menu')
+def _cb_jp_menu(q, uid, d, context):
+    # Stop any active game for this user
+    with jp_lock:
+        if uid in jp_games:
+            jp_games[uid]['active'] = False
+    bet = context.user_data.get('jp_bet', 0)
+    auto = context.user_data.get('jp_auto', 0.0)
+    row = get_user(uid)
+    auto_txt = f"{auto:.2f}x" if auto > 1.0 else "Выкл"
+    can_start = bet > 0
+    q.edit_message_text(
+        f"🚀 Джетпак\n💰 Баланс: {row.coins} монет\nСтавка: {bet} монет | Авто-сбор: {auto_txt}",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("▶️ Начать игру", callback_data='jp_start') if can_start
+             else InlineKeyboardButton("▶️ Начать (сделайте ставку)", callback_data='jp_need_bet')],
+            [InlineKeyboardButton(f"💰 Ставка ({bet})", callback_data='jp_set_bet'),
+             InlineKeyboardButton(f"🤖 Авто ({auto_txt})", callback_data='jp_set_auto')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='games_menu')]
+        ])
+    )
+
+
+@callback_route('jp_need_bet')
+def _cb_jp_need_bet(q, uid, d, context):
+    q.answer("Сначала сделайте ставку!", show_alert=True)
+
+
+@callback_route('jp_set_bet')
+def _cb_jp_set_bet(q, uid, d, context):
+    q.edit_message_text(
+        "💰 Введите сумму ставки для Джетпака:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='jp_menu')]]))
+    context.user_data['state'] = 'jp_bet'
+
+
+@callback_route('jp_set_auto')
+def _cb_jp_set_auto(q, uid, d, context):
+    q.edit_message_text(
+        "🤖 Введите коэффициент авто-сбора (напр. 2.5 или 2,5)\nВведите 0 — чтобы выключить:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='jp_menu')]]))
+    context.user_data['state'] = 'jp_auto'
+
+
+@callback_route('jp_start')
+def _cb_jp_start(q, uid, d, context):
+    bet = context.user_data.get('jp_bet', 0)
+    row = get_user(uid)
+    if bet <= 0:
+        q.answer("Сначала сделайте ставку!", show_alert=True); return
+    if bet > row.coins:
+        q.answer("Недостаточно монет!", show_alert=True); return
+    with jp_lock:
+        if jp_games.get(uid, {}).get('active', False):
+            q.answer("Игра уже идёт!", show_alert=True); return
+
+    # Generate crash point: standard formula P(crash >= x) = 0.95/x
+    r = random.random()
+    if r < 0.05:
+        crash = 0.00  # instant bust
+    else:
+        crash = round(0.95 / (1.0 - r), 2)
+
+    auto = context.user_data.get('jp_auto', 0.0)
+
+    # Deduct bet immediately
+    stake = place_bet(uid, bet)
+    if stake is None:
+        q.answer("Недостаточно монет!", show_alert=True); return
+    row2 = get_user(uid)
+
+    # Instant crash?
+    if crash == 0.00:
+        q.edit_message_text(
+            f"🚀 Джетпак | Ставка: {bet} монет\n\n💥💀 МГНОВЕННЫЙ КРАШ на 0.00x!\nПотеряли {bet} монет.\n💰 Баланс: {row2.coins} монет",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔄 Играть снова", callback_data='jp_menu')],
+                [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+            ])
+        )
+        return
+
+    # Edit message to show the start
+    q.edit_message_text(
+        f"🚀\n═══════════════\n🔥 Коэффициент: 1.00x\n💰 Выигрыш: {bet} монет\n(Ставка: {bet} монет)\n═══════════════\nНажмите ЗАБРАТЬ пока не поздно!",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"💳 Забрать {bet} монет!", callback_data='jp_collect')]
+        ])
+    )
+
+    # Register game state; auto-cashout and crash are handled by the ticker
+    print(f"[JP] Starting game for user {uid}: bet={bet}, crash={crash:.2f}x, auto={auto:.2f}x")
+    with jp_lock:
+        jp_games[uid] = {
+            'active': True,
+            'crash': crash,
+            'current': 1.00,
+            'bet': bet,
+            'stake': stake.ledger_id,
+            'auto': auto,
+            'crashed': False,
+            'crashed_at': 0,
+            'iteration': 0,
+            'bot': q.bot,
+            'chat_id': q.message.chat_id,
+            'msg_id': q.message.message_id
+        }
+    _start_jp_ticker()
+
+
+@callback_route('jp_collect')
+def _cb_jp_collect(q, uid, d, context):
+    with jp_lock:
+        game = jp_games.get(uid)
+        crashed_recently = (
+            game and game.get('crashed') and
+            (time.time() - game.get('crashed_at', 0)) < JP_GRACE
+        )
+        if game and (game['active'] or crashed_recently):
+            # Cashout!
+            coeff = game['current']
+            bet = game['bet']
+            crash = game['crash']
+            stake = game.get('stake')
+            game['active'] = False
+            game['crashed'] = False  # повторное нажатие в окне краша не платит ещё раз
+        else:
+            game = None
+    if game is None:
+        # Already crashed and grace period expired
+        q.answer("💥 Слишком поздно! Джетпак уже разбился.", show_alert=True)
+        return
+
+    winnings = int(bet * coeff)
+    settle_game(uid, "Джетпак", json.dumps({'bet': bet, 'crash': crash, 'collect': coeff, 'result': 'collect'}), winnings, True, payout=winnings, stake=stake)
+    row = get_user(uid)
+    profit = winnings - bet
+
+    # Update record
+    if coeff > row.jetpack_best:
+        set_field(uid, 'jetpack_best', coeff)
+    row = get_user(uid)
+
+    q.edit_message_text(
+        f"✅ Забрали на {coeff:.2f}x!\n💰 Выигрыш: {winnings} монет | Прибыль: +{profit}\n💰 Баланс: {row.coins} монет\n(Краш был бы на {crash:.2f}x)",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Играть снова", callback_data='jp_menu')],
+            [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+        ])
+    )
@@ -0,0 +1,25 @@
+"""Leaderboard callbacks"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import callback_route, format_number, format_number_full, get_leaderboard, leaderboard
+
+# ════════════════════════════
+# ── ТАБЛИЦА ЛИДЕРОВ ──
+# ════════════════════════════
+@callback_route('leaderboard')
+def _cb_leaderboard(q, uid, d, context):
+    leaders = get_leaderboard()
+    medals = ['🥇', '🥈', '🥉', '4️⃣', '5️⃣', '6️⃣', '7️⃣', '8️⃣', '9️⃣', '🔟']
+    text = "🏆 Топ-10 игроков:\n\n"
+    for i, (lid, uname, coins) in enumerate(leaders):
+        name = uname if uname else f"ID:{lid}"
+        text += f"{medals[i]} {name} — {format_number(coins)} монет\n"
+    place, total = leaderboard.rank(uid)
+    if place:
+        text += f"\n📍 Вы на {format_number_full(place)} месте из {format_number_full(total)}"
+    q.edit_message_text(text,
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Обновить", callback_data='leaderboard')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='main_menu')]
+        ]))
@@ -0,0 +1,470 @@
+"""Main menu, game history, hourly bonus and promo code callbacks"""
+
+import random
+from datetime import datetime
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import (ALL_GAMES, CHANNEL_USERNAME, COIN_BONUS, GAME_EMOJIS, add_coins,
+                 callback_route, can_claim_hourly, check_channel_subscription_sync,
+                 count_history, dispatch_callback, format_game_detail, format_number,
+                 format_number_full, games_menu_kb, get_channel_reward_status, get_game_info,
+                 get_history_jumps, get_history_paged, get_user, is_admin, set_channel_reward_received,
+                 time_until_hourly, update_channel_subscription_status)
+
+# ── ГЛАВНОЕ МЕНЮ ──
+@callback_route('main_menu')
+def _cb_main_menu(q, uid, d, context):
+    row = get_user(uid)
+
+    # Проверяем, нужно ли показать окошко подписки на канал
+    # Показываем с вероятностью 30%, если пользователь ещё не получил награду
+    channel_reward_received = row.channel_reward_received
+
+    # Сохраняем текущее меню для возврата
+    context.user_data['return_to_menu'] = 'main_menu'
+
+    if not channel_reward_received and random.random() < 0.3:
+        # Показываем окошко подписки
+        q.edit_message_text(
+            f"📢 Подпишитесь на наш канал!\n\n"
+            f"🔔 @{CHANNEL_USERNAME}\n\n"
+            f"🎁 Подписка = +200 монет!\n"
+            f"⚠️ Если отпишитесь - монеты будут списаны!",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("✅ Проверить подписку", callback_data='channel_check_popup')],
+                [InlineKeyboardButton("⏭️ Пропустить", callback_data='channel_skip_popup')]
+            ])
+        )
+        return
+
+    # Build keyboard with admin button if user is admin
+    kb = [
+        [InlineKeyboardButton("🎮 Игры", callback_data='games_menu'),
+         InlineKeyboardButton("👤 Профиль", callback_data='profile')],
+        [InlineKeyboardButton("🏆 Топ игроков", callback_data='leaderboard'),
+         InlineKeyboardButton("🎁 Бонус", callback_data='hourly_bonus')],
+        [InlineKeyboardButton("🎡 Колесо фортуны", callback_data='wheel_menu')],
+        [InlineKeyboardButton("🎫 Промокод", callback_data='promo_enter'),
+         InlineKeyboardButton("👥 Реферал", callback_data='referral')]
+    ]
+    # Add admin button at the bottom for admins
+    if is_admin(uid):
+        kb.append([InlineKeyboardButton("🔧 Админ-панель", callback_data='admin_menu')])
+
+    q.edit_message_text(
+        f"🏠 Главное меню\n💰 Баланс: {row.coins} монет",
+        reply_markup=InlineKeyboardMarkup(kb)
+    )
+
+
+@callback_route('channel_check_popup')
+def _cb_channel_check_popup(q, uid, d, context):
+    try:
+        is_subscribed = check_channel_subscription_sync(q.bot, uid)
+        update_channel_subscription_status(uid, is_subscribed)
+
+        if is_subscribed:
+            if not get_channel_reward_status(uid):
+                add_coins(uid, 200, COIN_BONUS)
+                set_channel_reward_received(uid)
+                row = get_user(uid)
+
+                q.edit_message_text(
+                    f"✅ Вы подписаны на канал!\n\n"
+                    f"🎁 +200 монет добавлено на баланс!\n"
+                    f"💰 Ваш баланс: {row.coins} монет\n\n"
+                    f"⚠️ Если вы отпишетесь, 200 монет будут списаны!",
+                    reply_markup=InlineKeyboardMarkup([
+                        [InlineKeyboardButton("🔙 Продолжить", callback_data='main_menu')]
+                    ])
+                )
+            else:
+                q.edit_message_text(
+                    f"✅ Вы подписаны на канал!\n\n"
+                    f"Вы уже получали награду за подписку.",
+                    reply_markup=InlineKeyboardMarkup([
+                        [InlineKeyboardButton("🔙 Продолжить", callback_data='main_menu')]
+                    ])
+                )
+        else:
+            q.edit_message_text(
+                f"❌ Вы не подписаны на канал!\n\n"
+                f"📢 Пожалуйста, подпишитесь на канал: @{CHANNEL_USERNAME}\n"
+                f"Затем нажмите \"Проверить\" снова.",
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("✅ Проверить", callback_data='channel_check_popup')],
+                    [InlineKeyboardButton("⏭️ Пропустить", callback_data='channel_skip_popup')]
+                ])
+            )
+    except Exception as e:
+        print(f"Error in channel_check_popup: {e}")
+        q.edit_message_text(
+            f"⚠️ Ошибка проверки подписки.\n\n"
+            f"Попробуйте позже или обратитесь к администратору.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+            ])
+        )
+
+
+@callback_route('channel_skip_popup')
+def _cb_channel_skip_popup(q, uid, d, context):
+    # Возвращаемся в главное меню
+    row = get_user(uid)
+    kb = [
+        [InlineKeyboardButton("🎮 Игры", callback_data='games_menu'),
+         InlineKeyboardButton("👤 Профиль", callback_data='profile')],
+        [InlineKeyboardButton("🏆 Топ игроков", callback_data='leaderboard'),
+         InlineKeyboardButton("🎁 Бонус", callback_data='hourly_bonus')],
+        [InlineKeyboardButton("🎡 Колесо фортуны", callback_data='wheel_menu')],
+        [InlineKeyboardButton("🎫 Промокод", callback_data='promo_enter'),
+         InlineKeyboardButton("👥 Реферал", callback_data='referral')]
+    ]
+    if is_admin(uid):
+        kb.append([InlineKeyboardButton("🔧 Админ-панель", callback_data='admin_menu')])
+
+    q.edit_message_text(
+        f"🏠 Главное меню\n💰 Баланс: {row.coins} монет",
+        reply_markup=InlineKeyboardMarkup(kb)
+    )
+
+
+@callback_route('profile')
+def _cb_profile(q, uid, d, context):
+    row = get_user(uid)
+    # profile: (uid, username, coins, last_hourly, wins, jp_best, jp_auto, referrer_id, total_refs, last_wheel)
+    uname = row.username if row.username else f"ID:{uid}"
+    msg = (
+        f"👤 Профиль: {uname}\n"
+        f"💰 Баланс: {format_number(row.coins)} монет\n"
+        f"🚀 Рекорд Jetpack: {row.jetpack_best:.2f}x\n"
+        f"👥 Рефералов: {row.total_refs}\n"
+        f"📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
+    )
+    q.edit_message_text(msg, reply_markup=InlineKeyboardMarkup([
+        [InlineKeyboardButton("📜 История игр", callback_data='history')],
+        [InlineKeyboardButton("💰 Точный баланс", callback_data='show_balance')],
+        [InlineKeyboardButton("🔙 Назад", callback_data='main_menu')]
+    ]))
+
+
+@callback_route('show_balance')
+def _cb_show_balance(q, uid, d, context):
+    row = get_user(uid)
+    exact_balance = format_number_full(row.coins)
+    q.answer(f"💰 Точный баланс: {exact_balance} монет", show_alert=True)
+
+
+# «Показать всё» — не больше стольких последних игр (лимит длины сообщения)
+HISTORY_SHOW_ALL_LIMIT = 50
+
+@callback_route('history', 'history_page_*', 'history_sort_*', 'history_all', 'history_paged')
+def _cb_history(q, uid, d, context):
+    # Обработка истории игр с расширенной сортировкой
+    page, cursor = 0, None
+
+    # Парсим параметры из callback_data: history_page_{page}_{cursor}
+    if d.startswith('history_page_'):
+        parts = d.replace('history_page_', '').split('_')
+        page = int(parts[0]) if parts else 0
+        cursor = parts[1] if len(parts) > 1 else None
+
+    # Получаем параметры сортировки из context.user_data
+    sort_games = context.user_data.get('history_sort_games', [])  # Список выбранных игр
+    sort_win = context.user_data.get('history_sort_win', None)  # None = все, True = выигрыши, False = проигрыши
+    show_all = context.user_data.get('history_show_all', False)  # Показать всё без страниц
+
+    # Обрабатываем изменение сортировки (кроме reset - у него свой обработчик)
+    if d.startswith('history_sort_') and d != 'history_sort_reset':
+        sort_type = d.replace('history_sort_', '')
+        if sort_type == 'newest':
+            context.user_data['history_sort_games'] = []
+            context.user_data['history_sort_win'] = None
+        elif sort_type == 'wins':
+            context.user_data['history_sort_win'] = True
+        elif sort_type == 'losses':
+            context.user_data['history_sort_win'] = False
+        elif sort_type == 'all':
+            context.user_data['history_sort_win'] = None
+        page = 0
+        sort_games = context.user_data.get('history_sort_games', [])
+        sort_win = context.user_data.get('history_sort_win', None)
+
+    elif d == 'history_all':
+        context.user_data['history_show_all'] = True
+        show_all = True
+    elif d == 'history_paged':
+        context.user_data['history_show_all'] = False
+        show_all = False
+        page = 0
+
+    # Получаем историю с фильтрами (любое число игр — одним запросом по индексу)
+    if show_all:
+        rows, total, page_nav = get_history_paged(uid, 0, page_size=HISTORY_SHOW_ALL_LIMIT, rolled_back=False,
+                                                  games=sort_games, is_win=sort_win)
+        pages = 1
+    else:
+        # Валидация страницы
+        pages = (count_history(uid, games=sort_games, is_win=sort_win) + 4) // 5 or 1
+        if page >= pages or page < 0:
+            page, cursor = min(max(page, 0), pages - 1), None
+        rows, total, page_nav = get_history_paged(uid, page, page_size=5, rolled_back=False, games=sort_games,
+                                                  is_win=sort_win, cursor=cursor)
+        page = page_nav.number
+        pages = max(pages, page + 1)
+        # Для меню перехода: от текущей страницы считаются соседние
+        context.user_data['history_here'] = (page, page_nav.here)
+
+    # Формируем текст фильтров
+    filter_text = []
+    if sort_games:
+        if len(sort_games) == 1:
+            filter_text.append(f"🎮 {sort_games[0]}")
+        else:
+            filter_text.append(f"🎮 {len(sort_games)} игр")
+    if sort_win is True:
+        filter_text.append("✅ Выигрыши")
+    elif sort_win is False:
+        filter_text.append("❌ Проигрыши")
+
+    filter_str = " | ".join(filter_text) if filter_text else "Все"
+
+    if not rows:
+        text = f"📜 История игр пуста\n\nФильтр: {filter_str}"
+        kb = [
+            [InlineKeyboardButton("📊 Сортировка", callback_data='history_menu')],
+            [InlineKeyboardButton("🔙 К профилю", callback_data='profile')]
+        ]
+    else:
+        if show_all:
+            shown = f"последние {len(rows)} из {total}" if len(rows) < total else f"{total}"
+            text = f"📜 История игр (всё)\nФильтр: {filter_str}\nВсего: {shown}\n\n"
+            for gid, gname, amount, is_win, is_rolled_back, created_at in rows:
+                g_emoji = GAME_EMOJIS.get(gname, '🎮')
+                res_emoji = "✅" if is_win else "❌"
+                sign = "+" if is_win else "-"
+                date_str = created_at[:10] if created_at else "?"
+                text += f"{res_emoji} {g_emoji} {gname}: {sign}{amount} 💰 ({date_str})\n"
+            kb = [
+                [InlineKeyboardButton("📄 Постраничный вид", callback_data='history_paged')],
+                [InlineKeyboardButton("📊 Сортировка", callback_data='history_menu')],
+                [InlineKeyboardButton("🔙 К профилю", callback_data='profile')]
+            ]
+        else:
+            text = f"📜 История игр\nФильтр: {filter_str}\n━━━━━━━━━━━━━━━━\nСтраница {page+1} из {pages} | Всего: {total}\n\nНажмите на игру для деталей:"
+            kb = []
+            for gid, gname, amount, is_win, is_rolled_back, created_at in rows:
+                g_emoji = GAME_EMOJIS.get(gname, '🎮')
+                res_emoji = "✅" if is_win else "❌"
+                sign = "+" if is_win else "-"
+                kb.append([InlineKeyboardButton(
+                    f"{res_emoji} {g_emoji} {gname}: {sign}{amount} 💰",
+                    callback_data=f'gameview_{gid}_{page}_{page_nav.here}'
+                )])
+
+            # Навигация
+            nav = []
+            if page_nav.prev:
+                nav.append(InlineKeyboardButton("◀️", callback_data=f'history_page_{page-1}_{page_nav.prev}'))
+            nav.append(InlineKeyboardButton(f"{page+1}/{pages}", callback_data='history_goto_menu'))
+            if page_nav.next:
+                nav.append(InlineKeyboardButton("▶️", callback_data=f'history_page_{page+1}_{page_nav.next}'))
+            if len(nav) > 1:
+                kb.append(nav)
+
+            kb.append([InlineKeyboardButton("📄 Показать всё", callback_data='history_all')])
+            kb.append([InlineKeyboardButton("📊 Сортировка", callback_data='history_menu')])
+            kb.append([InlineKeyboardButton("🔙 К профилю", callback_data='profile')])
+
+    q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+
+
+@callback_route('history_menu')
+def _cb_history_menu(q, uid, d, context):
+    # Меню сортировки истории
+    sort_games = context.user_data.get('history_sort_games', [])  # Список выбранных игр
+    sort_win = context.user_data.get('history_sort_win', None)  # None = все, True = выигрыши, False = проигрыши
+
+    # Формируем кнопки фильтра по играм (чекбоксы) - используем предопределённый список
+    game_buttons = []
+    for game in ALL_GAMES:
+        emoji = GAME_EMOJIS.get(game, '🎮')
+        is_selected = game in sort_games
+        check = "☑️ " if is_selected else ""
+        game_buttons.append([InlineKeyboardButton(
+            f"{check}{emoji} {game}",
+            callback_data=f'history_game_toggle_{game}'
+        )])
+
+    # Кнопка "Все игры" / "Снять все"
+    if len(sort_games) == 0:
+        all_btn = [InlineKeyboardButton("☑️ Выбрать все", callback_data='history_game_select_all')]
+    else:
+        all_btn = [InlineKeyboardButton("⬜ Снять выбор", callback_data='history_game_clear')]
+
+    # Кнопки фильтра по выигрышу/проигрышу
+    win_buttons = [
+        InlineKeyboardButton(f"{'✅ ' if sort_win is None else ''}📊 Все", callback_data='history_win_all'),
+        InlineKeyboardButton(f"{'✅ ' if sort_win is True else ''}✅ Выигрыши", callback_data='history_win_wins'),
+        InlineKeyboardButton(f"{'✅ ' if sort_win is False else ''}❌ Проигрыши", callback_data='history_win_losses')
+    ]
+
+    # Текст выбранных фильтров
+    selected_text = ""
+    if sort_games:
+        selected_text += f"🎮 Игры: {', '.join(sort_games)}\n"
+    if sort_win is True:
+        selected_text += "✅ Только выигрыши\n"
+    elif sort_win is False:
+        selected_text += "❌ Только проигрыши\n"
+
+    if not selected_text:
+        selected_text = "Фильтры не выбраны (показать всё)"
+
+    q.edit_message_text(
+        f"📊 Сортировка истории игр\n\nВыбранные фильтры:\n{selected_text}",
+        reply_markup=InlineKeyboardMarkup([
+            *game_buttons,
+            all_btn,
+            win_buttons,
+            [InlineKeyboardButton("🔄 Сбросить все фильтры", callback_data='history_sort_reset')],
+            [InlineKeyboardButton("✅ Применить и закрыть", callback_data='history')]
+        ])
+    )
+
+
+@callback_route('history_game_toggle_{game_name}')
+def _cb_history_game_toggle(q, uid, d, context, game_name):
+    # Переключение выбора игры
+    sort_games = context.user_data.get('history_sort_games', [])
+
+    if game_name in sort_games:
+        sort_games.remove(game_name)
+    else:
+        sort_games.append(game_name)
+
+    context.user_data['history_sort_games'] = sort_games
+    # Остаемся в меню
+    d = 'history_menu'
+    dispatch_callback(q, uid, d, context)
+    return
+
+
+@callback_route('history_game_select_all')
+def _cb_history_game_select_all(q, uid, d, context):
+    # Выбрать все игры
+    context.user_data['history_sort_games'] = ALL_GAMES.copy()
+    d = 'history_menu'
+    dispatch_callback(q, uid, d, context)
+    return
+
+
+@callback_route('history_game_clear')
+def _cb_history_game_clear(q, uid, d, context):
+    # Снять выбор со всех игр
+    context.user_data['history_sort_games'] = []
+    d = 'history_menu'
+    dispatch_callback(q, uid, d, context)
+    return
+
+
+@callback_route('history_win_{win_filter}')
+def _cb_history_win(q, uid, d, context, win_filter):
+    # Фильтр по выигрышу/проигрышу - остаемся в меню
+    if win_filter == 'all':
+        context.user_data['history_sort_win'] = None
+    elif win_filter == 'wins':
+        context.user_data['history_sort_win'] = True
+    elif win_filter == 'losses':
+        context.user_data['history_sort_win'] = False
+    d = 'history_menu'
+    dispatch_callback(q, uid, d, context)
+    return
+
+
+@callback_route('history_sort_reset')
+def _cb_history_sort_reset(q, uid, d, context):
+    # Сброс всех фильтров
+    context.user_data['history_sort_games'] = []
+    context.user_data['history_sort_win'] = None
+    d = 'history_menu'
+    dispatch_callback(q, uid, d, context)
+    return
+
+
+@callback_route('history_goto_menu')
+def _cb_history_goto_menu(q, uid, d, context):
+    # Меню перехода на конкретную страницу
+    sort_games = context.user_data.get('history_sort_games', [])
+    sort_win = context.user_data.get('history_sort_win', None)
+
+    current, here = context.user_data.get('history_here', (0, None))
+
+    # Страницы у начала, у конца и рядом с текущей, каждая со своим курсором
+    pages, cursors = get_history_jumps(uid, 5, games=sort_games, is_win=sort_win, current=current, here=here)
+
+    kb, row, prev = [], [], None
+    for i, cursor in sorted(cursors.items()):
+        if prev is not None and i > prev + 1:
+            kb.append(row)
+            kb.append([InlineKeyboardButton("...", callback_data='dummy')])
+            row = []
+        if i == current:
+            row.append(InlineKeyboardButton(f"▶ {i+1}", callback_data='dummy'))
+        else:
+            row.append(InlineKeyboardButton(f"{i+1}", callback_data=f'history_page_{i}_{cursor}' if cursor else 'history_page_0'))
+        prev = i
+    kb.append(row)
+
+    kb.append([InlineKeyboardButton("🔙 Назад", callback_data='history')])
+
+    q.edit_message_text(
+        f"📄 Выбор страницы (всего {pages} страниц):",
+        reply_markup=InlineKeyboardMarkup(kb)
+    )
+
+
+@callback_route('gameview_{gid:int}_{back}')
+def _cb_gameview(q, uid, d, context, gid, back):
+    g = get_game_info(gid)
+    if not g:
+        q.answer("Игра не найдена", show_alert=True); return
+    gname, details, amount, is_win, is_rolled_back, created_at = g
+    msg = format_game_detail(gname, details, amount, is_win, created_at, is_rolled_back)
+    q.edit_message_text(msg, reply_markup=InlineKeyboardMarkup([
+        [InlineKeyboardButton("🔙 Назад к списку", callback_data=f'history_page_{back}')]
+    ]))
+
+
+@callback_route('games_menu')
+def _cb_games_menu(q, uid, d, context):
+    q.edit_message_text("🎮 Выберите игру:", reply_markup=games_menu_kb())
+
+
+@callback_route('dummy')
+def _cb_dummy(q, uid, d, context):
+    pass  # ignore clicks on revealed miner cells
+
+
+# ── ЕЖЕЧАСНЫЙ БОНУС ──
+@callback_route('hourly_bonus')
+def _cb_hourly_bonus(q, uid, d, context):
+    if can_claim_hourly(uid):
+        q.edit_message_text(
+            "🎁 Ежечасный бонус!\nУгадайте число от 1 до 3 — введите в чат:",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Отмена", callback_data='main_menu')]]))
+        context.user_data['state'] = 'hourly_guess'
+    else:
+        q.edit_message_text(
+            f"⏰ Следующий бонус через: {time_until_hourly(uid)}",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='main_menu')]]))
+
+
+# ── ПРОМОКОД ──
+@callback_route('promo_enter')
+def _cb_promo_enter(q, uid, d, context):
+    q.edit_message_text(
+        "🎫 Введите промокод в чат:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Отмена", callback_data='main_menu')]]))
+    context.user_data['state'] = 'promo'
@@ -0,0 +1,183 @@
+"""Miner game callbacks"""
+
+import json
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from miner_engine import miner_coeff
+from bot import (MinerSession, callback_route, game_sessions, get_user, miner_keyboard,
+                 settle_game, settlement_txn, start_game_session)
+
+# ════════════════════════════
+# ── МИНЁР ──
+# ════════════════════════════
+@callback_route('miner_menu')
+def _cb_miner_menu(q, uid, d, context):
+    bet = context.user_data.get('miner_bet', 0)
+    mines = context.user_data.get('miner_mines', 5)
+    row = get_user(uid)
+    can_start = bet > 0
+    q.edit_message_text(
+        f"⛏️ Минёр\n💰 Баланс: {row.coins} монет\nСтавка: {bet} монет | Мин: {mines}",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("▶️ Начать игру", callback_data='miner_start') if can_start
+             else InlineKeyboardButton("▶️ Начать (сделайте ставку)", callback_data='miner_need_bet')],
+            [InlineKeyboardButton(f"💰 Изменить ставку ({bet})", callback_data='miner_set_bet')],
+            [InlineKeyboardButton(f"💣 Изменить мины ({mines})", callback_data='miner_set_mines')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='games_menu')]
+        ])
+    )
+
+
+@callback_route('miner_need_bet')
+def _cb_miner_need_bet(q, uid, d, context):
+    q.answer("Сначала сделайте ставку!", show_alert=True)
+
+
+@callback_route('miner_set_bet')
+def _cb_miner_set_bet(q, uid, d, context):
+    q.edit_message_text(
+        "💰 Введите сумму ставки для Минёра:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='miner_menu')]]))
+    context.user_data['state'] = 'miner_bet'
+
+
+@callback_route('miner_set_mines')
+def _cb_miner_set_mines(q, uid, d, context):
+    q.edit_message_text("💣 Выберите количество мин:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("3",  callback_data='miner_mines_3'),
+             InlineKeyboardButton("5",  callback_data='miner_mines_5'),
+             InlineKeyboardButton("10", callback_data='miner_mines_10')],
+            [InlineKeyboardButton("15", callback_data='miner_mines_15'),
+             InlineKeyboardButton("20", callback_data='miner_mines_20'),
+             InlineKeyboardButton("24", callback_data='miner_mines_24')],
+            [InlineKeyboardButton("✏️ Своё число", callback_data='miner_mines_custom')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='miner_menu')]
+        ])
+    )
+
+
+@callback_route('miner_mines_{val}')
+def _cb_miner_mines(q, uid, d, context, val):
+    if val == 'custom':
+        q.edit_message_text(
+            "💣 Введите количество мин (3-24):",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='miner_menu')]]))
+        context.user_data['state'] = 'miner_mines'
+    else:
+        mines = int(val)
+        context.user_data['miner_mines'] = mines
+        bet = context.user_data.get('miner_bet', 0)
+        row = get_user(uid)
+        can_start = bet > 0
+        q.edit_message_text(
+            f"⛏️ Минёр\n💰 Баланс: {row.coins} монет\nСтавка: {bet} монет | Мин: {mines}",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("▶️ Начать игру", callback_data='miner_start') if can_start
+                 else InlineKeyboardButton("▶️ Начать (сделайте ставку)", callback_data='miner_need_bet')],
+                [InlineKeyboardButton(f"💰 Изменить ставку ({bet})", callback_data='miner_set_bet')],
+                [InlineKeyboardButton(f"💣 Изменить мины ({mines})", callback_data='miner_set_mines')],
+                [InlineKeyboardButton("🔙 Назад", callback_data='games_menu')]
+            ])
+        )
+
+
+@callback_route('miner_start')
+def _cb_miner_start(q, uid, d, context):
+    bet = context.user_data.get('miner_bet', 0)
+    mines = context.user_data.get('miner_mines', 5)
+    row = get_user(uid)
+    if bet <= 0:
+        q.answer("Сначала сделайте ставку!", show_alert=True); return
+    if bet > row.coins:
+        q.answer("Недостаточно монет!", show_alert=True); return
+
+    session = MinerSession.deal(bet, mines)
+    if not start_game_session(uid, 'miner', session):
+        q.answer("Недостаточно монет!", show_alert=True); return
+
+    coeff = miner_coeff(mines, 0)
+    row2 = get_user(uid)
+    q.edit_message_text(
+        f"⛏️ Минёр | Ставка: {bet} монет | Мин: {mines}\n💰 Баланс: {row2.coins} монет\nКоэффициент: {coeff:.2f}x | Выигрыш: {int(bet*coeff)} монет",
+        reply_markup=miner_keyboard(session)
+    )
+
+
+@callback_route('miner_cell_{idx:int}')
+def _cb_miner_cell(q, uid, d, context, idx):
+    session = game_sessions.get(uid, 'miner')
+    if session is None:
+        q.answer("Игра не активна!", show_alert=True); return
+
+    bet = session.bet
+    mines = session.mines
+
+    outcome = session.reveal(idx)
+    if outcome is None:
+        q.answer("Уже открыто!", show_alert=True); return
+
+    if outcome == 'boom':
+        with settlement_txn():
+            finished = game_sessions.finish(uid, 'miner') is not None
+            if finished:
+                settle_game(uid, "Минёр", json.dumps(session.details('boom')), bet, False, stake=session.stake)
+        if not finished:
+            q.answer("Игра не активна!", show_alert=True); return
+        row = get_user(uid)
+        q.edit_message_text(
+            f"💥 Бум! Вы попали на мину.\nПотеряли {bet} монет.\n💰 Баланс: {row.coins} монет",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔄 Новая игра", callback_data='miner_menu')],
+                [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+            ])
+        )
+    else:
+        cleared = session.cleared()
+        coeff = session.coeff()
+        winnings = int(bet * coeff)
+
+        if outcome == 'full':
+            with settlement_txn():
+                finished = game_sessions.finish(uid, 'miner') is not None
+                if finished:
+                    settle_game(uid, "Минёр", json.dumps(session.details('full')), winnings, True, payout=winnings, stake=session.stake)
+            if not finished:
+                q.answer("Игра не активна!", show_alert=True); return
+            row = get_user(uid)
+            q.edit_message_text(
+                f"🎉 Все ячейки открыты!\n💰 +{winnings} монет (x{coeff:.2f})\n💰 Баланс: {row.coins} монет",
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("🔄 Новая игра", callback_data='miner_menu')],
+                    [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+                ])
+            )
+        else:
+            game_sessions.save(uid, 'miner', session)
+            q.edit_message_text(
+                f"⛏️ Минёр | Ставка: {bet} | Мин: {mines}\n✅ Открыто: {cleared} | Коэффициент: {coeff:.2f}x\n💰 Выигрыш: {winnings} монет",
+                reply_markup=miner_keyboard(session)
+            )
+
+
+@callback_route('miner_cashout')
+def _cb_miner_cashout(q, uid, d, context):
+    with settlement_txn():
+        session = game_sessions.finish(uid, 'miner')
+        if session is not None:
+            bet = session.bet
+            coeff = session.coeff()
+            winnings = int(bet * coeff)
+            settle_game(uid, "Минёр", json.dumps(session.details('cashout')), winnings, True, payout=winnings, stake=session.stake)
+    if session is None:
+        q.answer("Нет активной игры!", show_alert=True); return
+    row = get_user(uid)
+    profit = winnings - bet
+    q.edit_message_text(
+        f"✅ Выигрыш забран!\n💰 +{winnings} монет (x{coeff:.2f}) | Прибыль: +{profit}\n💰 Баланс: {row.coins} монет",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Новая игра", callback_data='miner_menu')],
+            [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+        ])
+    )
@@ -0,0 +1,24 @@
+"""Referral program callbacks"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import callback_route, get_user
+
+# ════════════════════════════
+# ── РЕФЕРАЛЬНАЯ СИСТЕМА ──
+# ════════════════════════════
+@callback_route('referral')
+def _cb_referral(q, uid, d, context):
+    row = get_user(uid)
+    refs = row.total_refs
+    earned = refs * 200
+    bot_info = q.bot.get_me()
+    bot_username = bot_info.username
+    ref_link = f"https://t.me/{bot_username}?start=ref_{uid}"
+    q.edit_message_text(
+        f"👥 Реферальная система\n\n"
+        f"Приглашайте друзей и получайте 200 монет за каждого!\n\n"
+        f"🔗 Ваша ссылка:\n{ref_link}\n\n"
+        f"👥 Приглашено: {refs} чел.\n"
+        f"💰 Заработано: {earned} монет",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='main_menu')]]))
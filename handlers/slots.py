@@ -0,0 +1,69 @@
+"""Slots game callbacks"""
+
+import json
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import callback_route, check_slots, get_user, settle_game, spin_slots
+
+# ════════════════════════════
+# ── СЛОТЫ ──
+# ════════════════════════════
+@callback_route('slots_menu')
+def _cb_slots_menu(q, uid, d, context):
+    bet = context.user_data.get('slots_bet', 0)
+    row = get_user(uid)
+    q.edit_message_text(
+        f"🎰 Слоты\n💰 Баланс: {row.coins} монет\nСтавка: {bet} монет\n\nКомбинации:\n🍒x3 = 3x | 🍋x3 = 5x | 🔔x3 = 10x\n⭐x3 = 15x | 💎x3 = 25x | 7️⃣x3 = 50x\nДва одинаковых = возврат ставки",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🎰 Крутить!", callback_data='slots_spin') if bet > 0
+             else InlineKeyboardButton("🎰 Крутить (сделайте ставку)", callback_data='slots_need_bet')],
+            [InlineKeyboardButton(f"💰 Ставка ({bet})", callback_data='slots_set_bet')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='games_menu')]
+        ])
+    )
+
+
+@callback_route('slots_need_bet')
+def _cb_slots_need_bet(q, uid, d, context):
+    q.answer("Сначала сделайте ставку!", show_alert=True)
+
+
+@callback_route('slots_set_bet')
+def _cb_slots_set_bet(q, uid, d, context):
+    q.edit_message_text("💰 Введите сумму ставки для Слотов:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='slots_menu')]]))
+    context.user_data['state'] = 'slots_bet'
+
+
+@callback_route('slots_spin')
+def _cb_slots_spin(q, uid, d, context):
+    bet = context.user_data.get('slots_bet', 0)
+    row = get_user(uid)
+    if bet <= 0:
+        q.answer("Сначала сделайте ставку!", show_alert=True); return
+    if bet > row.coins:
+        q.answer("Недостаточно монет!", show_alert=True); return
+    reels = spin_slots()
+    mult, winnings = check_slots(reels, bet)
+    display = ' | '.join(reels)
+    slots_details = json.dumps({'bet': bet, 'reels': reels, 'mult': mult, 'winnings': winnings})
+    if mult == 0:
+        balance = settle_game(uid, "Слоты", slots_details, bet, False, bet=bet)
+        msg = f"🎰 {display}\n\nПромах! Потеряли {bet} монет."
+    else:
+        balance = settle_game(uid, "Слоты", slots_details, winnings, True, bet=bet, payout=winnings)
+        if mult == 1:
+            msg = f"🎰 {display}\n\nДва одинаковых — возврат ставки! +{winnings} монет."
+        else:
+            msg = f"🎰 {display}\n\n🎉 ВЫИГРЫШ! x{mult} = +{winnings} монет!"
+    if balance is None:
+        q.answer("Недостаточно монет!", show_alert=True); return
+    q.edit_message_text(
+        f"{msg}\n💰 Баланс: {balance} монет",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🎰 Ещё раз!", callback_data='slots_spin')],
+            [InlineKeyboardButton(f"💰 Ставка ({bet})", callback_data='slots_set_bet')],
+            [InlineKeyboardButton("🔙 Выйти", callback_data='slots_menu')]
+        ])
+    )
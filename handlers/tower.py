@@ -0,0 +1,203 @@
+"""Tower game callbacks"""
+
+import json
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import (TOWER_COEFFS_1BOMB, TOWER_COEFFS_2BOMBS, TOWER_FLOORS, TowerSession,
+                 callback_route, dispatch_callback, game_sessions, get_user, settle_game,
+                 settlement_txn, start_game_session, tower_keyboard)
+
+# ════════════════════════════
+# ── БАШНЯ ──
+# ════════════════════════════
+@callback_route('tower_menu')
+def _cb_tower_menu(q, uid, d, context):
+    bet = context.user_data.get('tower_bet', 0)
+    traps = context.user_data.get('tower_traps_count', 1)  # 1 или 2 бомбы
+    row = get_user(uid)
+
+    # Выбираем коэффициенты в зависимости от режима
+    coeffs = TOWER_COEFFS_2BOMBS if traps == 2 else TOWER_COEFFS_1BOMB
+    coeffs_txt = " → ".join([f"{c:.1f}x" for c in coeffs[:6]]) + " → ..."
+
+    traps_text = f"{traps} бомб{'а' if traps == 1 else 'ы'}"
+    mode_text = "🔥 Хардкор" if traps == 2 else "🎯 Стандарт"
+
+    q.edit_message_text(
+        f"🗼 Башня\n💰 Баланс: {row.coins} монет\nСтавка: {bet} монет | {traps_text}/этаж\n\n"
+        f"Режим: {mode_text}\n"
+        f"{TOWER_FLOORS} этажей. На каждом 3 ячейки — {traps_text}.\n"
+        f"Коэффициенты: {coeffs_txt}",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("▶️ Начать", callback_data='tower_start') if bet > 0
+             else InlineKeyboardButton("▶️ Начать (сделайте ставку)", callback_data='tower_need_bet')],
+            [InlineKeyboardButton(f"💰 Ставка ({bet})", callback_data='tower_set_bet')],
+            [InlineKeyboardButton(f"💣 Мины: {traps}", callback_data='tower_set_traps')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='games_menu')]
+        ])
+    )
+
+
+@callback_route('tower_need_bet')
+def _cb_tower_need_bet(q, uid, d, context):
+    q.answer("Сначала сделайте ставку!", show_alert=True)
+
+
+@callback_route('tower_set_bet')
+def _cb_tower_set_bet(q, uid, d, context):
+    q.edit_message_text("💰 Введите сумму ставки для Башни:",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='tower_menu')]]))
+    context.user_data['state'] = 'tower_bet'
+
+
+@callback_route('tower_set_traps')
+def _cb_tower_set_traps(q, uid, d, context):
+    traps = context.user_data.get('tower_traps_count', 1)
+    q.edit_message_text(
+        f"💣 Выберите количество мин на этаж:\n\n"
+        f"1 бомба — Стандартный режим (шанс пройти этаж: 66.7%)\n"
+        f"2 бомбы — Хардкорный режим (шанс пройти этаж: 33.3%)\n\n"
+        f"⚠️ Чем больше бомб, тем выше коэффициенты!",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"{'✅ ' if traps == 1 else ''}1 бомба (стандарт)", callback_data='tower_traps_1')],
+            [InlineKeyboardButton(f"{'✅ ' if traps == 2 else ''}2 бомбы (хардкор)", callback_data='tower_traps_2')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='tower_menu')]
+        ])
+    )
+
+
+@callback_route('tower_traps_{traps:int}')
+def _cb_tower_traps(q, uid, d, context, traps):
+    context.user_data['tower_traps_count'] = traps
+    # Возвращаемся в меню
+    d = 'tower_menu'
+    dispatch_callback(q, uid, d, context)
+
+
+@callback_route('tower_start')
+def _cb_tower_start(q, uid, d, context):
+    bet = context.user_data.get('tower_bet', 0)
+    traps_count = context.user_data.get('tower_traps_count', 1)
+    row = get_user(uid)
+    if bet <= 0:
+        q.answer("Сначала сделайте ставку!", show_alert=True); return
+    if bet > row.coins:
+        q.answer("Недостаточно монет!", show_alert=True); return
+    # Ловушки на каждом этаже: 1 или 2 позиции из 3
+    if not start_game_session(uid, 'tower', TowerSession.deal(bet, traps_count)):
+        q.answer("Недостаточно монет!", show_alert=True); return
+    row2 = get_user(uid)
+
+    # Выбираем коэффициенты
+    coeffs = TOWER_COEFFS_2BOMBS if traps_count == 2 else TOWER_COEFFS_1BOMB
+    coeff = coeffs[0]
+
+    q.edit_message_text(
+        f"🗼 Башня | Ставка: {bet} | {traps_count} бомб{'ы' if traps_count == 2 else 'а'}\n"
+        f"💰 Баланс: {row2.coins}\n"
+        f"Этаж 1/{TOWER_FLOORS} | Коэффициент: {coeff:.1f}x\n"
+        f"Возможный выигрыш: {int(bet*coeff)} монет",
+        reply_markup=tower_keyboard(0, traps_count)
+    )
+
+
+@callback_route('tower_cell_{floor:int}_{cell:int}')
+def _cb_tower_cell(q, uid, d, context, floor, cell):
+    session = game_sessions.get(uid, 'tower')
+    if session is None:
+        q.answer("Нет активной игры!", show_alert=True); return
+    if floor != session.floor:
+        q.answer("Это не текущий этаж!", show_alert=True); return
+    bet = session.bet
+    traps_count = session.traps_count
+
+    # Проверяем, попал ли игрок на бомбу
+    is_boom = session.is_trap(floor, cell)
+
+    if is_boom:
+        # Boom!
+        with settlement_txn():
+            finished = game_sessions.finish(uid, 'tower') is not None
+            if finished:
+                settle_game(uid, "Башня", json.dumps(session.details('boom')), bet, False, stake=session.stake)
+        if not finished:
+            q.answer("Нет активной игры!", show_alert=True); return
+        row = get_user(uid)
+        q.edit_message_text(
+            f"💥 Бум! Ловушка на этаже {floor+1}!\nПотеряли {bet} монет.\n💰 Баланс: {row.coins} монет",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔄 Играть снова", callback_data='tower_menu')],
+                [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+            ])
+        )
+    else:
+        # Safe! Go up
+        next_floor = floor + 1
+        session.floor = next_floor
+
+        # Выбираем коэффициенты
+        coeffs = TOWER_COEFFS_2BOMBS if traps_count == 2 else TOWER_COEFFS_1BOMB
+        coeff = coeffs[floor]  # coeff for PASSING this floor
+        winnings = int(bet * coeff)
+
+        if next_floor >= TOWER_FLOORS:
+            # Top of tower!
+            with settlement_txn():
+                finished = game_sessions.finish(uid, 'tower') is not None
+                if finished:
+                    settle_game(uid, "Башня", json.dumps(session.details('top', coeff=coeff)), winnings, True, payout=winnings, stake=session.stake)
+            if not finished:
+                q.answer("Нет активной игры!", show_alert=True); return
+            row = get_user(uid)
+            q.edit_message_text(
+                f"🏆 Вы добрались до вершины!\n💰 +{winnings} монет (x{coeff:.1f})\n💰 Баланс: {row.coins} монет",
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("🔄 Играть снова", callback_data='tower_menu')],
+                    [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+                ])
+            )
+        else:
+            game_sessions.save(uid, 'tower', session)
+            next_coeff = coeffs[next_floor]
+            row = get_user(uid)
+            q.edit_message_text(
+                f"🗼 Башня | Этаж {next_floor+1}/{TOWER_FLOORS} | {traps_count} бомб{'ы' if traps_count == 2 else 'а'}\n"
+                f"Текущий выигрыш: {winnings} монет (x{coeff:.1f})\n"
+                f"Следующий: {int(bet*next_coeff)} монет (x{next_coeff:.1f})\n"
+                f"💰 Баланс: {row.coins} монет",
+                reply_markup=tower_keyboard(next_floor, traps_count)
+            )
+
+
+@callback_route('tower_cashout')
+def _cb_tower_cashout(q, uid, d, context):
+    session = game_sessions.get(uid, 'tower')
+    if session is None:
+        q.answer("Нет активной игры!", show_alert=True); return
+    if session.floor == 0:
+        q.answer("Сначала пройдите хотя бы один этаж!", show_alert=True); return
+    floor = session.floor
+    bet = session.bet
+    traps_count = session.traps_count
+
+    # Выбираем коэффициенты
+    coeffs = TOWER_COEFFS_2BOMBS if traps_count == 2 else TOWER_COEFFS_1BOMB
+    coeff = coeffs[floor - 1]
+
+    winnings = int(bet * coeff)
+    with settlement_txn():
+        finished = game_sessions.finish(uid, 'tower') is not None
+        if finished:
+            settle_game(uid, "Башня", json.dumps(session.details('cashout', coeff=coeff)), winnings, True, payout=winnings, stake=session.stake)
+    if not finished:
+        q.answer("Нет активной игры!", show_alert=True); return
+    row = get_user(uid)
+    profit = winnings - bet
+    q.edit_message_text(
+        f"✅ Выигрыш забран на {floor} этаже!\n💰 +{winnings} монет (x{coeff:.1f}) | Прибыль: +{profit}\n💰 Баланс: {row.coins} монет",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Играть снова", callback_data='tower_menu')],
+            [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+        ])
+    )
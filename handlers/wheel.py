@@ -0,0 +1,64 @@
+"""Wheel of fortune callbacks"""
+
+import random
+from datetime import datetime
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot import (COIN_WHEEL, WHEEL_PAID_COST, WHEEL_SECTORS, add_coins, callback_route,
+                 can_spin_wheel, get_user, place_bet, set_field, time_until_wheel)
+
+# ════════════════════════════
+# ── КОЛЕСО ФОРТУНЫ ──
+# ════════════════════════════
+@callback_route('wheel_menu')
+def _cb_wheel_menu(q, uid, d, context):
+    row = get_user(uid)
+    free = can_spin_wheel(uid)
+    free_txt = "✅ Бесплатное вращение доступно!" if free else f"⏰ Следующее через {time_until_wheel(uid)}"
+    q.edit_message_text(
+        f"🎡 Колесо фортуны\n💰 Баланс: {row.coins} монет\n{free_txt}\n\nСекторы:\nНичего (50%) | +15 (20%) | +30 (15%)\n+75 (8%) | +150 (5%) | +300 (2%)\n\nБесплатно каждые 8 часов.\nПлатное вращение: {WHEEL_PAID_COST} монет.",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🎡 Крутить бесплатно!", callback_data='wheel_free') if free
+             else InlineKeyboardButton(f"🎡 Крутить за {WHEEL_PAID_COST} монет", callback_data='wheel_paid')],
+            [InlineKeyboardButton("🔙 Назад", callback_data='main_menu')]
+        ])
+    )
+
+
+@callback_route('wheel_free', 'wheel_paid')
+def _cb_wheel_free(q, uid, d, context):
+    row = get_user(uid)
+    if d == 'wheel_paid':
+        if row.coins < WHEEL_PAID_COST:
+            q.answer(f"Недостаточно монет! Нужно {WHEEL_PAID_COST}.", show_alert=True); return
+        if place_bet(uid, WHEEL_PAID_COST, COIN_WHEEL) is None:
+            q.answer(f"Недостаточно монет! Нужно {WHEEL_PAID_COST}.", show_alert=True); return
+    else:
+        if not can_spin_wheel(uid):
+            q.answer(f"Подождите ещё {time_until_wheel(uid)}", show_alert=True); return
+    # Spin!
+    set_field(uid, 'last_wheel', datetime.now().isoformat())
+    names = [s[0] for s in WHEEL_SECTORS]
+    rewards = [s[1] for s in WHEEL_SECTORS]
+    weights = [s[2] for s in WHEEL_SECTORS]
+    chosen = random.choices(list(zip(names, rewards)), weights=weights, k=1)[0]
+    name, reward = chosen
+    if reward == 0:
+        msg = f"🎡 Выпало: {name}\nНичего не выиграли."
+    elif reward == -1:
+        old = get_user(uid).coins
+        add_coins(uid, old, COIN_WHEEL)  # double balance = add current balance
+        new_bal = get_user(uid).coins
+        msg = f"🎡 Выпало: {name}!\n💰 Баланс удвоен: {old} → {new_bal} монет! 🎉"
+    else:
+        add_coins(uid, reward, COIN_WHEEL)
+        msg = f"🎡 Выпало: {name}!\n🎉 +{reward} монет!"
+    row2 = get_user(uid)
+    q.edit_message_text(
+        f"{msg}\n💰 Баланс: {row2.coins} монет",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"🎡 Платное вращение ({WHEEL_PAID_COST} монет)", callback_data='wheel_paid')],
+            [InlineKeyboardButton("🔙 Главное меню", callback_data='main_menu')]
+        ])
+    )
@@ -0,0 +1,94 @@
+"""Miner engine: board masks, moves and the coefficient table.
+
+Поле минёра - целые битовые маски: бит i - ячейка i (ряд i // 5, столбец
+i % 5). Коэффициенты для всех пар (мин, открыто) считаются один раз при
+импорте, так что ход, сбор выигрыша и запись в историю - битовые
+операции и чтение таблицы. Модуль не зависит от telegram и БД.
+"""
+import random
+
+MINER_SIDE = 5
+MINER_CELLS = MINER_SIDE * MINER_SIDE
+MINER_FULL = (1 << MINER_CELLS) - 1
+MINER_MAX_MINES = 24
+
+def cell_index(row, col):
+    """Bit index of the cell in row, col"""
+    return row * MINER_SIDE + col
+
+def mask_positions(mask):
+    """Indexes of the set bits of mask, lowest first"""
+    positions = []
+    while mask:
+        low = mask & -mask
+        positions.append(low.bit_length() - 1)
+        mask ^= low
+    return positions
+
+def positions_mask(positions):
+    """Mask with the bits of positions set (inverse of mask_positions)"""
+    mask = 0
+    for pos in positions:
+        mask |= 1 << pos
+    return mask
+
+def popcount(mask):
+    return mask.bit_count()
+
+def deal_board(mines, rng=random):
+    """Mask of `mines` distinct random cells"""
+    return positions_mask(rng.sample(range(MINER_CELLS), mines))
+
+def reveal(board, opened, idx):
+    """Open cell idx; returns (outcome, opened).
+
+    outcome is 'boom', 'full' (last safe cell), 'safe', or None if the cell
+    is out of range or already open (opened is returned unchanged then).
+    """
+    if not 0 <= idx < MINER_CELLS:
+        return None, opened
+    bit = 1 << idx
+    if opened & bit:
+        return None, opened
+    if board & bit:
+        return 'boom', opened
+    opened |= bit
+    return ('full' if opened | board == MINER_FULL else 'safe'), opened
+
+def _calc_miner_coeff(mines, cleared):
+    """Calculate miner coefficient with balanced economy.
+    Higher commission for more mines to prevent abuse."""
+    if cleared == 0:
+        return 1.0
+    total = MINER_CELLS
+    coeff = 1.0
+    safe = MINER_CELLS - mines
+    for i in range(cleared):
+        remaining_total = total - i
+        remaining_safe = safe - i
+        if remaining_safe <= 0:
+            break
+        coeff *= remaining_total / remaining_safe
+
+    # Dynamic commission based on number of mines:
+    # 3 mines: 8%, 5 mines: 10%, 10 mines: 12%, 15 mines: 14%, 20-24 mines: 15%
+    if mines <= 3:
+        commission = 0.92
+    elif mines <= 5:
+        commission = 0.90
+    elif mines <= 10:
+        commission = 0.88
+    elif mines <= 15:
+        commission = 0.86
+    else:
+        commission = 0.85
+
+    return round(coeff * commission, 2)
+
+# MINER_COEFFS[mines][cleared], комиссия уже учтена
+MINER_COEFFS = tuple(tuple(_calc_miner_coeff(mines, cleared) for cleared in range(MINER_CELLS))
+                     for mines in range(MINER_MAX_MINES + 1))
+
+def miner_coeff(mines, cleared):
+    """Coefficient after opening `cleared` safe cells on a board with `mines` mines"""
+    return MINER_COEFFS[mines][cleared]
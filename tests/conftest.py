@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули бота лежат в корне репозитория, рядом со скриптом
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
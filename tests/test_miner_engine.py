@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from miner_engine import (MINER_CELLS, MINER_COEFFS, MINER_FULL, MINER_MAX_MINES, MINER_SIDE,
+                          cell_index, deal_board, mask_positions, miner_coeff, popcount,
+                          positions_mask, reveal)
+
+
+def calc_miner_coeff(mines, cleared, safe_count):
+    """Формула до перехода на таблицу (по ячейкам в списке), эталон для MINER_COEFFS"""
+    if cleared == 0:
+        return 1.0
+    total = 25
+    coeff = 1.0
+    safe = safe_count
+    for i in range(cleared):
+        remaining_total = total - i
+        remaining_safe = safe - i
+        if remaining_safe <= 0:
+            break
+        coeff *= remaining_total / remaining_safe
+
+    if mines <= 3:
+        commission = 0.92
+    elif mines <= 5:
+        commission = 0.90
+    elif mines <= 10:
+        commission = 0.88
+    elif mines <= 15:
+        commission = 0.86
+    else:
+        commission = 0.85
+
+    return round(coeff * commission, 2)
+
+
+def test_coeff_table_matches_old_formula():
+    assert len(MINER_COEFFS) == MINER_MAX_MINES + 1
+    for mines in range(MINER_MAX_MINES + 1):
+        assert len(MINER_COEFFS[mines]) == MINER_CELLS
+        for cleared in range(MINER_CELLS):
+            expected = calc_miner_coeff(mines, cleared, MINER_CELLS - mines)
+            assert miner_coeff(mines, cleared) == expected, (mines, cleared)
+
+
+def test_cell_index_is_row_major():
+    # Ячейка (ряд, столбец) - бит row * 5 + col, как в callback_data miner_cell_{idx}
+    cells = [cell_index(row, col) for row in range(MINER_SIDE) for col in range(MINER_SIDE)]
+    assert cells == list(range(MINER_CELLS))
+    for idx in range(MINER_CELLS):
+        row, col = idx // 5, idx % 5
+        assert mask_positions(1 << cell_index(row, col)) == [idx]
+
+
+def test_mask_positions_roundtrip():
+    rng = random.Random(25)
+    assert mask_positions(0) == []
+    assert mask_positions(MINER_FULL) == list(range(MINER_CELLS))
+    for _ in range(500):
+        cells = sorted(rng.sample(range(MINER_CELLS), rng.randint(0, MINER_CELLS)))
+        mask = positions_mask(cells)
+        assert mask_positions(mask) == cells
+        assert popcount(mask) == len(cells)
+        assert mask & ~MINER_FULL == 0
+
+
+@pytest.mark.parametrize('mines', [1, 3, 5, 24])
+def test_deal_board(mines):
+    board = deal_board(mines, random.Random(mines))
+    assert popcount(board) == mines
+    assert board & ~MINER_FULL == 0
+
+
+def test_reveal():
+    board = positions_mask([0, 7])
+    assert reveal(board, 0, 0) == ('boom', 0)
+    assert reveal(board, 0, 1) == ('safe', 0b10)
+    assert reveal(board, 0b10, 1) == (None, 0b10)
+    assert reveal(board, 0, MINER_CELLS) == (None, 0)
+    assert reveal(board, 0, -1) == (None, 0)
+    opened = MINER_FULL & ~board & ~(1 << 24)
+    assert reveal(board, opened, 24) == ('full', MINER_FULL & ~board)